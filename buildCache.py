@@ -0,0 +1,236 @@
+import maya.cmds as cmds
+import hashlib
+import json
+import os
+import time
+
+import nmrig.simpleLimbClass as nmLimb
+import nmrig.controlRegistry as nmRegistry
+import nmrig.limbResult as nmResult
+import nmrig.nodeTracker as nmTracker
+import nmrig.buildTelemetry as nmTelemetry
+reload(nmLimb)
+reload(nmRegistry)
+reload(nmResult)
+reload(nmTracker)
+reload(nmTelemetry)
+
+MAX_BYTES = 512 * 1024 * 1024
+INDEX = 'index.json'
+NAMESPACE = 'nmBuildCache'
+
+
+def default_cache_dir():
+    return os.environ.get('NMRIG_BUILD_CACHE') or os.path.join(
+        cmds.internalVar(userAppDir=True), 'nmrigBuildCache')
+
+
+def recipe(limb):
+    # everything the build output depends on, guide names excluded
+    limb_recipe = limb.recipe()
+    limb_recipe['guide_matrices'] = [[round(v, 5) for v in m]
+                                     for m in limb_recipe['guide_matrices']]
+    limb_recipe['pole_vector_position'] = [
+        round(v, 5) for v in limb_recipe['pole_vector_position']]
+    limb_recipe['version'] = nmLimb.__version__
+    limb_recipe['remove_guides'] = limb.remove_guides
+    return limb_recipe
+
+
+def recipe_key(limb_recipe):
+    text = json.dumps(limb_recipe, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def limb_state(limb):
+    # plain build attributes restored onto the Limb on a cache hit
+    state = {}
+    for attr, value in vars(limb).items():
+        # a hit records its own timing
+        if attr in ['joint_list', 'pole_vector', 'stage_times']:
+            continue
+        if is_plain(value):
+            state[attr] = value
+    return state
+
+
+def unique_namespace():
+    # a fresh import namespace, one left behind by an earlier session
+    # would otherwise take the imported nodes in with its own
+    index = 1
+    while cmds.namespace(exists=':{}{}'.format(NAMESPACE, index)):
+        index += 1
+    return '{}{}'.format(NAMESPACE, index)
+
+
+def remap(value, names):
+    # swap node names in restored state for the names they got on import
+    if isinstance(value, list):
+        return [remap(v, names) for v in value]
+    if isinstance(value, dict):
+        return dict((k, remap(v, names)) for k, v in value.items())
+    if isinstance(value, (str, type(u''))):
+        return names.get(value, value)
+    return value
+
+
+def is_plain(value):
+    if isinstance(value, (list, tuple)):
+        return all(is_plain(v) for v in value)
+    if isinstance(value, dict):
+        return all(is_plain(v) for v in value.values())
+    return value is None or isinstance(value, (str, int, float, bool)) or \
+        type(value).__name__ == 'unicode'
+
+
+class BuildCache(object):
+    def __init__(self, cache_dir=None, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self.index = self.load_index()
+
+    def build(self, limb):
+        # import a prebuilt rig on a hit, build and store it on a miss
+        if limb.ik_spaces:
+            # space targets live outside the rig and can't be exported with it
+            return limb.build_limb()
+
+        limb_recipe = recipe(limb)
+        key = recipe_key(limb_recipe)
+        entry = self.index['entries'].get(key)
+        if entry and os.path.exists(self.entry_path(key, entry)):
+            self.import_entry(limb, key, entry)
+            self.index['stats']['hits'] += 1
+        else:
+            self.index['stats']['misses'] += 1
+            limb.build_limb()
+            self.store(limb, key)
+        self.save_index()
+        return limb.result
+
+    def store(self, limb, key):
+        root = nmRegistry.root_registry()
+        nodes = [n for n in limb.created_nodes
+                 if n != root and cmds.objExists(n)]
+        file_name = key + '.mb'
+        file_path = os.path.join(self.cache_dir, file_name)
+        selection = cmds.ls(selection=True)
+        cmds.select(nodes, replace=True, noExpand=True)
+        try:
+            cmds.file(file_path, exportSelected=True, type='mayaBinary',
+                      force=True, constructionHistory=False, channels=True,
+                      constraints=True, expressions=True, shader=False,
+                      preserveReferences=False)
+        finally:
+            cmds.select(selection, replace=True)
+
+        with open(os.path.join(self.cache_dir, key + '.json'), 'w') as f:
+            json.dump(limb_state(limb), f)
+        self.index['entries'][key] = {'file': file_name,
+                                      'size': os.path.getsize(file_path),
+                                      'last_used': time.time(),
+                                      'hits': 0}
+        self.index['stats']['stores'] += 1
+        self.evict()
+
+    def import_entry(self, limb, key, entry):
+        # same checks as a build, merging the namespace would otherwise
+        # rename the imported nodes around anything already in the scene
+        limb.preflight()
+        if not nmRegistry.is_built(limb.base_name):
+            nmRegistry.unregister_limb(limb.base_name)
+
+        with nmTelemetry.record(limb, version=nmLimb.__version__,
+                                cache_hit=True):
+            begin = time.time()
+            namespace = unique_namespace()
+            tracker = nmTracker.NodeTracker()
+            try:
+                with tracker:
+                    cmds.file(self.entry_path(key, entry), i=True,
+                              type='mayaBinary', namespace=namespace,
+                              preserveReferences=False)
+                stored = [n.split('|')[-1].replace(namespace + ':', '')
+                          for n in tracker.nodes()]
+                cmds.namespace(removeNamespace=namespace,
+                               mergeNamespaceWithRoot=True)
+            finally:
+                # only left when the import failed, take its nodes with it
+                if cmds.namespace(exists=':' + namespace):
+                    cmds.namespace(removeNamespace=namespace,
+                                   deleteNamespaceContent=True)
+            # names read back from the nodes after the merge
+            imported = tracker.nodes()
+            names = dict(zip(stored, imported))
+            nmRegistry.link_limb(limb.base_name)
+
+            with open(os.path.join(self.cache_dir, key + '.json')) as f:
+                for attr, value in json.load(f).items():
+                    setattr(limb, attr, remap(value, names))
+            limb.created_nodes = imported
+            limb.result = nmResult.from_limb(limb,
+                                             version=nmLimb.__version__)
+
+            limb.delete_guides()
+            limb.stage_times = [('cache_import', time.time() - begin)]
+
+        entry['last_used'] = time.time()
+        entry['hits'] = entry.get('hits', 0) + 1
+
+    def evict(self):
+        # drop least recently used rigs until the cache fits
+        entries = self.index['entries']
+        total = sum(e['size'] for e in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            entry = entries.pop(key)
+            total -= entry['size']
+            for path in [self.entry_path(key, entry),
+                         os.path.join(self.cache_dir, key + '.json')]:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.index['stats']['evictions'] += 1
+
+    def entry_path(self, key, entry):
+        return os.path.join(self.cache_dir, entry['file'])
+
+    def stats(self):
+        stats = dict(self.index['stats'])
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / float(lookups) if lookups else 0.0
+        stats['entries'] = len(self.index['entries'])
+        stats['bytes'] = sum(e['size']
+                             for e in self.index['entries'].values())
+        return stats
+
+    def clear(self):
+        for key in list(self.index['entries']):
+            self.index['entries'][key]['last_used'] = 0
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        self.evict()
+        self.max_bytes = max_bytes
+        self.save_index()
+
+    def load_index(self):
+        path = os.path.join(self.cache_dir, INDEX)
+        index = {'entries': {},
+                 'stats': {'hits': 0, 'misses': 0, 'stores': 0,
+                           'evictions': 0}}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    index.update(json.load(f))
+            except ValueError:
+                cmds.warning('Build cache index is corrupt, starting over.')
+        return index
+
+    def save_index(self):
+        path = os.path.join(self.cache_dir, INDEX)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path + '.tmp', path)
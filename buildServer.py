@@ -0,0 +1,314 @@
+import json
+import socket
+import threading
+import time
+
+try:
+    import queue
+    import socketserver
+except ImportError:
+    import Queue as queue
+    import SocketServer as socketserver
+
+import nmrig.limbPlan as nmPlan
+import nmrig.limbResult as nmResult
+
+# long lived limb builds: start once with
+#   mayapy -m nmrig.buildServer [--port 7645]
+# and send newline separated JSON requests over a local socket:
+#   {"id": 1, "recipe": {...Limb arguments...}, "scene": "in.ma",
+#    "isolation": "new", "output": "out.ma"}
+# recipes name their guides in joint_list, or carry guide_matrices and
+# pole_vector_position like the limbRecipe stored on a built limb.
+# isolation
+#   new       every request starts from a new scene, or opens its scene
+#   rollback  builds in the current scene and removes the limb afterwards
+# requests from every connection go through one queue and are built in
+# order on the main thread. --stand-in plans limbs with limbPlan instead of
+# building them, so clients can be tested without maya
+
+HOST = '127.0.0.1'
+PORT = 7645
+ISOLATION = ['new', 'rollback']
+
+
+def check_recipe(recipe):
+    # the two recipe shapes both backends take
+    if recipe.get('joint_list'):
+        return
+    if not recipe.get('guide_matrices') or \
+            recipe.get('pole_vector_position') is None:
+        raise ValueError('Must provide a joint_list, or guide_matrices and a '
+                         'pole_vector_position.')
+
+
+def guide_names(recipe):
+    # names limbLod.create_recipe_guides gives guides built from a recipe
+    joint_list = ['{}_{}_GDE'.format(recipe.get('side'), alias)
+                  for alias in recipe.get('alias_list') or []]
+    return joint_list, '{}_{}_PV_GDE'.format(recipe.get('side'),
+                                             recipe.get('part'))
+
+
+class StandInBackend(object):
+    # pure python, tracks node names instead of a scene
+    def __init__(self):
+        self.scene = None
+        self.nodes = set()
+        self.saved = {}
+
+    def open_scene(self, path=None):
+        self.scene = path
+        self.nodes = set()
+
+    def build(self, recipe):
+        check_recipe(recipe)
+        if not recipe.get('guide_matrices'):
+            raise ValueError('Stand-in builds cannot read scene guides, '
+                             'provide guide_matrices.')
+        recipe = dict(recipe)
+        if not recipe.get('joint_list'):
+            recipe['joint_list'], recipe['pole_vector'] = guide_names(recipe)
+        plan = nmPlan.plan_limb(recipe, recipe['guide_matrices'])
+        clashes = self.nodes.intersection(plan['names'])
+        if clashes:
+            raise RuntimeError('Nodes already exist: {}'.format(
+                ', '.join(sorted(clashes))))
+        self.nodes.update(plan['names'])
+        result = nmResult.LimbResult(
+            base_name=plan['base_name'], side=recipe.get('side'),
+            part=recipe.get('part'), version='stand-in',
+            lod=recipe.get('lod', 'full'), length_total=plan['length_total'],
+            created_nodes=plan['names'])
+        return result.to_dict(), [(stage, 0.0) for stage in plan['stages']]
+
+    def save(self, path):
+        self.saved[path] = sorted(self.nodes)
+
+    def rollback(self, result):
+        self.nodes.difference_update(result['created_nodes'])
+
+
+class MayaBackend(object):
+    def __init__(self):
+        import maya.cmds as cmds
+        import nmrig.simpleLimbClass as nmLimb
+        import nmrig.limbLod as nmLod
+        self.cmds = cmds
+        self.nmLimb = nmLimb
+        self.nmLod = nmLod
+        # guides a request created from guide_matrices, per limb
+        self.guides = {}
+
+    def open_scene(self, path=None):
+        self.guides = {}
+        if path:
+            self.cmds.file(path, open=True, force=True)
+        else:
+            self.cmds.file(new=True, force=True)
+
+    def build(self, recipe):
+        check_recipe(recipe)
+        kwargs = dict((str(k), v) for k, v in recipe.items()
+                      if k not in ['guide_matrices', 'pole_vector_position'])
+        guides = []
+        if not recipe.get('joint_list') and recipe.get('guide_matrices'):
+            joint_list, pole_vector = self.nmLod.create_recipe_guides(recipe)
+            guides = joint_list + [pole_vector]
+            kwargs.update(joint_list=joint_list, pole_vector=pole_vector)
+        try:
+            limb = self.nmLimb.Limb(**kwargs)
+            result = limb.build_limb()
+        except Exception:
+            self.delete_guides(guides)
+            raise
+        self.guides[result.base_name] = guides
+        return result.to_dict(), limb.stage_times
+
+    def save(self, path):
+        self.cmds.file(rename=path)
+        self.cmds.file(save=True, force=True,
+                       type='mayaBinary' if path.endswith('.mb')
+                       else 'mayaAscii')
+
+    def rollback(self, result):
+        self.nmLod.delete_rig(result['base_name'])
+        self.delete_guides(self.guides.pop(result['base_name'], []))
+
+    def delete_guides(self, guides):
+        guides = [g for g in guides if self.cmds.objExists(g)]
+        if guides:
+            self.cmds.delete(guides)
+
+
+class Job(object):
+    def __init__(self, request):
+        self.request = request
+        self.queued = time.time()
+        self.response = None
+        self.done = threading.Event()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    # one JSON request per line, answered in order on the same connection
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                response = {'ok': False, 'error': 'Bad request: {}'.format(e)}
+            else:
+                response = self.server.build_server.submit(request)
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class Listener(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class BuildServer(object):
+    # connections are read on background threads, builds run where serve()
+    # was called, which has to be maya's main thread
+    def __init__(self, backend=None, host=HOST, port=PORT):
+        self.backend = backend or MayaBackend()
+        self.jobs = queue.Queue()
+        self.running = False
+        self.listener = Listener((host, port), RequestHandler)
+        self.listener.build_server = self
+
+    @property
+    def address(self):
+        return self.listener.server_address
+
+    def submit(self, request):
+        # called from connection threads, waits for the build
+        job = Job(request)
+        self.jobs.put(job)
+        job.done.wait()
+        return job.response
+
+    def serve(self):
+        thread = threading.Thread(target=self.listener.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    job = self.jobs.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                job.response = self.execute(job.request, job.queued)
+                job.done.set()
+        finally:
+            self.listener.shutdown()
+            self.listener.server_close()
+
+    def execute(self, request, queued=None):
+        begin = time.time()
+        response = {'id': request.get('id'), 'ok': True,
+                    'queue_ms': (begin - (queued or begin)) * 1000.0,
+                    'pending': self.jobs.qsize()}
+        command = request.get('command', 'build')
+        if command == 'ping':
+            return response
+        if command == 'stop':
+            self.running = False
+            return response
+        if command != 'build':
+            response.update(ok=False,
+                            error='Unknown command {!r}.'.format(command))
+            return response
+
+        isolation = request.get('isolation', 'new')
+        try:
+            if isolation not in ISOLATION:
+                raise ValueError('Must provide one of {} for the '
+                                 'isolation.'.format(', '.join(ISOLATION)))
+            if 'recipe' not in request:
+                raise ValueError('Must provide a recipe.')
+            if isolation == 'new' or request.get('scene'):
+                self.backend.open_scene(request.get('scene'))
+            scene_done = time.time()
+            result, stages = self.backend.build(request['recipe'])
+            build_done = time.time()
+            if request.get('output'):
+                self.backend.save(request['output'])
+            if isolation == 'rollback':
+                self.backend.rollback(result)
+        except Exception as e:
+            # the server outlives any one bad request
+            response.update(ok=False, error='{}: {}'.format(type(e).__name__,
+                                                            e))
+        else:
+            response.update(result=result,
+                            scene_ms=(scene_done - begin) * 1000.0,
+                            build_ms=(build_done - scene_done) * 1000.0,
+                            stages=[[stage, seconds * 1000.0]
+                                    for stage, seconds in stages])
+        response['total_ms'] = (time.time() - begin) * 1000.0
+        return response
+
+
+def send(requests, host=HOST, port=PORT, timeout=None):
+    # responses come back in request order
+    connection = socket.create_connection((host, port), timeout)
+    try:
+        connection.sendall(''.join(json.dumps(r) + '\n'
+                                   for r in requests).encode('utf-8'))
+        reader = connection.makefile('rb')
+        responses = []
+        for _ in requests:
+            line = reader.readline()
+            if not line:
+                raise IOError('Build server closed the connection.')
+            responses.append(json.loads(line.decode('utf-8')))
+        reader.close()
+        return responses
+    finally:
+        connection.close()
+
+
+def build(recipe, scene=None, isolation='new', output=None, host=HOST,
+          port=PORT, timeout=None):
+    return send([{'recipe': recipe, 'scene': scene, 'isolation': isolation,
+                  'output': output}], host, port, timeout)[0]
+
+
+def stop(host=HOST, port=PORT):
+    return send([{'command': 'stop'}], host, port)[0]
+
+
+def main(argv=None):
+    # mayapy -m nmrig.buildServer [--host h] [--port p] [--stand-in]
+    import argparse
+    parser = argparse.ArgumentParser(description='Limb build server.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--stand-in', action='store_true',
+                        help='plan limbs without maya')
+    args = parser.parse_args(argv)
+
+    if args.stand_in:
+        backend = StandInBackend()
+    else:
+        try:
+            import maya.standalone
+            maya.standalone.initialize()
+        except (ImportError, RuntimeError):
+            pass
+        backend = MayaBackend()
+    server = BuildServer(backend, args.host, args.port)
+    print('build server on {}:{}'.format(*server.address))
+    server.serve()
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
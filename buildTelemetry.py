@@ -0,0 +1,336 @@
+import contextlib
+import json
+import os
+import sqlite3
+import time
+
+# one row per limb build in a local sqlite file, plus one row per stage:
+#   builds  asset, limb, arguments, node counts, total time, cmds call
+#           counts, version. the asset is the scene file name unless
+#           record() is given one. build cache hits get their own rows,
+#           left out of the build time queries
+#   stages  duration of every Limb stage of a build
+# recording is off unless enable() was called or NMRIG_TELEMETRY_DB is set.
+# queries need no maya, run them with
+#   python -m nmrig.buildTelemetry [--db path] percentiles|slowest|regressions
+
+ENV_VAR = 'NMRIG_TELEMETRY_DB'
+PERCENTILES = [50, 90, 99]
+GROUP_BY = ['version', 'asset', 'base_name', 'part', 'lod']
+# columns older databases are missing
+ADDED_COLUMNS = [('base_name', 'TEXT'), ('cache_hit', 'INTEGER')]
+# builds the time queries look at
+BUILT = 'success = 1 AND COALESCE(cache_hit, 0) = 0'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL,
+    version TEXT,
+    asset TEXT,
+    base_name TEXT,
+    part TEXT,
+    lod TEXT,
+    scene TEXT,
+    success INTEGER,
+    error TEXT,
+    total_ms REAL,
+    nodes_before INTEGER,
+    nodes_after INTEGER,
+    created_nodes INTEGER,
+    cmds_calls INTEGER,
+    cmds_counts TEXT,
+    arguments TEXT,
+    cache_hit INTEGER
+);
+CREATE TABLE IF NOT EXISTS stages (
+    build_id INTEGER REFERENCES builds(id),
+    position INTEGER,
+    stage TEXT,
+    ms REAL
+);
+CREATE INDEX IF NOT EXISTS builds_version ON builds(version);
+CREATE INDEX IF NOT EXISTS stages_build ON stages(build_id);
+'''
+
+_db_path = None
+
+
+def enable(db_path=None):
+    global _db_path
+    _db_path = db_path or default_db_path()
+
+
+def disable():
+    global _db_path
+    _db_path = None
+
+
+def default_db_path():
+    import maya.cmds as cmds
+    return os.path.join(cmds.internalVar(userAppDir=True),
+                        'nmrigTelemetry.db')
+
+
+def db_path():
+    return _db_path or os.environ.get(ENV_VAR)
+
+
+def connect(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    columns = [row[1] for row in connection.execute(
+        'PRAGMA table_info(builds)')]
+    with connection:
+        for column, column_type in ADDED_COLUMNS:
+            if column not in columns:
+                connection.execute('ALTER TABLE builds ADD COLUMN {} '
+                                   '{}'.format(column, column_type))
+    return connection
+
+
+def asset_name(scene):
+    # scene file name without folder or extension
+    if not scene:
+        return 'untitled'
+    return os.path.splitext(os.path.basename(scene))[0]
+
+
+class CallCounter(object):
+    # swaps every maya.cmds function for a counting wrapper while active
+    def __init__(self):
+        self.counts = {}
+        self.originals = {}
+
+    def __enter__(self):
+        import maya.cmds as cmds
+        for name in dir(cmds):
+            func = getattr(cmds, name)
+            if name.startswith('_') or not callable(func):
+                continue
+            self.originals[name] = func
+            setattr(cmds, name, self.wrap(name, func))
+        return self
+
+    def __exit__(self, *args):
+        import maya.cmds as cmds
+        for name, func in self.originals.items():
+            setattr(cmds, name, func)
+        self.originals = {}
+
+    def wrap(self, name, func):
+        counts = self.counts
+
+        def counted(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return func(*args, **kwargs)
+        return counted
+
+    def total(self):
+        return sum(self.counts.values())
+
+
+@contextlib.contextmanager
+def record(limb, version=None, asset=None, cache_hit=False):
+    # wrap Limb.build_rig or a build cache import, a no-op unless telemetry
+    # is enabled
+    path = db_path()
+    if not path:
+        yield
+        return
+
+    import maya.cmds as cmds
+    nodes_before = len(cmds.ls())
+    begin = time.time()
+    error = None
+    counter = CallCounter()
+    try:
+        with counter:
+            yield
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+        raise
+    finally:
+        total_ms = (time.time() - begin) * 1000.0
+        try:
+            write_record(path, limb, version, error, total_ms, nodes_before,
+                         len(cmds.ls()), counter, asset, cache_hit)
+        except sqlite3.Error as e:
+            cmds.warning('Could not write build telemetry: {}'.format(e))
+
+
+def write_record(path, limb, version, error, total_ms, nodes_before,
+                 nodes_after, counter, asset=None, cache_hit=False):
+    import maya.cmds as cmds
+    scene = cmds.file(query=True, sceneName=True) or ''
+    try:
+        arguments = limb.recipe()
+        arguments.pop('guide_matrices', None)
+    except (RuntimeError, ValueError, TypeError):
+        # guides can be gone after a failed build
+        arguments = {'side': limb.side, 'part': limb.part}
+
+    connection = connect(path)
+    try:
+        with connection:
+            cursor = connection.execute(
+                'INSERT INTO builds (timestamp, version, asset, base_name, '
+                'part, lod, scene, success, error, total_ms, nodes_before, '
+                'nodes_after, created_nodes, cmds_calls, cmds_counts, '
+                'arguments, cache_hit) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (time.time(), version, asset or asset_name(scene),
+                 limb.base_name, limb.part, getattr(limb, 'lod', 'full'),
+                 scene,
+                 0 if error else 1, error, total_ms, nodes_before,
+                 nodes_after, len(getattr(limb, 'created_nodes', [])),
+                 counter.total(), json.dumps(counter.counts, sort_keys=True),
+                 json.dumps(arguments, sort_keys=True), int(cache_hit)))
+            connection.executemany(
+                'INSERT INTO stages (build_id, position, stage, ms) '
+                'VALUES (?, ?, ?, ?)',
+                [(cursor.lastrowid, i, stage, seconds * 1000.0)
+                 for i, (stage, seconds) in enumerate(
+                     getattr(limb, 'stage_times', []))])
+    finally:
+        connection.close()
+
+
+def percentile(values, pct):
+    # linear interpolation between closest ranks
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def build_times(connection, group_by='version'):
+    # successful build times in ms, grouped by version, asset, limb or part
+    if group_by not in GROUP_BY:
+        raise ValueError('Cannot group builds by {}.'.format(group_by))
+    groups = {}
+    for key, total_ms in connection.execute(
+            'SELECT {}, total_ms FROM builds WHERE {}'.format(group_by,
+                                                              BUILT)):
+        groups.setdefault(key, []).append(total_ms)
+    return groups
+
+
+def percentiles(connection, group_by='version'):
+    return dict((key, dict([('count', len(values))] +
+                           [('p{}'.format(p), percentile(values, p))
+                            for p in PERCENTILES]))
+                for key, values in build_times(connection, group_by).items())
+
+
+def slowest(connection, limit=10, version=None):
+    # assets ranked by the median time of their limb builds
+    query = 'SELECT asset, total_ms FROM builds WHERE ' + BUILT
+    args = ()
+    if version:
+        query += ' AND version = ?'
+        args = (version,)
+    groups = {}
+    for asset, total_ms in connection.execute(query, args):
+        groups.setdefault(asset, []).append(total_ms)
+    ranked = sorted(((percentile(v, 50), a, len(v))
+                     for a, v in groups.items()), reverse=True)
+    return [{'asset': a, 'p50': p50, 'count': n}
+            for p50, a, n in ranked[:limit]]
+
+
+def versions(connection):
+    # in order of first appearance
+    return [row[0] for row in connection.execute(
+        'SELECT version FROM builds GROUP BY version ORDER BY MIN(id)')]
+
+
+def stage_times(connection, version):
+    groups = {}
+    for stage, ms in connection.execute(
+            'SELECT stages.stage, stages.ms FROM stages JOIN builds '
+            'ON stages.build_id = builds.id '
+            'WHERE builds.{} AND builds.version = ?'.format(BUILT),
+            (version,)):
+        groups.setdefault(stage, []).append(ms)
+    return groups
+
+
+def regressions(connection, base=None, head=None, threshold=1.1):
+    # median total and per-stage times that got slower between two versions
+    known = versions(connection)
+    if len(known) < 2 and not (base and head):
+        return []
+    base = base or known[-2]
+    head = head or known[-1]
+
+    base_times = stage_times(connection, base)
+    head_times = stage_times(connection, head)
+    totals = build_times(connection)
+    base_times['total'] = totals.get(base, [])
+    head_times['total'] = totals.get(head, [])
+
+    found = []
+    for stage in sorted(set(base_times) & set(head_times)):
+        before = percentile(base_times[stage], 50)
+        after = percentile(head_times[stage], 50)
+        if before and after and after / before >= threshold:
+            found.append({'stage': stage, 'base': base, 'head': head,
+                          'base_p50': before, 'head_p50': after,
+                          'ratio': after / before})
+    return sorted(found, key=lambda r: r['ratio'], reverse=True)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Limb build telemetry.')
+    parser.add_argument('--db', default=os.environ.get(ENV_VAR),
+                        help='telemetry database, defaults to $' + ENV_VAR)
+    sub = parser.add_subparsers(dest='command')
+    pct = sub.add_parser('percentiles')
+    pct.add_argument('--group-by', default='version',
+                     choices=GROUP_BY)
+    slow = sub.add_parser('slowest')
+    slow.add_argument('--limit', type=int, default=10)
+    slow.add_argument('--version')
+    reg = sub.add_parser('regressions')
+    reg.add_argument('--base')
+    reg.add_argument('--head')
+    reg.add_argument('--threshold', type=float, default=1.1)
+    args = parser.parse_args(argv)
+
+    if not args.db or not os.path.exists(args.db):
+        parser.error('no telemetry database found')
+    connection = connect(args.db)
+    try:
+        if args.command == 'slowest':
+            for row in slowest(connection, args.limit, args.version):
+                print('{asset:<30} {p50:>10.1f} ms  ({count} builds)'.format(
+                    **row))
+        elif args.command == 'regressions':
+            rows = regressions(connection, args.base, args.head,
+                               args.threshold)
+            for row in rows:
+                print('{stage:<30} {base_p50:>10.2f} -> {head_p50:>10.2f} ms '
+                      '{ratio:.2f}x ({base} -> {head})'.format(**row))
+            if not rows:
+                print('no regressions')
+            return 1 if rows else 0
+        else:
+            group_by = getattr(args, 'group_by', 'version')
+            for key, row in sorted(percentiles(connection, group_by).items()):
+                print('{:<30} '.format(key) + '  '.join(
+                    'p{}={:.1f}'.format(p, row['p{}'.format(p)])
+                    for p in PERCENTILES) + '  ms ({} builds)'.format(
+                        row['count']))
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
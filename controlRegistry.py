@@ -0,0 +1,156 @@
+import maya.cmds as cmds
+
+# controls are indexed with message connections instead of string lookups:
+#   controlRegistry_NET.limbs[i]        <- {base_name}_registry_NET.message
+#   {base_name}_registry_NET.tag_{tag}  <- ctrl.message (multi)
+#   {base_name}_registry_NET.role_{role} <- ctrl.message
+#   {base_name}_registry_NET.rigNodes   <- node.message (multi)
+# connections follow renames, drop out on delete and are saved with the
+# scene, so queries never need to scan the scene
+
+ROOT = 'controlRegistry_NET'
+SUFFIX = '_registry_NET'
+
+
+def root_registry(create=False):
+    if cmds.objExists(ROOT):
+        return ROOT
+    if not create:
+        return None
+    root = cmds.createNode('network', name=ROOT)
+    cmds.addAttr(root, longName='limbs', attributeType='message', multi=True)
+    return root
+
+
+def limb_registry(base_name, create=False):
+    registry = base_name + SUFFIX
+    if cmds.objExists(registry):
+        if not create or is_built(base_name):
+            return registry
+        # the rig was deleted by hand, start its registry over
+        cmds.delete(registry)
+    if not create:
+        return None
+    root = root_registry(create=True)
+    registry = cmds.createNode('network', name=registry)
+    cmds.addAttr(registry, longName='limbName', dataType='string')
+    cmds.setAttr(registry + '.limbName', base_name, type='string')
+    cmds.connectAttr(registry + '.message', root + '.limbs',
+                     nextAvailable=True)
+    return registry
+
+
+def link_limb(base_name):
+    # reconnect an imported limb registry to this scene's root
+    registry = limb_registry(base_name)
+    if not registry:
+        return None
+    root = root_registry(create=True)
+    linked = cmds.listConnections(registry + '.message', source=False,
+                                  destination=True) or []
+    if root not in linked:
+        cmds.connectAttr(registry + '.message', root + '.limbs',
+                         nextAvailable=True)
+    return registry
+
+
+def register_control(ctrl, base_name, tag, role=None):
+    registry = limb_registry(base_name, create=True)
+    tag_attr = 'tag_' + tag
+    if not cmds.attributeQuery(tag_attr, node=registry, exists=True):
+        cmds.addAttr(registry, longName=tag_attr, attributeType='message',
+                     multi=True)
+    cmds.connectAttr(ctrl + '.message', registry + '.' + tag_attr,
+                     nextAvailable=True)
+
+    if role:
+        role_attr = 'role_' + role
+        if not cmds.attributeQuery(role_attr, node=registry, exists=True):
+            cmds.addAttr(registry, longName=role_attr,
+                         attributeType='message')
+        cmds.connectAttr(ctrl + '.message', registry + '.' + role_attr,
+                         force=True)
+    return registry
+
+
+def register_nodes(base_name, nodes):
+    # every node a build created, so the rig can be removed as a whole
+    registry = limb_registry(base_name, create=True)
+    if not cmds.attributeQuery('rigNodes', node=registry, exists=True):
+        cmds.addAttr(registry, longName='rigNodes', attributeType='message',
+                     multi=True)
+    for node in nodes:
+        if node in [registry, ROOT]:
+            continue
+        cmds.connectAttr(node + '.message', registry + '.rigNodes',
+                         nextAvailable=True)
+
+
+def rig_nodes(base_name):
+    registry = limb_registry(base_name)
+    if not registry or not cmds.attributeQuery('rigNodes', node=registry,
+                                               exists=True):
+        return []
+    return cmds.listConnections(registry + '.rigNodes', source=True,
+                                destination=False) or []
+
+
+def controls(base_name, tag=None, role=None):
+    # every control of a limb, or only those with the given tag or role
+    registry = limb_registry(base_name)
+    if not registry:
+        return []
+
+    if role:
+        attrs = ['role_' + role]
+    elif tag:
+        attrs = ['tag_' + tag]
+    else:
+        attrs = tags(base_name, registry=registry)
+        attrs = ['tag_' + t for t in attrs]
+
+    result = []
+    for attr in attrs:
+        if not cmds.attributeQuery(attr, node=registry, exists=True):
+            continue
+        for ctrl in cmds.listConnections(registry + '.' + attr,
+                                         source=True, destination=False) or []:
+            if ctrl not in result:
+                result.append(ctrl)
+    return result
+
+
+def control(base_name, role):
+    found = controls(base_name, role=role)
+    return found[0] if found else None
+
+
+def tags(base_name, registry=None):
+    registry = registry or limb_registry(base_name)
+    if not registry:
+        return []
+    return [attr[4:] for attr in cmds.listAttr(registry,
+                                               userDefined=True) or []
+            if attr.startswith('tag_')]
+
+
+def limbs():
+    root = root_registry()
+    if not root:
+        return []
+    result = []
+    for registry in cmds.listConnections(root + '.limbs', source=True,
+                                         destination=False) or []:
+        result.append(cmds.getAttr(registry + '.limbName'))
+    return result
+
+
+def is_built(base_name):
+    # a registry outlives a rig deleted by hand, its controls don't
+    return bool(controls(base_name))
+
+
+def unregister_limb(base_name):
+    registry = limb_registry(base_name)
+    if registry:
+        cmds.delete(registry)
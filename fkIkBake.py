@@ -0,0 +1,92 @@
+import maya.cmds as cmds
+import math
+
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+
+import nmrig.fkIkMatch as nmMatch
+import nmrig.limbCache as nmCache
+reload(nmMatch)
+reload(nmCache)
+
+
+def bake_fk_to_ik(base_name, start=None, end=None, step=1.0, switch=False):
+    # key the FK controls onto the IK chain over the frame range
+    return bake(base_name, 'fk', start=start, end=end, step=step,
+                switch=switch)
+
+
+def bake_ik_to_fk(base_name, start=None, end=None, step=1.0, switch=False):
+    # key the IK controls onto the FK chain over the frame range
+    return bake(base_name, 'ik', start=start, end=end, step=step,
+                switch=switch)
+
+
+def bake(base_name, target, start=None, end=None, step=1.0, switch=False):
+    if target not in ['fk', 'ik']:
+        cmds.error('Bake target must be either fk or ik.')
+    if start is None:
+        start = cmds.playbackOptions(query=True, minTime=True)
+    if end is None:
+        end = cmds.playbackOptions(query=True, maxTime=True)
+
+    data = nmMatch.read_data(base_name)
+    compute = nmMatch.fk_targets if target == 'fk' else nmMatch.ik_targets
+    frames = nmCache.frame_range(start, end, step)
+
+    # the timeline never moves, every source value is a time context query
+    channels = {}
+    for frame in frames:
+        for plug, value in compute(data, get=time_getter(frame)):
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for channel, v in zip(expand_plug(plug, len(values)), values):
+                channels.setdefault(channel, []).append(v)
+
+    if switch:
+        channels[data['settings'] + '.fkIk'] = \
+            [0.0 if target == 'fk' else 1.0] * len(frames)
+
+    write_keys(channels, frames)
+    return sorted(channels)
+
+
+def time_getter(frame):
+    def get(plug):
+        return cmds.getAttr(plug, time=frame)
+    return get
+
+
+def expand_plug(plug, count):
+    if count == 1:
+        return [plug]
+    return [plug + axis for axis in 'XYZ'[:count]]
+
+
+def write_keys(channels, frames):
+    # one addKeys call per curve instead of a setKeyframe per frame
+    unit = om.MTime.uiUnit()
+    times = om.MTimeArray([om.MTime(f, unit) for f in frames])
+    rotate_curves = []
+    for channel in sorted(channels):
+        node, attr = channel.split('.', 1)
+        cmds.cutKey(node, attribute=attr, time=(frames[0], frames[-1]),
+                    clear=True)
+        curve_fn = oma.MFnAnimCurve()
+        curves = cmds.listConnections(channel, source=True, destination=False,
+                                      type='animCurve')
+        if curves:
+            curve_fn.setObject(
+                om.MSelectionList().add(curves[0]).getDependNode(0))
+        else:
+            curve_fn.create(om.MSelectionList().add(channel).getPlug(0))
+
+        values = channels[channel]
+        if curve_fn.animCurveType == oma.MFnAnimCurve.kAnimCurveTA:
+            values = [math.radians(v) for v in values]
+            rotate_curves.append(curve_fn.name())
+        curve_fn.addKeys(times, om.MDoubleArray(values),
+                         oma.MFnAnimCurve.kTangentAuto,
+                         oma.MFnAnimCurve.kTangentAuto, True)
+
+    if rotate_curves:
+        cmds.filterCurve(rotate_curves, filter='euler')
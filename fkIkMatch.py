@@ -0,0 +1,273 @@
+import maya.cmds as cmds
+import json
+
+import nmrig.controlRegistry as nmRegistry
+import nmrig.limbSolver as nmSolver
+import nmrig.mathUtils as nmMath
+reload(nmRegistry)
+reload(nmSolver)
+reload(nmMath)
+
+# rest relationships are stored on the settings control at build time:
+#   fkJoints[i] / ikJoints[i]  chain joints, fkJoints only when the anim
+#                              LOD shares one chain (matchSharedChain)
+#   fkMatchOffset[i]           ik joint orient * inverse fk joint orient
+#   worldMatchOffset           IK control rest world * inverse fk end rest world
+#   baseMatchOffset            base IK control * inverse fk root, at rest
+#   pvMatchOffset              PV position relative to the fk mid joint
+# so a match is a few matrix products and one pass of setAttr calls.
+# controls are assumed to keep maya's default xyz rotate order
+
+
+def store_match_data(limb):
+    settings = limb.settings_ctrl
+    for attr in ['fkJoints', 'ikJoints']:
+        cmds.addAttr(settings, longName=attr, attributeType='message',
+                     multi=True)
+    cmds.addAttr(settings, longName='matchRoot', attributeType='message')
+    cmds.connectAttr(limb.all_grp + '.message', settings + '.matchRoot')
+
+    shared = limb.fk_chain == limb.ik_chain
+    cmds.addAttr(settings, longName='matchSharedChain', attributeType='bool')
+    cmds.setAttr(settings + '.matchSharedChain', shared)
+
+    cmds.addAttr(settings, longName='fkMatchOffset', dataType='matrix',
+                 multi=True)
+    for i, (fk, ik) in enumerate(zip(limb.fk_chain, limb.ik_chain)):
+        cmds.connectAttr(fk + '.message',
+                         '{}.fkJoints[{}]'.format(settings, i))
+        if not shared:
+            cmds.connectAttr(ik + '.message',
+                             '{}.ikJoints[{}]'.format(settings, i))
+        fk_orient = nmMath.euler_to_matrix(cmds.getAttr(fk + '.jointOrient')[0])
+        ik_orient = nmMath.euler_to_matrix(cmds.getAttr(ik + '.jointOrient')[0])
+        cmds.setAttr('{}.fkMatchOffset[{}]'.format(settings, i),
+                     nmMath.mult(ik_orient,
+                                 nmMath.transpose_rotation(fk_orient)),
+                     type='matrix')
+
+    fk_world = [world_matrix(jnt) for jnt in limb.fk_chain]
+    pv_pos = cmds.xform(limb.pv_ctrl, query=True, worldSpace=True,
+                        rotatePivot=True)
+    offsets = {
+        'worldMatchOffset': nmMath.mult(world_matrix(limb.world_ctrl),
+                                        nmMath.inverse(fk_world[-1])),
+        'baseMatchOffset': nmMath.mult(world_matrix(limb.base_ctrl),
+                                       nmMath.inverse(fk_world[0])),
+        'pvMatchOffset': nmMath.mult(nmMath.translate_matrix(pv_pos),
+                                     nmMath.inverse(fk_world[1]))}
+    for attr in sorted(offsets):
+        cmds.addAttr(settings, longName=attr, dataType='matrix')
+        cmds.setAttr(settings + '.' + attr, offsets[attr], type='matrix')
+
+    points = [nmMath.translation(m) for m in fk_world]
+    values = {'pvMatchDistance': nmMath.length(nmMath.sub(pv_pos,
+                                                          points[1])),
+              'matchLengthTotal': sum(
+                  [nmMath.length(nmMath.sub(b, a))
+                   for a, b in zip(points[:-1], points[1:])])}
+    for attr in sorted(values):
+        cmds.addAttr(settings, longName=attr, attributeType='double')
+        cmds.setAttr(settings + '.' + attr, values[attr])
+
+    cmds.addAttr(settings, longName='matchStretch', attributeType='bool')
+    # the anim LOD only carries the stretch attributes, not the network
+    cmds.setAttr(settings + '.matchStretch',
+                 limb.add_stretch and limb.lod == 'full')
+    for attr, value in [('matchPrimaryAxis', limb.primary_axis[-1]),
+                        ('matchPart', limb.part.title())]:
+        cmds.addAttr(settings, longName=attr, dataType='string')
+        cmds.setAttr(settings + '.' + attr, value, type='string')
+
+
+def read_data(base_name):
+    settings = nmRegistry.control(base_name, 'settings')
+    if not settings or not cmds.attributeQuery('fkMatchOffset', node=settings,
+                                               exists=True):
+        cmds.error('{} has no FK/IK match data.'.format(base_name))
+
+    indices = cmds.getAttr(settings + '.fkMatchOffset', multiIndices=True)
+
+    def linked(attr):
+        return [cmds.listConnections('{}.{}[{}]'.format(settings, attr, i),
+                                     source=True, destination=False)[0]
+                for i in indices]
+
+    root = cmds.listConnections(settings + '.matchRoot', source=True,
+                                destination=False)[0]
+    fk_chain = linked('fkJoints')
+    shared = cmds.attributeQuery('matchSharedChain', node=settings,
+                                 exists=True) and \
+        cmds.getAttr(settings + '.matchSharedChain')
+    solver = None
+    if shared:
+        # the ik solve only exists blended into the shared chain
+        recipe = json.loads(cmds.getAttr(root + '.limbRecipe'))
+        solver = nmSolver.LimbSolver(
+            recipe['guide_matrices'], recipe['pole_vector_position'],
+            primary_axis=recipe['primary_axis'])
+
+    return {'settings': settings,
+            'root': root,
+            'fk_ctrls': [nmRegistry.control(base_name, 'fk' + str(i))
+                         for i in indices],
+            'world_ctrl': nmRegistry.control(base_name, 'ik'),
+            'local_ctrl': nmRegistry.control(base_name, 'localIk'),
+            'pv_ctrl': nmRegistry.control(base_name, 'pv'),
+            'base_ctrl': nmRegistry.control(base_name, 'baseIk'),
+            'fk_chain': fk_chain,
+            'ik_chain': fk_chain if shared else linked('ikJoints'),
+            'solver': solver,
+            'fk_offsets': [cmds.getAttr('{}.fkMatchOffset[{}]'.format(
+                settings, i)) for i in indices],
+            'world_offset': cmds.getAttr(settings + '.worldMatchOffset'),
+            'base_offset': cmds.getAttr(settings + '.baseMatchOffset'),
+            'pv_offset': cmds.getAttr(settings + '.pvMatchOffset'),
+            'pv_distance': cmds.getAttr(settings + '.pvMatchDistance'),
+            'length_total': cmds.getAttr(settings + '.matchLengthTotal'),
+            'stretch': cmds.getAttr(settings + '.matchStretch'),
+            'primary_axis': cmds.getAttr(settings + '.matchPrimaryAxis'),
+            'part': cmds.getAttr(settings + '.matchPart')}
+
+
+def fk_targets(data, get=cmds.getAttr):
+    # FK control values that put the FK chain on the IK chain, get is a
+    # getAttr style callable so values can come from any time context
+    if data['solver']:
+        ik_rotates = ik_solve(data, get)
+    else:
+        ik_rotates = [get(jnt + '.rotate')[0] for jnt in data['ik_chain']]
+    targets = []
+    for i, (ctrl, ik_jnt) in enumerate(zip(data['fk_ctrls'],
+                                           data['ik_chain'])):
+        rot = nmMath.mult(nmMath.euler_to_matrix(ik_rotates[i]),
+                          data['fk_offsets'][i])
+        targets.append((ctrl + '.rotate', nmMath.matrix_to_euler(rot)))
+        if data['stretch'] and i < len(data['fk_ctrls']) - 1:
+            targets.append((ctrl + '.stretch',
+                            get(ik_jnt + '.scale' + data['primary_axis'])))
+    return targets
+
+
+def ik_solve(data, get=cmds.getAttr):
+    # joint rotates of the ik solve at ikBlend 1. the shared anim LOD chain
+    # holds the FK rotates, maya blends the solve in on top, so the solve is
+    # redone with limbSolver in the rig's rest space
+    to_rig = nmMath.inverse(get(data['root'] + '.worldMatrix[0]'))
+    pose = dict((key, nmMath.point_mult(pivot_position(ctrl, get), to_rig))
+                for key, ctrl in [('base', data['base_ctrl']),
+                                  ('end', data['local_ctrl']),
+                                  ('pole', data['pv_ctrl'])])
+    return [channels[1] for channels in data['solver'].ik_channels(pose)]
+
+
+def pivot_position(ctrl, get=cmds.getAttr):
+    return nmMath.point_mult(get(ctrl + '.rotatePivot')[0],
+                             get(ctrl + '.worldMatrix[0]'))
+
+
+def ik_targets(data, get=cmds.getAttr):
+    # IK, local, base and PV control values that put the IK chain on the FK
+    # chain
+    fk_world = [get(jnt + '.worldMatrix[0]') for jnt in data['fk_chain']]
+    points = [nmMath.translation(m) for m in fk_world]
+    global_scale = get(data['root'] + '.globalScale') \
+        if cmds.attributeQuery('globalScale', node=data['root'],
+                               exists=True) else 1.0
+
+    targets = transform_targets(
+        data['world_ctrl'], nmMath.mult(data['world_offset'], fk_world[-1]),
+        get)
+    targets += [(data['local_ctrl'] + '.translate', [0.0, 0.0, 0.0]),
+                (data['local_ctrl'] + '.rotate', [0.0, 0.0, 0.0])]
+    targets += transform_targets(
+        data['base_ctrl'], nmMath.mult(data['base_offset'], fk_world[0]), get)
+
+    pv_pos = pole_position(points, data['pv_distance'] * global_scale,
+                           nmMath.mult(data['pv_offset'], fk_world[1]))
+    targets.append((data['pv_ctrl'] + '.translate',
+                    pivot_translate(data['pv_ctrl'], pv_pos, get)))
+
+    if data['stretch']:
+        # solve the up/lo multipliers so the IK lengths equal the FK lengths
+        world_ctrl = data['world_ctrl']
+        bta = nmSolver.stretch_factor(
+            nmMath.length(nmMath.sub(points[-1], points[0])),
+            data['length_total'], global_scale,
+            get(world_ctrl + '.stretch'))
+        for prefix, ctrl in zip(['up', 'lo'], data['fk_ctrls']):
+            fk_stretch = get(ctrl + '.stretch')
+            targets.append(('{}.{}{}'.format(world_ctrl, prefix,
+                                             data['part']),
+                            max(0.001, fk_stretch - bta + 1)))
+    return targets
+
+
+def transform_targets(ctrl, world_target, get=cmds.getAttr):
+    # translate/rotate values giving the control a world matrix, the parent
+    # space includes offsetParentMatrix and any space switch
+    parent_space = nmMath.mult(nmMath.inverse(get(ctrl + '.matrix')),
+                               get(ctrl + '.worldMatrix[0]'))
+    local = nmMath.mult(world_target, nmMath.inverse(parent_space))
+    # frozen controls rotate about a pivot away from their origin
+    pivot = list(get(ctrl + '.rotatePivot')[0])
+    translate = nmMath.sub(nmMath.add(nmMath.translation(local),
+                                      nmMath.vector_mult(
+                                          pivot, nmMath.rotation(local))),
+                           pivot)
+    return [(ctrl + '.translate', translate),
+            (ctrl + '.rotate', nmMath.matrix_to_euler(local))]
+
+
+def pivot_translate(ctrl, position, get=cmds.getAttr):
+    parent_space = nmMath.mult(nmMath.inverse(get(ctrl + '.matrix')),
+                               get(ctrl + '.worldMatrix[0]'))
+    local = nmMath.point_mult(position, nmMath.inverse(parent_space))
+    return nmMath.sub(local, get(ctrl + '.rotatePivot')[0])
+
+
+def pole_position(points, distance, fallback):
+    # push the mid joint away from the start-end line by the rest distance
+    start, mid, end = points[0], points[1], points[-1]
+    line = nmMath.sub(end, start)
+    along = nmMath.dot(nmMath.sub(mid, start), line) / \
+        max(nmMath.dot(line, line), 1e-12)
+    bend = nmMath.sub(mid, nmMath.add(start, nmMath.scale(line, along)))
+    if nmMath.length(bend) < 1e-4:
+        # straight limb, the rest offset from the mid joint keeps the plane
+        return nmMath.translation(fallback)
+    return nmMath.add(mid, nmMath.scale(nmMath.normalize(bend), distance))
+
+
+def apply_targets(targets):
+    for plug, value in targets:
+        if isinstance(value, (list, tuple)):
+            cmds.setAttr(plug, *value)
+        else:
+            cmds.setAttr(plug, value)
+
+
+def match_fk_to_ik(base_name):
+    # pose the FK controls onto the current IK pose
+    apply_targets(fk_targets(read_data(base_name)))
+
+
+def match_ik_to_fk(base_name):
+    # pose the IK controls onto the current FK pose
+    apply_targets(ik_targets(read_data(base_name)))
+
+
+def switch_fk_ik(base_name):
+    # match the inactive side and flip the switch without a pop
+    data = read_data(base_name)
+    fk_ik = data['settings'] + '.fkIk'
+    if cmds.getAttr(fk_ik) >= 0.5:
+        apply_targets(fk_targets(data))
+        cmds.setAttr(fk_ik, 0)
+    else:
+        apply_targets(ik_targets(data))
+        cmds.setAttr(fk_ik, 1)
+
+
+def world_matrix(node):
+    return cmds.getAttr(node + '.worldMatrix[0]')
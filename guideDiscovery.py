@@ -0,0 +1,115 @@
+import maya.cmds as cmds
+
+import nmrig.mathUtils as nmMath
+import nmrig.guideTemplates as nmTemplates
+import nmrig.controlRegistry as nmRegistry
+import nmrig.limbBatch as nmBatch
+reload(nmTemplates)
+reload(nmRegistry)
+reload(nmBatch)
+
+# sine of the smallest angle allowed between guide segments
+COLLINEAR_TOLERANCE = 1e-3
+JOINT_COUNT = 3
+
+
+def find_guides():
+    # one ls over the guide tag, guideTemplates.tag_guides marks hand placed
+    # guides the same way
+    guides = {}
+    for plug in cmds.ls('*.guideIndex', recursive=True) or []:
+        node = plug.rsplit('.', 1)[0]
+        side, part, alias = [cmds.getAttr(node + '.' + attr)
+                             for attr in nmTemplates.GUIDE_ATTRS[:3]]
+        guides.setdefault((side, part), []).append(
+            (cmds.getAttr(plug), alias, node))
+    return guides
+
+
+def discover(**limb_kwargs):
+    # Limb keyword dicts for every complete guide set, plus the problems
+    # that kept the others out
+    recipes = []
+    errors = []
+    built = [b for b in nmRegistry.limbs() if nmRegistry.is_built(b)]
+    for (side, part), entries in sorted(find_guides().items()):
+        base_name = '{}_{}'.format(side, part)
+        if not side or not part:
+            errors.append('{}: guides are missing a side or part.'.format(
+                ', '.join(e[2] for e in entries)))
+            continue
+        if base_name in built:
+            errors.append('{}: already built.'.format(base_name))
+            continue
+
+        recipe, problem = guide_set(side, part, entries)
+        if problem:
+            errors.append('{}: {}'.format(base_name, problem))
+            continue
+        recipe.update(limb_kwargs)
+        recipes.append(recipe)
+    return recipes, errors
+
+
+def guide_set(side, part, entries):
+    by_index = {}
+    for index, alias, node in entries:
+        if index in by_index:
+            return None, 'more than one guide with index {} ({}, {}).'.format(
+                index, by_index[index][1], node)
+        by_index[index] = (alias, node)
+
+    missing = [i for i in range(JOINT_COUNT + 1) if i not in by_index]
+    if missing:
+        return None, 'missing guide index {}.'.format(
+            ', '.join(str(i) for i in missing))
+    extra = sorted(i for i in by_index if i > JOINT_COUNT)
+    if extra:
+        return None, 'unexpected guide index {}.'.format(
+            ', '.join(str(i) for i in extra))
+
+    joint_list = [by_index[i][1] for i in range(JOINT_COUNT)]
+    alias_list = [by_index[i][0] for i in range(JOINT_COUNT)]
+    pole_vector = by_index[JOINT_COUNT][1]
+    if len(set(alias_list)) != len(alias_list):
+        return None, 'aliases are not unique.'
+
+    points = [cmds.xform(n, query=True, worldSpace=True, translation=True)
+              for n in joint_list + [pole_vector]]
+    problem = check_placement(points)
+    if problem:
+        return None, problem
+    return {'side': side, 'part': part, 'joint_list': joint_list,
+            'alias_list': alias_list, 'pole_vector': pole_vector}, None
+
+
+def check_placement(points):
+    start, mid, end, pole = points
+    upper = nmMath.sub(mid, start)
+    lower = nmMath.sub(end, mid)
+    if nmMath.length(upper) < 1e-6 or nmMath.length(lower) < 1e-6:
+        return 'guides overlap.'
+    if sine(upper, lower) < COLLINEAR_TOLERANCE:
+        return 'guides are collinear, the pole vector plane is undefined.'
+    if sine(nmMath.sub(end, start), nmMath.sub(pole, start)) < \
+            COLLINEAR_TOLERANCE:
+        return 'pole vector lies on the limb line.'
+    return None
+
+
+def sine(vector_a, vector_b):
+    lengths = nmMath.length(vector_a) * nmMath.length(vector_b)
+    if not lengths:
+        return 0.0
+    return nmMath.length(nmMath.cross(vector_a, vector_b)) / lengths
+
+
+def build_all(**limb_kwargs):
+    # build every complete guide set in the scene in one batch
+    recipes, errors = discover(**limb_kwargs)
+    for error in errors:
+        cmds.warning('Skipped guide set ' + error)
+    if not recipes:
+        return [], errors
+    results, timings = nmBatch.build_batch(recipes)
+    return results, errors
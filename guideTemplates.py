@@ -0,0 +1,165 @@
+import maya.cmds as cmds
+
+import nmrig.mathUtils as nmMath
+import nmrig.simpleLimbClass as nmLimb
+reload(nmMath)
+reload(nmLimb)
+
+# left side layouts in centimeters for a ~170cm character, the right side
+# is mirrored across YZ. the pole vector sits on the side the limb bends to
+TEMPLATES = {
+    'arm': {'part': 'arm',
+            'aliases': ['shoulder', 'elbow', 'wrist'],
+            'positions': [[16.0, 142.0, -2.0], [44.0, 142.0, -5.0],
+                          [70.0, 142.0, -2.0]],
+            'pole_vector': [44.0, 142.0, -40.0],
+            'height': 170.0},
+    'leg': {'part': 'leg',
+            'aliases': ['hip', 'knee', 'ankle'],
+            'positions': [[10.0, 94.0, 0.0], [10.0, 52.0, 3.0],
+                          [10.0, 9.0, -2.0]],
+            'pole_vector': [10.0, 52.0, 40.0],
+            'height': 170.0},
+    'finger': {'part': 'finger',
+               'aliases': ['knuckle', 'middle', 'tip'],
+               'positions': [[78.0, 142.0, 2.0], [82.0, 141.2, 2.0],
+                             [85.0, 140.0, 2.0]],
+               'pole_vector': [82.0, 132.0, 2.0],
+               'height': 170.0}}
+
+GUIDE_ATTRS = ['limbSide', 'limbPart', 'guideAlias', 'guideIndex']
+
+
+def template_names():
+    return sorted(TEMPLATES)
+
+
+def layout(template, side='L', height=None, lengths=None, offset=None):
+    # positions for one guide set, scaled to a character's proportions
+    data = TEMPLATES[template]
+    positions = [list(p) for p in data['positions']]
+    pole_vector = list(data['pole_vector'])
+
+    if height:
+        ratio = height / float(data['height'])
+        positions = [nmMath.scale(p, ratio) for p in positions]
+        pole_vector = nmMath.scale(pole_vector, ratio)
+
+    if lengths:
+        # keep segment directions, override upper and lower lengths
+        pv_offset = nmMath.sub(pole_vector, positions[1])
+        for i, seg_length in enumerate(lengths):
+            direction = nmMath.normalize(nmMath.sub(positions[i + 1],
+                                                    positions[i]))
+            tip = nmMath.add(positions[i], nmMath.scale(direction, seg_length))
+            shift = nmMath.sub(tip, positions[i + 1])
+            positions[i + 1:] = [nmMath.add(p, shift)
+                                 for p in positions[i + 1:]]
+        pole_vector = nmMath.add(positions[1], pv_offset)
+
+    if offset:
+        positions = [nmMath.add(p, offset) for p in positions]
+        pole_vector = nmMath.add(pole_vector, offset)
+
+    if side.upper().startswith('R'):
+        positions = [[-p[0], p[1], p[2]] for p in positions]
+        pole_vector = [-pole_vector[0], pole_vector[1], pole_vector[2]]
+
+    return {'side': side, 'part': data['part'],
+            'aliases': list(data['aliases']),
+            'positions': positions, 'pole_vector': pole_vector}
+
+
+def guide_matrices(guide_layout, primary_axis='X', up_axis='Y'):
+    # primary axis down the chain, up axis towards the pole vector
+    positions = guide_layout['positions']
+    pole_vector = guide_layout['pole_vector']
+    matrices = []
+    for i, pos in enumerate(positions):
+        if i < len(positions) - 1:
+            aim = nmMath.sub(positions[i + 1], pos)
+        else:
+            aim = nmMath.sub(pos, positions[i - 1])
+        up = nmMath.sub(pole_vector, pos)
+        matrices.append(nmMath.aim_matrix(pos, aim, up,
+                                          primary_axis=primary_axis,
+                                          up_axis=up_axis))
+    return matrices
+
+
+def create_guides(template, side='L', height=None, lengths=None,
+                  offset=None, primary_axis='X', up_axis='Y'):
+    return create_guide_sets([{'template': template, 'side': side,
+                               'height': height, 'lengths': lengths,
+                               'offset': offset}],
+                             primary_axis=primary_axis, up_axis=up_axis)[0]
+
+
+def create_guide_sets(specs, primary_axis='X', up_axis='Y'):
+    # compute every layout first, then create all guides in one pass
+    plans = []
+    for spec in specs:
+        guide_layout = layout(spec['template'], side=spec.get('side', 'L'),
+                              height=spec.get('height'),
+                              lengths=spec.get('lengths'),
+                              offset=spec.get('offset'))
+        plans.append((guide_layout, guide_matrices(guide_layout,
+                                                   primary_axis, up_axis)))
+
+    results = []
+    for guide_layout, matrices in plans:
+        side = guide_layout['side']
+        part = guide_layout['part']
+        joint_list = []
+        for i, (alias, matrix) in enumerate(zip(guide_layout['aliases'],
+                                                matrices)):
+            jnt = cmds.createNode('joint',
+                                  name='{}_{}_GDE'.format(side, alias))
+            cmds.xform(jnt, worldSpace=True, matrix=matrix)
+            tag_guide(jnt, side, part, alias, i)
+            joint_list.append(jnt)
+        pole_vector = cmds.createNode('joint',
+                                      name='{}_{}_PV_GDE'.format(side, part))
+        cmds.xform(pole_vector, worldSpace=True,
+                   translation=guide_layout['pole_vector'])
+        tag_guide(pole_vector, side, part, 'poleVector', len(joint_list))
+
+        results.append({'side': side, 'part': part,
+                        'joint_list': joint_list,
+                        'alias_list': guide_layout['aliases'],
+                        'pole_vector': pole_vector,
+                        'primary_axis': primary_axis,
+                        'up_axis': up_axis})
+    return results
+
+
+def tag_guide(guide, side, part, alias, index):
+    # lets guide sets be found again without relying on names
+    for attr in GUIDE_ATTRS[:3]:
+        if not cmds.attributeQuery(attr, node=guide, exists=True):
+            cmds.addAttr(guide, longName=attr, dataType='string')
+    if not cmds.attributeQuery('guideIndex', node=guide, exists=True):
+        cmds.addAttr(guide, longName='guideIndex', attributeType='long')
+    cmds.setAttr(guide + '.limbSide', side, type='string')
+    cmds.setAttr(guide + '.limbPart', part, type='string')
+    cmds.setAttr(guide + '.guideAlias', alias, type='string')
+    cmds.setAttr(guide + '.guideIndex', index)
+
+
+def tag_guides(side, part, joint_list, alias_list, pole_vector):
+    for i, (jnt, alias) in enumerate(zip(joint_list, alias_list)):
+        tag_guide(jnt, side, part, alias, i)
+    tag_guide(pole_vector, side, part, 'poleVector', len(joint_list))
+
+
+def build_from_template(template, side='L', height=None, lengths=None,
+                        offset=None, primary_axis='X', up_axis='Y',
+                        **limb_kwargs):
+    # spawn guides and build the limb without any guide loading by hand
+    guides = create_guides(template, side=side, height=height,
+                           lengths=lengths, offset=offset,
+                           primary_axis=primary_axis, up_axis=up_axis)
+    guides.update(limb_kwargs)
+    limb = nmLimb.Limb(**guides)
+    limb.build_limb()
+    return limb
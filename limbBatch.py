@@ -0,0 +1,85 @@
+import maya.cmds as cmds
+import maya.utils
+import time
+
+import nmrig.simpleLimbClass as nmLimb
+import nmrig.limbPlan as nmPlan
+reload(nmLimb)
+reload(nmPlan)
+
+
+def run_in_main_thread(func, *args, **kwargs):
+    # scene edits are only safe from the main thread, this is a direct call
+    # when already on it
+    return maya.utils.executeInMainThreadWithResult(func, *args, **kwargs)
+
+
+def query_guides(recipes):
+    # one pass over the scene for every guide the plans need, None for
+    # recipes with missing guides
+    guides = [j for recipe in recipes for j in recipe.get('joint_list') or []]
+    existing = set(cmds.ls(guides) or [])
+    matrices = []
+    for recipe in recipes:
+        joint_list = recipe.get('joint_list') or []
+        if not joint_list or not existing.issuperset(joint_list):
+            matrices.append(None)
+            continue
+        matrices.append([cmds.xform(j, query=True, worldSpace=True,
+                                    matrix=True) for j in joint_list])
+    return matrices
+
+
+def plan_recipe(args):
+    recipe, guide_matrices = args
+    if guide_matrices is None:
+        return None, '{}_{}: guides are missing.'.format(recipe.get('side'),
+                                                        recipe.get('part'))
+    try:
+        return nmPlan.plan_limb(recipe, guide_matrices), None
+    except (KeyError, ValueError, IndexError, ZeroDivisionError) as e:
+        return None, '{}_{}: {}'.format(recipe.get('side'),
+                                        recipe.get('part'), e)
+
+
+def plan_batch(recipes, guide_matrices):
+    # planning is pure python and never touches the scene. it is serial, a
+    # thread pool only added overhead under the GIL
+    return [plan_recipe(args) for args in zip(recipes, guide_matrices)]
+
+
+def commit_plan(recipe, plan):
+    # only the LimbResult is kept, the Limb instance is dropped
+    return nmLimb.Limb(plan=plan, **recipe).build_limb()
+
+
+def build_batch(recipes):
+    # recipes are Limb keyword dicts, as returned by
+    # guideTemplates.create_guide_sets
+    timings = {}
+    begin = time.time()
+    guide_matrices = run_in_main_thread(query_guides, recipes)
+    timings['query'] = time.time() - begin
+
+    begin = time.time()
+    plans = plan_batch(recipes, guide_matrices)
+    timings['plan'] = time.time() - begin
+
+    begin = time.time()
+    results = []
+    errors = []
+    for recipe, (plan, error) in zip(recipes, plans):
+        if error:
+            errors.append(error)
+            continue
+        try:
+            results.append(run_in_main_thread(commit_plan, recipe, plan))
+        except RuntimeError as e:
+            # preflight and rollback leave the scene clean, keep going
+            errors.append('{}_{}: {}'.format(recipe.get('side'),
+                                             recipe.get('part'), e))
+    timings['commit'] = time.time() - begin
+
+    for error in errors:
+        cmds.warning('Skipped limb ' + error)
+    return results, timings
@@ -0,0 +1,351 @@
+import maya.cmds as cmds
+import time
+
+import nmrig.spaceSwitch as nmSpace
+import nmrig.guideTemplates as nmTemplates
+import nmrig.limbBatch as nmBatch
+import nmrig.simpleLimbClass as nmLimb
+import nmrig.limbUIClass as nmUI
+import nmrig.matrixDrive as nmDrive
+import nmrig.limbPlan as nmPlan
+import nmrig.mathUtils as nmMath
+reload(nmSpace)
+reload(nmTemplates)
+reload(nmBatch)
+reload(nmLimb)
+reload(nmUI)
+reload(nmDrive)
+reload(nmPlan)
+reload(nmMath)
+
+
+def time_playback(start=1, end=100, mode='parallel', loops=3):
+    # best of several passes, milliseconds per frame
+    cmds.evaluationManager(mode=mode)
+    frame_count = int(end) - int(start) + 1
+    times = []
+    for _ in range(loops):
+        begin = time.time()
+        for frame in range(int(start), int(end) + 1):
+            cmds.currentTime(frame, update=True)
+        times.append((time.time() - begin) / frame_count)
+    return min(times) * 1000.0
+
+
+def animated_targets(count, frames, name='space_target'):
+    targets = []
+    for i in range(count):
+        loc = cmds.spaceLocator(name='{}{}_LOC'.format(name, i))[0]
+        cmds.setKeyframe(loc, attribute=['translate', 'rotate'], time=1)
+        cmds.setAttr(loc + '.translate', i + 1, i * 2, -i)
+        cmds.setAttr(loc + '.rotate', i * 10, 45, -i * 5)
+        cmds.setKeyframe(loc, attribute=['translate', 'rotate'], time=frames)
+        targets.append(loc)
+    return targets
+
+
+def benchmark_space_switch(count=100, target_count=4, frames=100,
+                           mode='parallel'):
+    # per-frame cost of the matrix space switch vs multi-target constraints
+    results = {}
+    for label, builder in [('matrix', nmSpace.add_space_switch),
+                           ('constraint', nmSpace.add_constraint_switch)]:
+        cmds.file(new=True, force=True)
+        cmds.playbackOptions(minTime=1, maxTime=frames)
+        targets = animated_targets(target_count, frames)
+        for i in range(count):
+            parent = cmds.group(empty=True, name='space_parent{}'.format(i))
+            ctrl = cmds.circle(name='space{}_CTRL'.format(i),
+                               constructionHistory=False)[0]
+            cmds.parent(ctrl, parent)
+            builder(ctrl, targets)
+            cmds.setAttr(ctrl + '.space', i % (target_count + 1))
+        results[label] = time_playback(1, frames, mode=mode)
+
+    results['speedup'] = results['constraint'] / max(results['matrix'], 1e-6)
+    print('space switch ({} controls, {} spaces, {}): matrix {:.3f} ms, '
+          'constraint {:.3f} ms per frame, {:.2f}x'.format(
+              count, target_count, mode, results['matrix'],
+              results['constraint'], results['speedup']))
+    return results
+
+
+def batch_specs(count):
+    # alternate templates and sides, offset so no two limbs overlap
+    specs = []
+    for i in range(count):
+        template = nmTemplates.template_names()[i % 2]
+        side = 'LR'[(i // 2) % 2]
+        specs.append({'template': template, 'side': side,
+                      'offset': [0, 0, i * 50.0]})
+    return specs
+
+
+def limb_recipes(count):
+    # guide sets for count limbs, numbered so their names don't clash
+    recipes = nmTemplates.create_guide_sets(batch_specs(count))
+    for i, recipe in enumerate(recipes):
+        recipe['part'] = '{}{}'.format(recipe['part'], i)
+        recipe['alias_list'] = ['{}{}'.format(a, i)
+                                for a in recipe['alias_list']]
+    return recipes
+
+
+def benchmark_batch(count=50):
+    # serial Limb builds vs planning up front with a main thread commit
+    results = {}
+    for label in ['serial', 'batch']:
+        cmds.file(new=True, force=True)
+        recipes = limb_recipes(count)
+        begin = time.time()
+        if label == 'serial':
+            for recipe in recipes:
+                nmLimb.Limb(**recipe).build_limb()
+        else:
+            built, timings = nmBatch.build_batch(recipes)
+            results['phases'] = timings
+        results[label] = time.time() - begin
+
+    results['speedup'] = results['serial'] / max(results['batch'], 1e-6)
+    print('batch build ({} limbs): serial {:.2f} s, batch {:.2f} s '
+          '(plan {:.4f} s), {:.2f}x'.format(
+              count, results['serial'], results['batch'],
+              results['phases']['plan'], results['speedup']))
+    return results
+
+
+def benchmark_ui_open(loops=10):
+    # first open builds the window, later opens only show the hidden one
+    results = {}
+    for label in ['cold', 'warm']:
+        times = []
+        for _ in range(loops):
+            if label == 'cold' and cmds.window(nmUI.WINDOW, exists=True):
+                cmds.deleteUI(nmUI.WINDOW)
+            times.append(nmUI.show())
+            nmUI.hide()
+        results[label] = min(times)
+
+    results['target'] = nmUI.OPEN_TARGET_MS
+    print('limb ui open: cold {:.1f} ms, warm {:.1f} ms, target {:.1f} ms '
+          '({})'.format(results['cold'], results['warm'], results['target'],
+                        'ok' if results['warm'] <= results['target']
+                        else 'over'))
+    return results
+
+
+def animate_limb(limb, frames):
+    # key every driving control so both chains evaluate each frame
+    for ctrl in limb.fk_ctrls:
+        cmds.setKeyframe(ctrl, attribute='rotate', time=1)
+        cmds.setAttr(ctrl + '.rotate', 10, 30, 20)
+        cmds.setKeyframe(ctrl, attribute='rotate', time=frames)
+    for ctrl in [limb.world_ctrl, limb.base_ctrl, limb.pv_ctrl]:
+        cmds.setKeyframe(ctrl, attribute='translate', time=1)
+        cmds.move(2, 3, -4, ctrl, relative=True)
+        cmds.setKeyframe(ctrl, attribute='translate', time=frames)
+    cmds.setAttr(limb.settings_ctrl + '.fkIk', 0.5)
+
+
+def sample_chain(limbs, frames):
+    return [[cmds.getAttr(j + '.worldMatrix[0]', time=frame)
+             for limb in limbs for j in limb.bind_chain]
+            for frame in range(1, frames + 1, max(frames // 10, 1))]
+
+
+def build_animated_limbs(count, frames, **limb_kwargs):
+    cmds.file(new=True, force=True)
+    cmds.playbackOptions(minTime=1, maxTime=frames)
+    limbs = []
+    for recipe in limb_recipes(count):
+        recipe.update(limb_kwargs)
+        limb = nmLimb.Limb(**recipe)
+        limb.build_limb()
+        animate_limb(limb, frames)
+        limbs.append(limb)
+    return limbs
+
+
+def benchmark_matrix_drive(count=20, frames=100, mode='parallel',
+                           add_stretch=True):
+    # constraint count, per-frame cost and pose difference of matrix drive
+    results = {}
+    samples = {}
+    for label, matrix_drive in [('constraint', False), ('matrix', True)]:
+        limbs = build_animated_limbs(count, frames, add_stretch=add_stretch,
+                                     matrix_drive=matrix_drive)
+        results[label] = {'constraints': nmDrive.constraint_count(),
+                          'nodes': len(cmds.ls()),
+                          'ms': time_playback(1, frames, mode=mode)}
+        samples[label] = sample_chain(limbs, frames)
+
+    results['max_error'] = max(
+        max(abs(a - b) for a, b in zip(ma, mb))
+        for fa, fb in zip(samples['constraint'], samples['matrix'])
+        for ma, mb in zip(fa, fb))
+    results['saved_ms'] = results['constraint']['ms'] - results['matrix']['ms']
+    print('matrix drive ({} limbs, {}): constraints {} -> {}, {:.3f} -> '
+          '{:.3f} ms per frame, max pose error {:.6f}'.format(
+              count, mode, results['constraint']['constraints'],
+              results['matrix']['constraints'], results['constraint']['ms'],
+              results['matrix']['ms'], results['max_error']))
+    return results
+
+
+def time_cached_playback(start=1, end=100, loops=3):
+    # the first pass fills the cache, the best later pass is reported
+    cmds.evaluator(name='cache', enable=True)
+    try:
+        return time_playback(start, end, mode='parallel', loops=loops + 1)
+    finally:
+        cmds.evaluator(name='cache', enable=False)
+
+
+def benchmark_controller_tags(count=20, frames=100):
+    # parallel and cached playback with and without controller tags
+    results = {}
+    for label, tags in [('untagged', False), ('tagged', True)]:
+        build_animated_limbs(count, frames, controller_tags=tags)
+        cmds.evaluator(name='controller', enable=tags)
+        results[label] = {'controllers': len(cmds.ls(type='controller')),
+                          'parallel': time_playback(1, frames),
+                          'cached': time_cached_playback(1, frames)}
+    cmds.evaluator(name='controller', enable=False)
+
+    print('controller tags ({} limbs): parallel {:.3f} -> {:.3f} ms, '
+          'cached {:.3f} -> {:.3f} ms per frame'.format(
+              count, results['untagged']['parallel'],
+              results['tagged']['parallel'], results['untagged']['cached'],
+              results['tagged']['cached']))
+    return results
+
+
+def benchmark_freeze_inactive(count=40, frames=100, mode='parallel'):
+    # half the limbs in pure FK, half in pure IK, with and without freezing
+    results = {}
+    for label, freeze in [('live', False), ('frozen', True)]:
+        limbs = build_animated_limbs(count, frames, add_stretch=True,
+                                     freeze_inactive=freeze)
+        for i, limb in enumerate(limbs):
+            cmds.setAttr(limb.settings_ctrl + '.fkIk', i % 2)
+        results[label] = time_playback(1, frames, mode=mode)
+
+    results['speedup'] = results['live'] / max(results['frozen'], 1e-6)
+    print('freeze inactive ({} limbs, {}): {:.3f} -> {:.3f} ms per frame, '
+          '{:.2f}x'.format(count, mode, results['live'], results['frozen'],
+                           results['speedup']))
+    return results
+
+
+def benchmark_lod(count=50, frames=100, mode='parallel'):
+    # node count and per-frame cost of the full rig against the anim lod
+    results = {}
+    for lod in nmLimb.LODS:
+        build_animated_limbs(count, frames, add_stretch=True, lod=lod)
+        results[lod] = {'nodes': len(cmds.ls()),
+                        'ms': time_playback(1, frames, mode=mode)}
+
+    results['speedup'] = results['full']['ms'] / max(results['anim']['ms'],
+                                                      1e-6)
+    print('lod ({} limbs, {}): full {} nodes {:.3f} ms, anim {} nodes '
+          '{:.3f} ms per frame, {:.2f}x'.format(
+              count, mode, results['full']['nodes'], results['full']['ms'],
+              results['anim']['nodes'], results['anim']['ms'],
+              results['speedup']))
+    return results
+
+
+def snap_freeze_chain(limb, suffix):
+    # chain placement as builds did it before 1.4.0, kept for comparison
+    cmds.select(clear=True)
+    chain = []
+    for j, a in zip(limb.joint_list, limb.alias_list):
+        jnt = cmds.joint(chain[-1] if chain else None,
+                         name='{}_{}_{}_JNT'.format(limb.side, a, suffix))
+        cmds.matchTransform(jnt, j)
+        cmds.makeIdentity(jnt, apply=True, translate=True, rotate=True,
+                          scale=True)
+        chain.append(jnt)
+    return chain
+
+
+def benchmark_placement(count=50, loops=3):
+    # snap-then-freeze chains against analytic placement, then whole builds
+    cmds.file(new=True, force=True)
+    limbs = []
+    for recipe in limb_recipes(count):
+        limb = nmLimb.Limb(**recipe)
+        limb.store_guides()
+        limbs.append(limb)
+
+    results = {}
+    for label in ['freeze', 'analytic']:
+        begin = time.time()
+        for i in range(loops):
+            suffix = '{}{}'.format(label, i)
+            for limb in limbs:
+                if label == 'freeze':
+                    snap_freeze_chain(limb, suffix)
+                else:
+                    limb.create_chain(suffix)
+        results[label] = (time.time() - begin) * 1000.0 / (loops * count)
+    results['speedup'] = results['freeze'] / max(results['analytic'], 1e-6)
+
+    # placement stages of full builds, from the build's own stage timings
+    stages = ['create_chains', 'create_fk_controls', 'create_ik_controls',
+              'create_settings_control']
+    results['stages'] = dict((s, 0.0) for s in stages)
+    begin = time.time()
+    for limb in limbs:
+        limb.build_limb()
+        for stage, seconds in limb.stage_times:
+            if stage in results['stages']:
+                results['stages'][stage] += seconds * 1000.0 / count
+    results['build'] = (time.time() - begin) * 1000.0 / count
+
+    print('placement ({} limbs): freeze {:.3f} ms, analytic {:.3f} ms per '
+          'chain, {:.2f}x; build {:.2f} ms per limb ({})'.format(
+              count, results['freeze'], results['analytic'],
+              results['speedup'], results['build'],
+              ', '.join('{} {:.2f}'.format(s, results['stages'][s])
+                        for s in stages)))
+    return results
+
+
+def chain_limb(joint_count):
+    # a Limb whose chain helpers build joint_count joints along X. they only
+    # read side, alias_list and chain_locals, so longer chains than the three
+    # joint limb can be timed
+    cmds.file(new=True, force=True)
+    recipe = nmTemplates.create_guide_sets(batch_specs(1))[0]
+    limb = nmLimb.Limb(**recipe)
+    limb.alias_list = ['seg{}'.format(i) for i in range(joint_count)]
+    limb.chain_locals = nmPlan.chain_locals(
+        [nmMath.translate_matrix([i * 2.0, 0.0, 0.0])
+         for i in range(joint_count)])
+    return limb
+
+
+def benchmark_chain_duplicate(joint_counts=(3, 10, 50), count=50):
+    # three built chains against one built chain and two duplicates
+    results = {}
+    for joint_count in joint_counts:
+        limb = chain_limb(joint_count)
+        row = {}
+        for label in ['build', 'duplicate']:
+            begin = time.time()
+            for i in range(count):
+                template = limb.create_chain('IK{}'.format(i))
+                for suffix in ['FK', 'bind']:
+                    suffix = '{}{}{}'.format(suffix, label, i)
+                    if label == 'build':
+                        limb.create_chain(suffix)
+                    else:
+                        limb.duplicate_chain(template, suffix)
+            row[label] = (time.time() - begin) * 1000.0 / count
+        row['speedup'] = row['build'] / max(row['duplicate'], 1e-6)
+        results[joint_count] = row
+        print('chains ({} joints): build {:.3f} ms, duplicate {:.3f} ms per '
+              'limb, {:.2f}x'.format(joint_count, row['build'],
+                                     row['duplicate'], row['speedup']))
+    return results
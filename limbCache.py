@@ -0,0 +1,175 @@
+import array
+import json
+import mmap
+import struct
+import sys
+
+# file layout, little endian:
+#   header   magic, version, frame count, joint count, channel count,
+#            start frame, frame step, json block size
+#   json     node and channel names, padded to a 4 byte boundary
+#   data     float32 frames x joints x channels
+
+MAGIC = b'NMLC'
+VERSION = 1
+HEADER = struct.Struct('<4sHIIHddI')
+CHANNELS = ['translateX', 'translateY', 'translateZ',
+            'rotateX', 'rotateY', 'rotateZ',
+            'scaleX', 'scaleY', 'scaleZ']
+
+
+def export_limb_cache(limb, file_path, start=None, end=None, step=1.0,
+                      include_controls=False):
+    # bake the bind chain (and optionally the controls) of a built Limb
+    import maya.cmds as cmds
+
+    nodes = list(limb.bind_chain)
+    if include_controls:
+        nodes += limb.fk_ctrls + [limb.world_ctrl, limb.local_ctrl,
+                                  limb.pv_ctrl, limb.base_ctrl,
+                                  limb.settings_ctrl]
+    if start is None:
+        start = cmds.playbackOptions(query=True, minTime=True)
+    if end is None:
+        end = cmds.playbackOptions(query=True, maxTime=True)
+
+    # sample with time specific queries instead of stepping the timeline
+    def sample(frame):
+        values = []
+        for node in nodes:
+            for attr in ['translate', 'rotate', 'scale']:
+                values.extend(cmds.getAttr(node + '.' + attr, time=frame)[0])
+        return values
+
+    return write_cache(file_path, nodes, frame_range(start, end, step),
+                       sample, step=step)
+
+
+def frame_range(start, end, step=1.0):
+    count = int(round((end - start) / float(step))) + 1
+    return [start + i * step for i in range(count)]
+
+
+def write_cache(file_path, nodes, frames, sample, channels=None, step=1.0):
+    # sample(frame) returns a flat list of joints x channels values
+    channels = channels or CHANNELS
+    names = json.dumps({'nodes': list(nodes),
+                        'channels': list(channels)}).encode('utf-8')
+    names += b' ' * (-(HEADER.size + len(names)) % 4)
+    start = frames[0] if frames else 0.0
+
+    with open(file_path, 'wb') as cache_file:
+        cache_file.write(HEADER.pack(MAGIC, VERSION, len(frames), len(nodes),
+                                     len(channels), start, step, len(names)))
+        cache_file.write(names)
+        # stream frame by frame so long ranges never sit in memory
+        for frame in frames:
+            values = array.array('f', sample(frame))
+            if len(values) != len(nodes) * len(channels):
+                raise ValueError('Frame {} has {} values, expected {}.'.format(
+                    frame, len(values), len(nodes) * len(channels)))
+            if sys.byteorder == 'big':
+                values.byteswap()
+            cache_file.write(values.tostring() if sys.version_info[0] < 3
+                             else values.tobytes())
+    return file_path
+
+
+class LimbCacheReader(object):
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.cache_file = open(file_path, 'rb')
+        self.data = mmap.mmap(self.cache_file.fileno(), 0,
+                              access=mmap.ACCESS_READ)
+
+        (magic, version, self.frame_count, self.joint_count,
+         self.channel_count, self.start, self.step,
+         names_size) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('{} is not a limb cache.'.format(file_path))
+        if version > VERSION:
+            self.close()
+            raise ValueError('Unsupported limb cache version {}.'.format(
+                version))
+
+        names = json.loads(self.data[HEADER.size:HEADER.size + names_size]
+                           .decode('utf-8'))
+        self.nodes = names['nodes']
+        self.channels = names['channels']
+        self.offset = HEADER.size + names_size
+        self.frame_size = self.joint_count * self.channel_count
+        self.frame_struct = struct.Struct('<{}f'.format(self.frame_size))
+
+    def __len__(self):
+        return self.frame_count
+
+    def __iter__(self):
+        for index in range(self.frame_count):
+            yield self.frame(index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if not self.data.closed:
+            self.data.close()
+        self.cache_file.close()
+
+    def frames(self):
+        return [self.start + i * self.step for i in range(self.frame_count)]
+
+    def frame_index(self, frame):
+        index = int(round((frame - self.start) / self.step))
+        if index < 0 or index >= self.frame_count:
+            raise IndexError('Frame {} is outside the cached range.'.format(
+                frame))
+        return index
+
+    def frame(self, index):
+        # joints x channels for one frame, only that frame is read
+        if index < 0:
+            index += self.frame_count
+        if index < 0 or index >= self.frame_count:
+            raise IndexError('Frame index {} out of range.'.format(index))
+        values = self.frame_struct.unpack_from(
+            self.data, self.offset + index * self.frame_size * 4)
+        return [list(values[j:j + self.channel_count])
+                for j in range(0, self.frame_size, self.channel_count)]
+
+    def frame_at(self, frame):
+        return self.frame(self.frame_index(frame))
+
+    def value(self, index, node, channel):
+        return self.read_value(index, self.position(node, channel))
+
+    def curve(self, node, channel):
+        # every frame of a single channel, strided reads only
+        position = self.position(node, channel)
+        return [self.read_value(i, position) for i in range(self.frame_count)]
+
+    def position(self, node, channel):
+        return self.nodes.index(node) * self.channel_count + \
+            self.channels.index(channel)
+
+    def read_value(self, index, position):
+        return struct.unpack_from(
+            '<f', self.data,
+            self.offset + (index * self.frame_size + position) * 4)[0]
+
+
+def apply_frame(reader, index, namespace=''):
+    # pose the cached nodes in the scene from one cached frame
+    import maya.cmds as cmds
+
+    for node, values in zip(reader.nodes, reader.frame(index)):
+        target = namespace + node
+        if not cmds.objExists(target):
+            continue
+        for channel, value in zip(reader.channels, values):
+            plug = target + '.' + channel
+            if cmds.getAttr(plug, settable=True):
+                cmds.setAttr(plug, value)
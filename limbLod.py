@@ -0,0 +1,125 @@
+import maya.cmds as cmds
+import json
+
+import nmrig.simpleLimbClass as nmLimb
+import nmrig.controlRegistry as nmRegistry
+reload(nmLimb)
+reload(nmRegistry)
+
+
+def limb_root(base_name):
+    settings = nmRegistry.control(base_name, 'settings')
+    if not settings:
+        cmds.error('No limb named {} in the scene.'.format(base_name))
+    return cmds.listConnections(settings + '.matchRoot', source=True,
+                                destination=False)[0]
+
+
+def read_recipe(base_name):
+    root = limb_root(base_name)
+    if not cmds.attributeQuery('limbRecipe', node=root, exists=True):
+        cmds.error('{} was built without a stored recipe.'.format(base_name))
+    return json.loads(cmds.getAttr(root + '.limbRecipe'))
+
+
+def swap_lods(base_names, lod):
+    return [swap_lod(base_name, lod) for base_name in base_names]
+
+
+def swap_lod(base_name, lod):
+    # rebuild a limb in another lod, keeping its animation and placement.
+    # both lods share control names and attributes so curves reconnect 1:1
+    if lod not in nmLimb.LODS:
+        cmds.error('Must provide one of {} for the lod.'.format(
+            ', '.join(nmLimb.LODS)))
+    recipe = read_recipe(base_name)
+    if recipe['lod'] == lod:
+        return None
+
+    cmds.undoInfo(openChunk=True)
+    try:
+        root = limb_root(base_name)
+        parent = cmds.listRelatives(root, parent=True)
+        nodes = nmRegistry.controls(base_name) + [root]
+        values = static_values(nodes)
+        curves = detach_animation(nodes)
+
+        delete_rig(base_name)
+        joint_list, pole_vector = create_recipe_guides(recipe)
+        kwargs = dict((str(k), v) for k, v in recipe.items()
+                      if k not in ['guide_matrices', 'pole_vector_position'])
+        kwargs.update(lod=lod, joint_list=joint_list,
+                      pole_vector=pole_vector, remove_guides=True)
+        result = nmLimb.Limb(**kwargs).build_limb()
+
+        if parent:
+            cmds.parent(result.all_grp, parent[0])
+        restore_values(values)
+        attach_animation(curves)
+    finally:
+        cmds.undoInfo(closeChunk=True)
+    return result
+
+
+def static_values(nodes):
+    values = []
+    for node in nodes:
+        for attr in cmds.listAttr(node, keyable=True, unlocked=True) or []:
+            plug = node + '.' + attr
+            if cmds.connectionInfo(plug, isDestination=True):
+                continue
+            values.append((plug, cmds.getAttr(plug)))
+    return values
+
+
+def restore_values(values):
+    for plug, value in values:
+        if not cmds.objExists(plug) or cmds.getAttr(plug, lock=True) or \
+                cmds.connectionInfo(plug, isDestination=True):
+            continue
+        cmds.setAttr(plug, value)
+
+
+def detach_animation(nodes):
+    # unplug the curves so deleting the rig leaves them behind
+    curves = []
+    for node in nodes:
+        pairs = cmds.listConnections(node, type='animCurve', source=True,
+                                     destination=False, connections=True,
+                                     plugs=True) or []
+        for dst, src in zip(pairs[::2], pairs[1::2]):
+            cmds.disconnectAttr(src, dst)
+            curves.append((src, dst))
+    return curves
+
+
+def attach_animation(curves):
+    for src, dst in curves:
+        if not cmds.objExists(dst):
+            cmds.warning('{} no longer exists, {} left unconnected.'.format(
+                dst, src.split('.')[0]))
+            continue
+        cmds.connectAttr(src, dst, force=True)
+
+
+def delete_rig(base_name):
+    # the hierarchy first, then whatever utility nodes it leaves behind
+    cmds.delete(limb_root(base_name))
+    nodes = [n for n in nmRegistry.rig_nodes(base_name) if cmds.objExists(n)]
+    if nodes:
+        cmds.delete(nodes)
+    nmRegistry.unregister_limb(base_name)
+
+
+def create_recipe_guides(recipe):
+    joint_list = []
+    for alias, matrix in zip(recipe['alias_list'], recipe['guide_matrices']):
+        jnt = cmds.createNode('joint', name='{}_{}_GDE'.format(
+            recipe['side'], alias))
+        cmds.xform(jnt, worldSpace=True, matrix=matrix)
+        joint_list.append(jnt)
+    pole_vector = cmds.createNode('joint', name='{}_{}_PV_GDE'.format(
+        recipe['side'], recipe['part']))
+    cmds.xform(pole_vector, worldSpace=True,
+               translation=recipe['pole_vector_position'])
+    return joint_list, pole_vector
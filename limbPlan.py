@@ -0,0 +1,187 @@
+import nmrig.mathUtils as nmMath
+
+# everything about a limb build that needs no scene access. plans are plain
+# dicts so they can be computed off the main thread and handed to
+# simpleLimbClass.Limb(plan=...) for the scene commit
+
+AXES = ['X', 'Y', 'Z', '-X', '-Y', '-Z']
+# build profiles: the full rig, or one chain with the same controls and
+# attributes for layout and crowd scenes
+LODS = ['full', 'anim']
+
+
+def stage_order(add_stretch=False, ik_spaces=None, controller_tags=True,
+                freeze_inactive=False, lod='full'):
+    # Limb methods run by build_limb, in order
+    if lod == 'anim':
+        # one chain, no blend, stretch or guide line networks
+        stages = ['store_guides', 'create_chains', 'size_controls',
+                  'create_fk_controls', 'create_ik_controls',
+                  'create_settings_control', 'create_ik_handle',
+                  'connect_anim_chain']
+        if add_stretch:
+            stages.append('add_stretch_attrs')
+    else:
+        stages = ['store_guides', 'create_chains', 'size_controls',
+                  'create_fk_controls', 'create_ik_controls',
+                  'create_settings_control', 'blend_chains',
+                  'create_ik_handle']
+        if add_stretch:
+            stages += ['add_ik_stretch', 'add_fk_stretch']
+    stages += ['organize_hierarchy', 'store_recipe']
+    if ik_spaces:
+        stages.append('add_space_switch')
+    stages += ['store_match_data', 'add_global_scale']
+    if controller_tags:
+        stages.append('add_controller_tags')
+    stages.append('finalize')
+    if freeze_inactive and lod == 'full':
+        stages.append('freeze_inactive_chain')
+    return stages
+
+
+def default_colors(base_name):
+    return {base_name + '_primary': [1, 1, 0],
+            base_name + '_pv': [0, 1, 1],
+            base_name + '_fk': [0, 0, 1],
+            base_name + '_secondary': [0, 0.2, 1]}
+
+
+def node_names(recipe):
+    # names the build creates and relies on, any of them already in the
+    # scene would be renamed by maya and break the build
+    side = recipe.get('side', 'L')
+    alias_list = recipe['alias_list']
+    lod = recipe.get('lod', 'full')
+    base_name = side + '_' + recipe.get('part', 'arm')
+    names = []
+    for suffix in ['IK', 'FK', 'bind'] if lod == 'full' else ['bind']:
+        names += ['{}_{}_{}_JNT'.format(side, a, suffix) for a in alias_list]
+    ctrls = ['{}_{}_FK_CTRL'.format(side, a) for a in alias_list]
+    ctrls += ['{}_{}_IK_CTRL'.format(side, alias_list[0]),
+              base_name + '_IK_CTRL', base_name + '_local_IK_CTRL',
+              base_name + '_PV_CTRL', base_name + '_settings_CTRL']
+    names += ctrls
+    names += [base_name + '_IKH', base_name + '_FK_CTRL_GRP',
+              base_name + '_IK_CTRL_GRP', base_name + '_skeleton_GRP',
+              base_name + '_noXform_GRP', base_name + '_rig_GRP',
+              base_name.upper(), base_name + '_fkIk_vis_REV']
+    if lod == 'anim':
+        names.append(base_name + '_root_REV')
+    elif recipe.get('add_stretch'):
+        names += [base_name + '_DST', base_name + '_CND',
+                  base_name + '_start_LOC', base_name + '_end_LOC',
+                  base_name + '_stretch_MDN', base_name + '_stretch_BTA',
+                  base_name + '_globalScale_MDL']
+    if recipe.get('controller_tags', True):
+        names += [ctrl + '_TAG' for ctrl in ctrls]
+    if recipe.get('freeze_inactive') and lod == 'full':
+        names += [base_name + '_ik_freeze_CND', base_name + '_fk_freeze_CND']
+    ik_spaces = recipe.get('ik_spaces')
+    for role, ctrl in [('ik', base_name + '_IK_CTRL'),
+                       ('pv', base_name + '_PV_CTRL'),
+                       ('baseIk', '{}_{}_IK_CTRL'.format(side,
+                                                         alias_list[0]))]:
+        targets = ik_spaces.get(role) if isinstance(ik_spaces, dict) \
+            else ik_spaces
+        if targets:
+            names += space_node_names(ctrl, targets)
+    return names
+
+
+def space_names(targets, default_name='limb'):
+    # enum names of a space switch, target leaf names without namespaces,
+    # numbered when two targets share one
+    names = []
+    for target in [default_name] + list(targets):
+        base = target.split('|')[-1].split(':')[-1]
+        name = base
+        index = 1
+        while name in names:
+            name = '{}{}'.format(base, index)
+            index += 1
+        names.append(name)
+    return names
+
+
+def space_node_names(ctrl, targets, default_name='limb'):
+    # nodes spaceSwitch.add_space_switch creates on every maya version
+    names = space_names(targets, default_name)
+    return [ctrl + '_space_WAM'] + \
+        ['{}_{}_space_CND'.format(ctrl, name) for name in names] + \
+        ['{}_{}_space_MMX'.format(ctrl, name) for name in names[1:]]
+
+
+def check_arguments(recipe):
+    # everything wrong with a set of Limb arguments, without scene access
+    issues = []
+    for key in ['side', 'part']:
+        if not recipe.get(key):
+            issues.append('Must provide a {}.'.format(key))
+    if len(recipe.get('joint_list') or []) != 3:
+        issues.append('Must provide three guides to build three joint limb.')
+    alias_list = recipe.get('alias_list') or []
+    if len(alias_list) != 3:
+        issues.append('Must provide three aliases, one for each joint.')
+    elif not all(alias_list) or len(set(alias_list)) != len(alias_list):
+        issues.append('Aliases must be unique and not empty.')
+    if not recipe.get('pole_vector'):
+        issues.append('Must provide a pole vector guide.')
+
+    primary_axis = recipe.get('primary_axis', 'X')
+    up_axis = recipe.get('up_axis', 'Y')
+    for axis in [primary_axis, up_axis]:
+        if axis not in AXES:
+            issues.append('Must provide either X, Y, or Z for the axis, '
+                          'got {!r}.'.format(axis))
+    if primary_axis in AXES and up_axis in AXES and \
+            primary_axis[-1] == up_axis[-1]:
+        issues.append('Primary and up axis must differ.')
+    if recipe.get('lod', 'full') not in LODS:
+        issues.append('Must provide one of {} for the lod.'.format(
+            ', '.join(LODS)))
+    return issues
+
+
+def chain_locals(guide_matrices):
+    # parent-space translate and joint orient of each joint in a chain
+    # built from the guides, rotate and scale stay at their defaults
+    result = []
+    parent_rot = nmMath.identity()
+    parent_point = [0.0, 0.0, 0.0]
+    for matrix in guide_matrices:
+        rot = nmMath.rotation(matrix)
+        point = nmMath.translation(matrix)
+        inverse_rot = nmMath.transpose_rotation(parent_rot)
+        result.append((nmMath.vector_mult(nmMath.sub(point, parent_point),
+                                          inverse_rot),
+                       nmMath.matrix_to_euler(nmMath.mult(rot, inverse_rot))))
+        parent_rot, parent_point = rot, point
+    return result
+
+
+def plan_limb(recipe, guide_matrices):
+    # recipe holds the Limb keyword arguments, guide_matrices the world
+    # matrices of its three guides
+    issues = check_arguments(recipe)
+    if issues:
+        raise ValueError(' '.join(issues))
+    side = recipe.get('side', 'L')
+    part = recipe.get('part', 'arm')
+    base_name = side + '_' + part
+    add_stretch = recipe.get('add_stretch', False)
+
+    points = [nmMath.translation(m) for m in guide_matrices]
+    lengths = [nmMath.length(nmMath.sub(b, a))
+               for a, b in zip(points[:-1], points[1:])]
+    return {'base_name': base_name,
+            'guide_matrices': [list(m) for m in guide_matrices],
+            'chain_locals': chain_locals(guide_matrices),
+            'length_total': sum(lengths),
+            # control size is a fraction of the start-to-end length
+            'radius': nmMath.length(nmMath.sub(points[-1], points[0])) / 5.0,
+            'names': node_names(recipe),
+            'stages': stage_order(add_stretch, recipe.get('ik_spaces'),
+                                  recipe.get('controller_tags', True),
+                                  recipe.get('freeze_inactive', False),
+                                  recipe.get('lod', 'full'))}
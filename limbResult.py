@@ -0,0 +1,104 @@
+import json
+
+# fixed record of what a limb build created. plain names only, no scene
+# access, so thousands can be held or written out by batch jobs
+
+FIELDS = ('base_name', 'side', 'part', 'version', 'lod', 'alias_list',
+          'add_stretch', 'primary_axis', 'up_axis', 'guide_matrices',
+          'joint_matrices', 'ik_chain', 'fk_chain', 'bind_chain',
+          'fk_ctrls', 'world_ctrl', 'local_ctrl', 'base_ctrl', 'pv_ctrl',
+          'settings_ctrl',
+          'all_grp', 'limb_rig_grp', 'skeleton_grp', 'no_xform_grp',
+          'fk_ctrl_grp', 'ik_ctrl_grp', 'fk_top_grp', 'settings_off',
+          'ikh', 'stretch_mdn', 'limb_cnd', 'stretch_bta',
+          'ik_drive_nodes', 'fk_drive_nodes', 'ik_stretch_nodes',
+          'fk_stretch_nodes', 'space_nodes', 'controller_nodes',
+          'freeze_nodes', 'length_total', 'created_nodes')
+
+SEQUENCE_FIELDS = ('alias_list', 'ik_chain', 'fk_chain', 'bind_chain',
+                   'fk_ctrls', 'ik_drive_nodes', 'fk_drive_nodes',
+                   'ik_stretch_nodes', 'fk_stretch_nodes', 'space_nodes',
+                   'controller_nodes', 'freeze_nodes', 'created_nodes')
+# lists of matrices, held as tuples of tuples
+MATRIX_FIELDS = ('guide_matrices', 'joint_matrices')
+
+
+class LimbResult(object):
+    __slots__ = FIELDS
+
+    def __init__(self, **kwargs):
+        unknown = set(kwargs) - set(FIELDS)
+        if unknown:
+            raise TypeError('Unknown LimbResult fields: {}'.format(
+                ', '.join(sorted(unknown))))
+        for field in FIELDS:
+            value = kwargs.get(field)
+            if field in SEQUENCE_FIELDS:
+                value = tuple(value or ())
+            elif field in MATRIX_FIELDS:
+                value = tuple(tuple(m) for m in value or ())
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('LimbResult is read only.')
+
+    def __delattr__(self, name):
+        raise AttributeError('LimbResult is read only.')
+
+    def __eq__(self, other):
+        return isinstance(other, LimbResult) and \
+            self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, f) for f in FIELDS))
+
+    def __repr__(self):
+        return 'LimbResult({!r}, {} nodes)'.format(self.base_name,
+                                                   len(self.created_nodes))
+
+    @property
+    def controls(self):
+        return self.fk_ctrls + tuple(
+            c for c in (self.world_ctrl, self.local_ctrl, self.base_ctrl,
+                        self.pv_ctrl, self.settings_ctrl) if c)
+
+    @property
+    def joints(self):
+        # the anim LOD has one chain standing in for all three
+        joints = []
+        for jnt in self.ik_chain + self.fk_chain + self.bind_chain:
+            if jnt not in joints:
+                joints.append(jnt)
+        return tuple(joints)
+
+    def to_dict(self):
+        data = {}
+        for field in FIELDS:
+            value = getattr(self, field)
+            if field in SEQUENCE_FIELDS:
+                value = list(value)
+            elif field in MATRIX_FIELDS:
+                value = [list(m) for m in value]
+            data[field] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**dict((k, v) for k, v in data.items() if k in FIELDS))
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+
+def from_limb(limb, version=None):
+    # attributes the build didn't create (no stretch, no spaces) stay None
+    return LimbResult(version=version,
+                      **dict((f, getattr(limb, f, None)) for f in FIELDS
+                             if f != 'version'))
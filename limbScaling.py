@@ -0,0 +1,249 @@
+import json
+import math
+import os
+import subprocess
+import time
+
+# how Limb.build_limb scales with scene size and limb count:
+#   scene   limbs built into scenes already holding n filler nodes
+#   limbs   n limbs built one after another into the same scene
+# every point records build ms, cmds call counts and heap memory, and each
+# sweep gets a log-log fit, ms = coefficient * n ** exponent. exponent 0 is
+# flat, 1 linear. results are JSON so runs from two commits can be compared
+#   mayapy -m nmrig.limbScaling run out.json
+#   python -m nmrig.limbScaling compare base.json head.json
+
+NODE_COUNTS = [1000, 5000, 20000, 50000]
+LIMB_COUNTS = [1, 5, 20, 50]
+LIMBS_PER_POINT = 5
+# call counts kept per point, the ones that walk the scene
+WATCHED_CALLS = ['ls', 'objExists', 'listConnections', 'listRelatives']
+EXPONENT_TOLERANCE = 0.15
+RATIO_THRESHOLD = 1.2
+
+
+def fit_power(xs, ys):
+    # least squares line through log x, log y
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys)
+              if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    count = float(len(points))
+    mean_x = sum(p[0] for p in points) / count
+    mean_y = sum(p[1] for p in points) / count
+    sxx = sum((p[0] - mean_x) ** 2 for p in points)
+    if sxx == 0:
+        return None
+    sxy = sum((p[0] - mean_x) * (p[1] - mean_y) for p in points)
+    exponent = sxy / sxx
+    intercept = mean_y - exponent * mean_x
+    total = sum((p[1] - mean_y) ** 2 for p in points)
+    residual = sum((p[1] - intercept - exponent * p[0]) ** 2 for p in points)
+    return {'exponent': exponent, 'coefficient': math.exp(intercept),
+            'r2': 1.0 - residual / total if total else 1.0}
+
+
+def median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def heap_mb():
+    import maya.cmds as cmds
+    return cmds.memory(heapMemory=True, megaByte=True)
+
+
+def filler_nodes(count):
+    # a mix of dag and dependency nodes, named like rig nodes so wildcard
+    # and name lookups have something to wade through
+    import maya.cmds as cmds
+    for i in range(count):
+        if i % 2:
+            cmds.createNode('multDoubleLinear',
+                            name='filler{}_MDL'.format(i))
+        else:
+            cmds.createNode('transform', name='filler{}_GRP'.format(i))
+
+
+def measure_build(recipe):
+    # one build with its time, call counts and memory growth
+    import maya.cmds as cmds
+    import nmrig.simpleLimbClass as nmLimb
+    import nmrig.buildTelemetry as nmTelemetry
+    nodes = len(cmds.ls())
+    memory = heap_mb()
+    counter = nmTelemetry.CallCounter()
+    begin = time.time()
+    with counter:
+        nmLimb.Limb(**recipe).build_limb()
+    return {'scene_nodes': nodes,
+            'ms': (time.time() - begin) * 1000.0,
+            'calls': counter.total(),
+            'watched': dict((c, counter.counts.get(c, 0))
+                            for c in WATCHED_CALLS),
+            'memory_mb': heap_mb() - memory}
+
+
+def summarize(n, builds):
+    return {'n': n,
+            'scene_nodes': median([b['scene_nodes'] for b in builds]),
+            'ms': median([b['ms'] for b in builds]),
+            'total_ms': sum(b['ms'] for b in builds),
+            'calls': median([b['calls'] for b in builds]),
+            'total_calls': sum(b['calls'] for b in builds),
+            'watched': dict((c, median([b['watched'][c] for b in builds]))
+                            for c in WATCHED_CALLS),
+            'memory_mb': sum(b['memory_mb'] for b in builds)}
+
+
+def sweep_scene(node_counts=NODE_COUNTS, limbs=LIMBS_PER_POINT):
+    # median ms per build against the scene size it was built into
+    import maya.cmds as cmds
+    import nmrig.limbBenchmark as nmBenchmark
+    points = []
+    for count in node_counts:
+        cmds.file(new=True, force=True)
+        filler_nodes(count)
+        builds = [measure_build(r) for r in nmBenchmark.limb_recipes(limbs)]
+        points.append(summarize(count, builds))
+        print('scene {:>7} nodes: {:.2f} ms per limb'.format(
+            count, points[-1]['ms']))
+    return points
+
+
+def sweep_limbs(limb_counts=LIMB_COUNTS):
+    # total ms for n limbs built one after another into one scene
+    import maya.cmds as cmds
+    import nmrig.limbBenchmark as nmBenchmark
+    points = []
+    for count in limb_counts:
+        cmds.file(new=True, force=True)
+        builds = [measure_build(r) for r in nmBenchmark.limb_recipes(count)]
+        points.append(summarize(count, builds))
+        print('{:>4} limbs: {:.1f} ms total, {:.2f} ms median'.format(
+            count, points[-1]['total_ms'], points[-1]['ms']))
+    return points
+
+
+def run(node_counts=NODE_COUNTS, limb_counts=LIMB_COUNTS,
+        limbs=LIMBS_PER_POINT):
+    import maya.cmds as cmds
+    import nmrig.simpleLimbClass as nmLimb
+    scene = sweep_scene(node_counts, limbs)
+    limb_points = sweep_limbs(limb_counts)
+    return {'commit': git_commit(), 'version': nmLimb.__version__,
+            'maya': cmds.about(version=True), 'timestamp': time.time(),
+            'sweeps': {'scene': scene, 'limbs': limb_points},
+            'fits': fits({'scene': scene, 'limbs': limb_points})}
+
+
+def fits(sweeps):
+    # scene builds per build against the nodes already there, the limbs
+    # sweep by totals over all its builds
+    result = {}
+    for name, points in sweeps.items():
+        if name == 'scene':
+            xs = [p['scene_nodes'] for p in points]
+            ms, calls = 'ms', 'calls'
+        else:
+            xs = [p['n'] for p in points]
+            ms, calls = 'total_ms', 'total_calls'
+        result[name + '_ms'] = fit_power(xs, [p[ms] for p in points])
+        result[name + '_calls'] = fit_power(xs, [p[calls] for p in points])
+    return result
+
+
+def compare(base, head, tolerance=EXPONENT_TOLERANCE,
+            threshold=RATIO_THRESHOLD):
+    # fits that got steeper and points that got slower between two runs
+    found = []
+    for key in sorted(set(base['fits']) & set(head['fits'])):
+        before, after = base['fits'][key], head['fits'][key]
+        if before and after and \
+                after['exponent'] - before['exponent'] > tolerance:
+            found.append({'what': key, 'kind': 'exponent',
+                          'base': before['exponent'],
+                          'head': after['exponent']})
+    for name in sorted(set(base['sweeps']) & set(head['sweeps'])):
+        head_points = dict((p['n'], p) for p in head['sweeps'][name])
+        for point in base['sweeps'][name]:
+            other = head_points.get(point['n'])
+            if other and point['ms'] and \
+                    other['ms'] / point['ms'] >= threshold:
+                found.append({'what': '{} n={}'.format(name, point['n']),
+                              'kind': 'ms', 'base': point['ms'],
+                              'head': other['ms']})
+    return found
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Limb build scaling.')
+    sub = parser.add_subparsers(dest='command')
+    run_parser = sub.add_parser('run')
+    run_parser.add_argument('output')
+    run_parser.add_argument('--nodes', type=int, nargs='+',
+                            default=NODE_COUNTS)
+    run_parser.add_argument('--limbs', type=int, nargs='+',
+                            default=LIMB_COUNTS)
+    run_parser.add_argument('--per-point', type=int, default=LIMBS_PER_POINT)
+    cmp_parser = sub.add_parser('compare')
+    cmp_parser.add_argument('base')
+    cmp_parser.add_argument('head')
+    cmp_parser.add_argument('--tolerance', type=float,
+                            default=EXPONENT_TOLERANCE)
+    cmp_parser.add_argument('--threshold', type=float,
+                            default=RATIO_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        try:
+            import maya.standalone
+            maya.standalone.initialize()
+        except (ImportError, RuntimeError):
+            pass
+        results = run(args.nodes, args.limbs, args.per_point)
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        for key, fit in sorted(results['fits'].items()):
+            if fit:
+                print('{:<14} exponent {:.2f} (r2 {:.2f})'.format(
+                    key, fit['exponent'], fit['r2']))
+        return 0
+
+    if args.command == 'compare':
+        with open(args.base) as base_file:
+            base = json.load(base_file)
+        with open(args.head) as head_file:
+            head = json.load(head_file)
+        rows = compare(base, head, args.tolerance, args.threshold)
+        for row in rows:
+            print('{what:<20} {kind:<9} {base:>10.2f} -> {head:>10.2f}'.format(
+                **row))
+        if not rows:
+            print('no scaling regressions ({} -> {})'.format(
+                base.get('commit'), head.get('commit')))
+        return 1 if rows else 0
+
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
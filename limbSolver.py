@@ -0,0 +1,302 @@
+import nmrig.mathUtils as nmMath
+
+try:
+    import numpy
+except ImportError:
+    # mayapy ships numpy from 2022 on, the python loop is the fallback
+    numpy = None
+
+# pure python reference evaluation of the three joint limb built by
+# simpleLimbClass.Limb, mirrors the node network one to one:
+#   ik stretch   distanceBetween / length_total -> condition (>=) ->
+#                blendTwoAttr(1, ratio, stretch) -> up/lo PMA (mult + bta - 1)
+#   global scale all_grp scale and the globalScale MDL on length_total
+#   fk stretch   fk joint scale and OFF_LOC translate multiplied by stretch
+#   bind chain   blendColors on translate, rotate and scale by fkIk
+# poses are plain dicts, any key left out falls back to the rest value:
+#   base, end, pole         world positions of the ik root, local IK control
+#                           and PV control
+#   fk_rotate               one xyz euler per FK control
+#   fk_stretch              one value per FK control with stretch
+#   fk_ik, stretch, up, lo  settings/world control attributes
+#   global_scale            all_grp.globalScale
+
+
+class LimbSolver(object):
+    def __init__(self, rest_matrices, pole_vector, primary_axis='X',
+                 add_stretch=False):
+        if len(rest_matrices) != 3:
+            raise ValueError('Must provide three rest matrices.')
+
+        self.rest_matrices = [list(m) for m in rest_matrices]
+        self.pole_vector = list(pole_vector)
+        self.primary_axis = primary_axis
+        self.add_stretch = add_stretch
+        self.pa_index = nmMath.AXIS_INDEX[primary_axis[-1]]
+
+        # everything that only depends on the rest pose is computed once
+        self.rest_positions = [nmMath.translation(m)
+                               for m in self.rest_matrices]
+        self.rest_rotations = [nmMath.rotation(m) for m in self.rest_matrices]
+        parents = [nmMath.identity()] + self.rest_rotations[:-1]
+        self.joint_orients = [nmMath.mult(rot, nmMath.transpose_rotation(par))
+                              for rot, par in zip(self.rest_rotations,
+                                                  parents)]
+        self.rest_translates = [self.rest_positions[0]] + [
+            nmMath.vector_mult(nmMath.sub(pos, par_pos),
+                               nmMath.transpose_rotation(par_rot))
+            for pos, par_pos, par_rot in zip(self.rest_positions[1:],
+                                             self.rest_positions[:-1],
+                                             self.rest_rotations[:-1])]
+        self.length_a = nmMath.length(nmMath.sub(self.rest_positions[1],
+                                                 self.rest_positions[0]))
+        self.length_b = nmMath.length(nmMath.sub(self.rest_positions[2],
+                                                 self.rest_positions[1]))
+        self.length_total = self.length_a + self.length_b
+
+        self.rest_normal = self.plane_normal(self.rest_positions[0],
+                                             self.rest_positions[2],
+                                             self.pole_vector)
+        self.rest_frames = [
+            self.bone_frame(self.rest_positions[0], self.rest_positions[1],
+                            self.rest_normal),
+            self.bone_frame(self.rest_positions[1], self.rest_positions[2],
+                            self.rest_normal)]
+
+    def evaluate(self, poses):
+        # bind chain world matrices for a batch of poses
+        if numpy is not None and poses:
+            return self.evaluate_batch(poses)
+        results = []
+        for pose in poses:
+            gs = pose.get('global_scale', 1.0)
+            ik_channels = self.ik_channels(pose)
+            fk_channels = self.fk_channels(pose)
+            blend = pose.get('fk_ik', 1.0)
+            bind_channels = [
+                [[nmMath.lerp(f, i, blend) for f, i in zip(fk_ch, ik_ch)]
+                 for fk_ch, ik_ch in zip(fk_jnt, ik_jnt)]
+                for fk_jnt, ik_jnt in zip(fk_channels, ik_channels)]
+            results.append(self.forward(bind_channels, gs))
+        return results
+
+    def evaluate_batch(self, poses):
+        # the same as evaluate with the blend and forward pass done by numpy
+        # over the whole batch, channels are (pose, joint, trs, xyz)
+        ik = numpy.array([self.ik_channels(pose) for pose in poses], float)
+        fk = numpy.array([self.fk_channels(pose) for pose in poses], float)
+        blend = numpy.array([pose.get('fk_ik', 1.0) for pose in poses],
+                            float)
+        global_scale = numpy.array([pose.get('global_scale', 1.0)
+                                    for pose in poses], float)
+        bind = fk + (ik - fk) * blend[:, None, None, None]
+        return self.forward_batch(bind, global_scale).tolist()
+
+    def forward_batch(self, channels, global_scale):
+        # forward with numpy arrays, returns (pose, joint, 16) matrices
+        count = len(channels)
+        orients = numpy.array(self.joint_orients, float).reshape(
+            -1, 4, 4)[:, :3, :3]
+        parent_rot = numpy.tile(numpy.eye(3), (count, 1, 1))
+        parent_pos = numpy.zeros((count, 3))
+        parent_scale = numpy.repeat(global_scale[:, None], 3, axis=1)
+        results = numpy.zeros((count, len(orients), 4, 4))
+        for i, orient in enumerate(orients):
+            translate, rotate, scale = [channels[:, i, c] for c in range(3)]
+            position = parent_pos + numpy.einsum(
+                'nj,njk->nk', translate * parent_scale, parent_rot)
+            world_rot = numpy.matmul(numpy.matmul(euler_batch(rotate),
+                                                  orient), parent_rot)
+            world_scale = scale * global_scale[:, None]
+            results[:, i, :3, :3] = world_scale[:, :, None] * world_rot
+            results[:, i, 3, :3] = position
+            results[:, i, 3, 3] = 1.0
+            parent_rot, parent_pos = world_rot, position
+            parent_scale = world_scale
+        return results.reshape(count, len(orients), 16)
+
+    def solve_ik(self, poses):
+        return [self.forward(self.ik_channels(pose),
+                             pose.get('global_scale', 1.0))
+                for pose in poses]
+
+    def solve_fk(self, poses):
+        return [self.forward(self.fk_channels(pose),
+                             pose.get('global_scale', 1.0))
+                for pose in poses]
+
+    def stretch_factor(self, distance, global_scale=1.0, stretch=1.0):
+        return stretch_factor(distance, self.length_total, global_scale,
+                              stretch)
+
+    def ik_channels(self, pose):
+        # translate, rotate and scale channels of the ik chain
+        # solve in rig space, all_grp scales the rig about the origin
+        gs = pose.get('global_scale', 1.0)
+        base, end, pole = [
+            nmMath.scale(pose[key], 1.0 / gs) if key in pose else list(rest)
+            for key, rest in [('base', self.rest_positions[0]),
+                              ('end', self.rest_positions[2]),
+                              ('pole', self.pole_vector)]]
+
+        up_scale = lo_scale = 1.0
+        if self.add_stretch:
+            bta = self.stretch_factor(
+                nmMath.length(nmMath.sub(end, base)) * gs, gs,
+                pose.get('stretch', 1.0))
+            up_scale = pose.get('up', 1.0) + bta - 1
+            lo_scale = pose.get('lo', 1.0) + bta - 1
+
+        elbow, wrist = self.two_bone(base, end, pole,
+                                     self.length_a * up_scale,
+                                     self.length_b * lo_scale)
+        normal = self.plane_normal(base, end, pole)
+        world_rotations = []
+        for i, (start, tip) in enumerate([(base, elbow), (elbow, wrist)]):
+            frame = self.bone_frame(start, tip, normal)
+            delta = nmMath.mult(nmMath.transpose_rotation(self.rest_frames[i]),
+                                frame)
+            world_rotations.append(nmMath.mult(self.rest_rotations[i], delta))
+        # the end joint just follows the lower joint
+        world_rotations.append(nmMath.mult(
+            self.joint_orients[2], world_rotations[1]))
+
+        channels = []
+        parent = nmMath.identity()
+        for i, world_rot in enumerate(world_rotations):
+            local = nmMath.mult(world_rot, nmMath.transpose_rotation(parent))
+            rotate = nmMath.matrix_to_euler(nmMath.mult(
+                local, nmMath.transpose_rotation(self.joint_orients[i])))
+            translate = base if i == 0 else self.rest_translates[i]
+            channels.append([translate, rotate,
+                             self.primary_scale([up_scale, lo_scale, 1.0][i])])
+            parent = world_rot
+        return channels
+
+    def fk_channels(self, pose):
+        rotates = pose.get('fk_rotate', [[0.0, 0.0, 0.0]] * 3)
+        stretches = pose.get('fk_stretch', [1.0, 1.0]) if self.add_stretch \
+            else [1.0, 1.0]
+        stretches = list(stretches) + [1.0]
+        return [[self.rest_translates[i], list(rotates[i]),
+                 self.primary_scale(stretches[i])] for i in range(3)]
+
+    def forward(self, channels, global_scale=1.0):
+        # maya joint evaluation with segment scale compensate:
+        # world = S * R * JO * IS * T * parent_world
+        results = []
+        parent_rot = nmMath.identity()
+        parent_pos = [0.0, 0.0, 0.0]
+        parent_scale = [global_scale] * 3
+        for i, (translate, rotate, scale) in enumerate(channels):
+            offset = nmMath.vector_mult(
+                [t * s for t, s in zip(translate, parent_scale)], parent_rot)
+            position = nmMath.add(parent_pos, offset)
+            world_rot = nmMath.mult_all([nmMath.euler_to_matrix(rotate),
+                                         self.joint_orients[i], parent_rot])
+            world_scale = [s * global_scale for s in scale]
+            matrix = nmMath.mult(nmMath.scale_matrix(world_scale), world_rot)
+            results.append(nmMath.set_translation(matrix, position))
+            parent_rot, parent_pos = world_rot, position
+            parent_scale = world_scale
+        return results
+
+    def primary_scale(self, value):
+        scale = [1.0, 1.0, 1.0]
+        scale[self.pa_index] = value
+        return scale
+
+    def two_bone(self, base, end, pole, length_a, length_b):
+        # law of cosines solve in the plane of base, end and pole vector
+        to_end = nmMath.sub(end, base)
+        dist = nmMath.length(to_end)
+        direction = nmMath.normalize(to_end)
+        if dist >= length_a + length_b or dist < 1e-8:
+            elbow = nmMath.add(base, nmMath.scale(direction, length_a))
+            wrist = nmMath.add(elbow, nmMath.scale(direction, length_b))
+            return elbow, wrist
+
+        bend = nmMath.cross(self.plane_normal(base, end, pole), direction)
+        cos_a = (length_a * length_a + dist * dist - length_b * length_b) / \
+            (2.0 * length_a * dist)
+        cos_a = max(-1.0, min(1.0, cos_a))
+        sin_a = (1.0 - cos_a * cos_a) ** 0.5
+        elbow = nmMath.add(base, nmMath.add(
+            nmMath.scale(direction, length_a * cos_a),
+            nmMath.scale(bend, length_a * sin_a)))
+        return elbow, list(end)
+
+    def plane_normal(self, base, end, pole):
+        normal = nmMath.normalize(nmMath.cross(nmMath.sub(end, base),
+                                               nmMath.sub(pole, base)))
+        if nmMath.length(normal) < 0.5:
+            return list(getattr(self, 'rest_normal', [0.0, 0.0, 1.0]))
+        return normal
+
+    def bone_frame(self, start, tip, normal):
+        aim = nmMath.normalize(nmMath.sub(tip, start))
+        return nmMath.from_rows(aim, normal, nmMath.cross(aim, normal))
+
+
+def euler_batch(rotates):
+    # nmMath.euler_to_matrix over an (n, 3) array, (n, 3, 3) rotations
+    rx, ry, rz = numpy.radians(rotates).T
+    cx, sx = numpy.cos(rx), numpy.sin(rx)
+    cy, sy = numpy.cos(ry), numpy.sin(ry)
+    cz, sz = numpy.cos(rz), numpy.sin(rz)
+    rows = [[cy * cz, cy * sz, -sy],
+            [sx * sy * cz - cx * sz, sx * sy * sz + cx * cz, sx * cy],
+            [cx * sy * cz + sx * sz, cx * sy * sz - sx * cz, cx * cy]]
+    return numpy.stack([numpy.stack(r, axis=-1) for r in rows], axis=-2)
+
+
+def stretch_factor(distance, length_total, global_scale=1.0, stretch=1.0):
+    # condition node: ratio when distance >= length, else colorIfFalse
+    length = length_total * global_scale
+    ratio = distance / length if distance >= length else 1.0
+    return nmMath.lerp(1.0, ratio, stretch)
+
+
+def from_limb(limb):
+    # reference solver for a built simpleLimbClass.Limb
+    import maya.cmds as cmds
+    pole_vector = cmds.xform(limb.pv_ctrl, query=True, worldSpace=True,
+                             rotatePivot=True)
+    return LimbSolver(limb.guide_matrices, pole_vector,
+                      primary_axis=limb.primary_axis,
+                      add_stretch=limb.add_stretch)
+
+
+def sample_pose(limb):
+    # current control values of a built limb as a solver pose
+    import maya.cmds as cmds
+    pose = {'base': cmds.xform(limb.ik_chain[0], query=True, worldSpace=True,
+                               translation=True),
+            'end': cmds.xform(limb.local_ctrl, query=True, worldSpace=True,
+                              rotatePivot=True),
+            'pole': cmds.xform(limb.pv_ctrl, query=True, worldSpace=True,
+                               rotatePivot=True),
+            'fk_rotate': [cmds.getAttr(c + '.rotate')[0]
+                          for c in limb.fk_ctrls],
+            'fk_ik': cmds.getAttr(limb.settings_ctrl + '.fkIk'),
+            'global_scale': cmds.getAttr(limb.all_grp + '.globalScale')}
+    if limb.add_stretch:
+        part = limb.part.title()
+        pose['fk_stretch'] = [cmds.getAttr(c + '.stretch')
+                              for c in limb.fk_ctrls[:-1]]
+        pose['stretch'] = cmds.getAttr(limb.world_ctrl + '.stretch')
+        pose['up'] = cmds.getAttr(limb.world_ctrl + '.up' + part)
+        pose['lo'] = cmds.getAttr(limb.world_ctrl + '.lo' + part)
+    return pose
+
+
+def compare_limb(limb, tolerance=0.001):
+    # joints whose evaluated matrix disagrees with the reference solve
+    import maya.cmds as cmds
+    expected = from_limb(limb).evaluate([sample_pose(limb)])[0]
+    mismatched = []
+    for jnt, matrix in zip(limb.bind_chain, expected):
+        actual = cmds.xform(jnt, query=True, worldSpace=True, matrix=True)
+        if not nmMath.is_close(actual, matrix, tolerance):
+            mismatched.append(jnt)
+    return mismatched
@@ -1,37 +1,112 @@
 import maya.cmds as cmds
+import json
+import time
+
 import nmrig.simpleLimbClass as nmLimb
+import nmrig.guideTemplates as nmTemplates
 reload(nmLimb)
+reload(nmTemplates)
+
+WINDOW = 'LimbCreatorUI'
+STATE_VAR = 'nmrigLimbUIState'
+# reopening a hidden window should feel instant
+OPEN_TARGET_MS = 50.0
+
+DEFAULT_STATE = {'side': 'L', 'part': 'arm',
+                 'aliases': ['shoulder', 'elbow', 'wrist'],
+                 'guides': ['', '', ''], 'pole_vector': '',
+                 'template': 'arm', 'height': 170.0,
+                 'primary_axis': 'X', 'up_axis': 'Y',
+                 'stretch': True, 'remove_guides': True,
+                 'colors': {'primary': [1, 1, 0], 'fk': [0, 0, 1],
+                            'secondary': [0, 0.2, 1], 'pv': [0, 1, 1]},
+                 'expanded': ['Build Data']}
+
+
+def show():
+    # reuse the hidden window when there is one, build it otherwise, and
+    # return the ms it took. the window is found by name, it outlives a
+    # reload of this module
+    begin = time.time()
+    if cmds.window(WINDOW, exists=True):
+        cmds.showWindow(WINDOW)
+    else:
+        LimbUI()
+    return (time.time() - begin) * 1000.0
+
+
+def hide():
+    # the window's Close button also stores the state before hiding
+    if cmds.window(WINDOW, exists=True):
+        cmds.window(WINDOW, edit=True, visible=False)
+
+
+def load_state():
+    state = json.loads(json.dumps(DEFAULT_STATE))
+    if cmds.optionVar(exists=STATE_VAR):
+        try:
+            state.update(json.loads(cmds.optionVar(query=STATE_VAR)))
+        except ValueError:
+            pass
+    return state
+
+
+def save_state(state):
+    cmds.optionVar(stringValue=(STATE_VAR, json.dumps(state)))
 
 
 class LimbUI():
     def __init__(self):
-        if cmds.window('LimbCreatorUI', exists=True):
-            cmds.deleteUI('LimbCreatorUI')
-
-        # create our window
-        self.window = cmds.window('LimbCreatorUI', title='Limb Creator',
-                                  width=503, height=543)
+        if cmds.window(WINDOW, exists=True):
+            cmds.error('{} is already open, use show() to raise it.'.format(
+                WINDOW))
+
+        # last used settings, frames that are never expanded read from here
+        self.state = load_state()
+        self.built = []
+
+        # create our window, closing only hides it so it can be reused
+        frames = [('Build Data', 265, self.build_data_frame),
+                  ('Build Arguments', 180, self.build_arguments_frame),
+                  ('Color Settings', 90, self.color_settings_frame)]
+        height = 43 + sum(h if label in self.state['expanded'] else 25
+                          for label, h, _ in frames)
+        self.window = cmds.window(WINDOW, title='Limb Creator', retain=True,
+                                  width=503, height=height,
+                                  closeCommand=lambda: self.store_state())
 
         # create main layout
-        self.main_layout = cmds.columnLayout(width=503, height=543)
+        self.main_layout = cmds.columnLayout(width=503, height=height)
 
-        # add frame layouts
-        self.build_data_frame()
-        self.build_arguments_frame()
-        self.color_settings_frame()
+        # add frame layouts, collapsed ones are filled in on first expand
+        for label, frame_height, builder in frames:
+            self.add_frame(label, frame_height, builder)
         self.button_grid()
 
         # show window
         cmds.showWindow(self.window)
 
-    def build_data_frame(self):
-        data_frame = cmds.frameLayout(label='Build Data', width=500, height=230,
-                                      collapsable=True, parent=self.main_layout,
-                                      collapseCommand=lambda: self.collapse_cmd(
-                                          data_frame, 230),
-                                      expandCommand=lambda: self.expand_cmd(
-                                          data_frame, 230))
-
+    def add_frame(self, label, height, builder):
+        expanded = label in self.state['expanded']
+        frame = cmds.frameLayout(label=label, width=500,
+                                 height=height if expanded else 25,
+                                 collapsable=True, collapse=not expanded,
+                                 parent=self.main_layout)
+        cmds.frameLayout(frame, edit=True,
+                         collapseCommand=lambda: self.collapse_cmd(
+                             frame, height, label),
+                         expandCommand=lambda: self.expand_cmd(
+                             frame, height, label, builder))
+        if expanded:
+            self.build_frame(frame, label, builder)
+
+    def build_frame(self, frame, label, builder):
+        if label not in self.built:
+            builder(frame)
+            self.built.append(label)
+
+    def build_data_frame(self, data_frame):
+        state = self.state
         rcl = cmds.rowColumnLayout(numberOfColumns=3,
                                    columnWidth=[(1, 200), (2, 200), (3, 100)],
                                    columnOffset=[(1, 'both', 5), (2, 'both', 0),
@@ -45,27 +120,48 @@ class LimbUI():
         cmds.text(label='Load', align='left', fn='boldLabelFont',
                   height=30, parent=rcl)
 
-        limb01_alias = cmds.textField(height=30, text='shoulder', parent=rcl)
-        limb01_guide = cmds.textField(height=30, parent=rcl)
+        limb01_alias = cmds.textField(height=30, text=state['aliases'][0],
+                                      parent=rcl)
+        limb01_guide = cmds.textField(height=30, text=state['guides'][0],
+                                      parent=rcl)
         limb01_load = cmds.button(label='load selected', height=30, parent=rcl,
                                   command=lambda x: self.load_sel(limb01_guide))
 
-        limb02_alias = cmds.textField(height=30, text='elbow', parent=rcl)
-        limb02_guide = cmds.textField(height=30, parent=rcl)
+        limb02_alias = cmds.textField(height=30, text=state['aliases'][1],
+                                      parent=rcl)
+        limb02_guide = cmds.textField(height=30, text=state['guides'][1],
+                                      parent=rcl)
         limb02_load = cmds.button(label='load selected', height=30, parent=rcl,
                                   command=lambda x: self.load_sel(limb02_guide))
 
-        limb03_alias = cmds.textField(height=30, text='wrist', parent=rcl)
-        limb03_guide = cmds.textField(height=30, parent=rcl)
+        limb03_alias = cmds.textField(height=30, text=state['aliases'][2],
+                                      parent=rcl)
+        limb03_guide = cmds.textField(height=30, text=state['guides'][2],
+                                      parent=rcl)
         limb03_load = cmds.button(label='load selected', height=30, parent=rcl,
                                   command=lambda x: self.load_sel(limb03_guide))
 
         pv_alias = cmds.textField(height=30, text='pole vector', enable=False,
                                   parent=rcl)
-        self.pv_guide = cmds.textField(height=30, parent=rcl)
+        self.pv_guide = cmds.textField(height=30, text=state['pole_vector'],
+                                       parent=rcl)
         pv_load = cmds.button(label='load selected', height=30, parent=rcl,
                               command=lambda x: self.load_sel(self.pv_guide))
 
+        # spawn a guide template instead of loading guides one by one
+        self.template_menu = cmds.optionMenu(height=30, parent=rcl)
+        for template in nmTemplates.template_names():
+            cmds.menuItem(label=template, parent=self.template_menu)
+        if state['template'] in nmTemplates.template_names():
+            cmds.optionMenu(self.template_menu, edit=True,
+                            value=state['template'])
+        self.height_field = cmds.floatField(height=30, value=state['height'],
+                                            minValue=1, precision=1,
+                                            parent=rcl)
+        template_btn = cmds.button(label='spawn guides', height=30,
+                                   parent=rcl,
+                                   command=lambda x: self.spawn_template())
+
         # text labels
         cmds.text(label='Side', align='left', fn='obliqueLabelFont',
                   height=20, parent=rcl)
@@ -74,10 +170,13 @@ class LimbUI():
         cmds.text(label='Base Name', align='left', fn='obliqueLabelFont',
                   height=20, parent=rcl)
 
-        self.side_txt = cmds.textField(height=30, text='L', parent=rcl)
-        self.part_txt = cmds.textField(height=30, text='arm', parent=rcl)
-        self.base_txt = cmds.textField(height=30, text='L_arm', enable=False,
+        self.side_txt = cmds.textField(height=30, text=state['side'],
                                        parent=rcl)
+        self.part_txt = cmds.textField(height=30, text=state['part'],
+                                       parent=rcl)
+        self.base_txt = cmds.textField(height=30, enable=False,
+                                       text=state['side'] + '_' +
+                                       state['part'], parent=rcl)
         cmds.textField(self.side_txt, edit=True, changeCommand = lambda x:
                        self.change_base_name())
         cmds.textField(self.part_txt, edit=True, changeCommand=lambda x:
@@ -85,14 +184,7 @@ class LimbUI():
         self.joint_list = [limb01_guide, limb02_guide, limb03_guide]
         self.alias_list = [limb01_alias, limb02_alias, limb03_alias]
 
-    def build_arguments_frame(self):
-        arg_frame = cmds.frameLayout(label='Build Arguments', width=500, height=180,
-                                     collapsable=True, parent=self.main_layout,
-                                     collapseCommand=lambda: self.collapse_cmd(
-                                         arg_frame, 180),
-                                     expandCommand=lambda: self.expand_cmd(
-                                         arg_frame, 180))
-
+    def build_arguments_frame(self, arg_frame):
         baf_col = cmds.rowColumnLayout(numberOfColumns=1,
                                        columnWidth=[(1, 500)],
                                        columnOffset=[(1, 'both', 0)],
@@ -111,14 +203,7 @@ class LimbUI():
                   height=30, parent=prcl)
         self.pa_col = cmds.radioCollection(numberOfCollectionItems=6,
                                            parent=prcl)
-        px = cmds.radioButton(label='X', parent=prcl)
-        py = cmds.radioButton(label='Y', parent=prcl)
-        pz = cmds.radioButton(label='Z', parent=prcl)
-        cmds.separator(style='none', parent=prcl)
-        pnx = cmds.radioButton(label='-X', parent=prcl)
-        pny = cmds.radioButton(label='-Y', parent=prcl)
-        pnz = cmds.radioButton(label='-Z', parent=prcl)
-        cmds.radioCollection(self.pa_col, edit=True, select=px)
+        self.axis_buttons(prcl, self.pa_col, self.state['primary_axis'])
         cmds.separator(style='in', p=baf_col)
 
         urcl = cmds.rowColumnLayout(numberOfColumns=4, height=60,
@@ -132,34 +217,32 @@ class LimbUI():
 
         cmds.text(label='Up Axis:', align='left', fn='boldLabelFont',
                   height=30, parent=urcl)
-        self.ua_col = cmds.radioCollection()
-        ux = cmds.radioButton(label='X', parent=urcl)
-        uy = cmds.radioButton(label='Y', parent=urcl)
-        uz = cmds.radioButton(label='Z', parent=urcl)
-        cmds.separator(style='none', parent=urcl)
-        unx = cmds.radioButton(label='-X', parent=urcl)
-        uny = cmds.radioButton(label='-Y', parent=urcl)
-        unz = cmds.radioButton(label='-Z', parent=urcl)
-        cmds.radioCollection(self.ua_col, edit=True, select=uy)
+        self.ua_col = cmds.radioCollection(parent=urcl)
+        self.axis_buttons(urcl, self.ua_col, self.state['up_axis'])
         cmds.separator(style='in', p=baf_col)
 
         cb_grid = cmds.gridLayout(numberOfColumns=2,
                                   cellWidthHeight=(250, 30),
                                   parent=baf_col)
-        self.stretch_cb = cmds.checkBox(label=' -  Is Stretchy', value=True,
+        self.stretch_cb = cmds.checkBox(label=' -  Is Stretchy',
+                                        value=self.state['stretch'],
                                         parent=cb_grid)
-        self.remove_cb = cmds.checkBox(label=' -  Remove Guides', value=True,
+        self.remove_cb = cmds.checkBox(label=' -  Remove Guides',
+                                       value=self.state['remove_guides'],
                                        parent=cb_grid)
 
-    def color_settings_frame(self):
-        color_frame = cmds.frameLayout(label='Color Settings',
-                                       width=500, height=90,
-                                       collapsable=True,
-                                       parent=self.main_layout,
-                                       collapseCommand=lambda: self.collapse_cmd(
-                                           color_frame, 90),
-                                       expandCommand=lambda: self.expand_cmd(
-                                           color_frame, 90))
+    def axis_buttons(self, parent, collection, selected):
+        for label in ['X', 'Y', 'Z', None, '-X', '-Y', '-Z']:
+            if not label:
+                cmds.separator(style='none', parent=parent)
+                continue
+            btn = cmds.radioButton(label=label, parent=parent,
+                                   collection=collection)
+            if label == selected:
+                cmds.radioCollection(collection, edit=True, select=btn)
+
+    def color_settings_frame(self, color_frame):
+        colors = self.state['colors']
         rcl = cmds.rowColumnLayout(numberOfColumns=2, height=60,
                                    columnWidth=[(1, 250), (2, 250)],
                                    columnOffset=[(1, 'both', 5),
@@ -170,23 +253,23 @@ class LimbUI():
                                             height=30, columnWidth3=[60,40,150],
                                             columnAlign3=['right',
                                                           'left', 'left'],
-                                            rgb=(1, 1, 0), parent=rcl)
+                                            rgb=colors['primary'], parent=rcl)
         self.fk_color = cmds.colorSliderGrp(label='FK: ', adj=3, height=30,
                                             columnWidth3=[60,40,150],
                                             columnAlign3=['right',
                                                           'left', 'left'],
-                                            rgb=(0, 0, 1), parent=rcl)
+                                            rgb=colors['fk'], parent=rcl)
         self.sc_color = cmds.colorSliderGrp(label='Secondary: ',
                                             adj=3, height=30,
                                             columnWidth3=[60,40,150],
                                             columnAlign3=['right',
                                                           'left', 'left'],
-                                            rgb=(0, .2, 1), parent=rcl)
+                                            rgb=colors['secondary'], parent=rcl)
         self.pv_color = cmds.colorSliderGrp(label='PV: ', adj=3, height=30,
                                             columnWidth3=[60,40,150],
                                             columnAlign3=['right',
                                                           'left', 'left'],
-                                            rgb=(0, 1, 1), parent=rcl)
+                                            rgb=colors['pv'], parent=rcl)
 
     def button_grid(self):
         btn_col = cmds.rowColumnLayout(numberOfColumns=1,
@@ -199,16 +282,25 @@ class LimbUI():
                                 parent=grid_layout,
                                 command=lambda x: self.build_limb_cmd())
         close_btn = cmds.button(label='Close', height=40, parent=grid_layout,
-                                command=lambda x: cmds.deleteUI(self.window))
+                                command=lambda x: self.close())
+
+    def close(self):
+        self.store_state()
+        cmds.window(self.window, edit=True, visible=False)
 
-    def collapse_cmd(self, frame_layout, height):
+    def collapse_cmd(self, frame_layout, height, label):
+        if label in self.state['expanded']:
+            self.state['expanded'].remove(label)
         window_height = cmds.window(self.window, query=True, height=True)
         frame_height = cmds.frameLayout(frame_layout, query=True, height=True)
         cmds.window(self.window, e=True, height=window_height - height + 25)
         cmds.frameLayout(frame_layout, e=True,
                          height=frame_height - height + 25)
 
-    def expand_cmd(self, frame_layout, height):
+    def expand_cmd(self, frame_layout, height, label, builder):
+        self.build_frame(frame_layout, label, builder)
+        if label not in self.state['expanded']:
+            self.state['expanded'].append(label)
         window_height = cmds.window(self.window, query=True, height=True)
         frame_height = cmds.frameLayout(frame_layout, query=True, height=True)
         cmds.window(self.window, e=True, height=window_height + height - 25)
@@ -220,46 +312,84 @@ class LimbUI():
         part = cmds.textField(self.part_txt, query=True, text=True)
         cmds.textField(self.base_txt, edit=True, text=side + '_' + part)
 
+    def spawn_template(self):
+        template = cmds.optionMenu(self.template_menu, query=True, value=True)
+        side = cmds.textField(self.side_txt, query=True, text=True)
+        height = cmds.floatField(self.height_field, query=True, value=True)
+        guides = nmTemplates.create_guides(template, side=side, height=height)
+
+        for field, alias in zip(self.alias_list, guides['alias_list']):
+            cmds.textField(field, edit=True, text=alias)
+        for field, jnt in zip(self.joint_list, guides['joint_list']):
+            cmds.textField(field, edit=True, text=jnt)
+        cmds.textField(self.pv_guide, edit=True, text=guides['pole_vector'])
+        cmds.textField(self.part_txt, edit=True, text=guides['part'])
+        self.change_base_name()
+
     def load_sel(self, text_field):
         sel = cmds.ls(selection=True)
         if len(sel):
             cmds.textField(text_field, e=True, tx=sel[0])
 
+    def read_state(self):
+        # pull values from every frame that has been built
+        state = self.state
+        if 'Build Data' in self.built:
+            state['side'] = cmds.textField(self.side_txt, query=True,
+                                           text=True)
+            state['part'] = cmds.textField(self.part_txt, query=True,
+                                           text=True)
+            state['pole_vector'] = cmds.textField(self.pv_guide, query=True,
+                                                  text=True)
+            state['aliases'] = [cmds.textField(a, query=True, text=True)
+                                for a in self.alias_list]
+            state['guides'] = [cmds.textField(j, query=True, text=True)
+                               for j in self.joint_list]
+            state['template'] = cmds.optionMenu(self.template_menu,
+                                                query=True, value=True)
+            state['height'] = cmds.floatField(self.height_field, query=True,
+                                              value=True)
+        if 'Build Arguments' in self.built:
+            state['remove_guides'] = cmds.checkBox(self.remove_cb, query=True,
+                                                   value=True)
+            state['stretch'] = cmds.checkBox(self.stretch_cb, query=True,
+                                             value=True)
+            pa_active = cmds.radioCollection(self.pa_col, query=True,
+                                             select=True)
+            up_active = cmds.radioCollection(self.ua_col, query=True,
+                                             select=True)
+            state['primary_axis'] = cmds.radioButton(pa_active, query=True,
+                                                     label=True)
+            state['up_axis'] = cmds.radioButton(up_active, query=True,
+                                                label=True)
+        if 'Color Settings' in self.built:
+            for key, slider in [('primary', self.pr_color),
+                                ('secondary', self.sc_color),
+                                ('fk', self.fk_color),
+                                ('pv', self.pv_color)]:
+                state['colors'][key] = cmds.colorSliderGrp(slider, query=True,
+                                                           rgb=True)
+        return state
+
+    def store_state(self):
+        save_state(self.read_state())
+
     def build_limb_cmd(self):
         # side, part, joint_list, alias_list, pole_vector,
         # remove_guides, add_stretch, primary_axis, up_axis
-        side = cmds.textField(self.side_txt, query=True, text=True)
-        part = cmds.textField(self.part_txt, query=True, text=True)
-        pole_vector = cmds.textField(self.pv_guide, query=True,
-                                     text=True)
-        alias_list = []
-        for a in self.alias_list:
-            alias_list.append(cmds.textField(a, query=True, text=True))
-
-        joint_list = []
-        for j in self.joint_list:
-            joint_list.append(cmds.textField(j, query=True, text=True))
-
-        remove_guides = cmds.checkBox(self.remove_cb, query=True, value=True)
-        add_stretch = cmds.checkBox(self.stretch_cb, query=True, value=True)
-        pa_active = cmds.radioCollection(self.pa_col, query=True, select=True)
-        up_active = cmds.radioCollection(self.ua_col, query=True, select=True)
-        primary_axis = cmds.radioButton(pa_active, query=True, label=True)
-        up_axis = cmds.radioButton(up_active, query=True, label=True)
-
-        pr_color = cmds.colorSliderGrp(self.pr_color, query=True, rgb=True)
-        sc_color = cmds.colorSliderGrp(self.sc_color, query=True, rgb=True)
-        fk_color = cmds.colorSliderGrp(self.fk_color, query=True, rgb=True)
-        pv_color = cmds.colorSliderGrp(self.pv_color, query=True, rgb=True)
-
-        color_dict = {side + '_' + part + '_primary': pr_color,
-                      side + '_' + part + '_pv': pv_color,
-                      side + '_' + part + '_fk': fk_color,
-                      side + '_' + part + '_secondary': sc_color}
-
-        limb = nmLimb.Limb(side=side, part=part, joint_list=joint_list,
-                           alias_list=alias_list, pole_vector=pole_vector,
-                           remove_guides=remove_guides, add_stretch=add_stretch,
-                           color_dict=color_dict, primary_axis=primary_axis,
-                           up_axis=up_axis)
+        state = self.read_state()
+        save_state(state)
+        base_name = state['side'] + '_' + state['part']
+        color_dict = dict((base_name + '_' + tag, color)
+                          for tag, color in state['colors'].items())
+
+        limb = nmLimb.Limb(side=state['side'], part=state['part'],
+                           joint_list=state['guides'],
+                           alias_list=state['aliases'],
+                           pole_vector=state['pole_vector'],
+                           remove_guides=state['remove_guides'],
+                           add_stretch=state['stretch'],
+                           color_dict=color_dict,
+                           primary_axis=state['primary_axis'],
+                           up_axis=state['up_axis'])
         limb.build_limb()
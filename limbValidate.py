@@ -0,0 +1,208 @@
+import maya.cmds as cmds
+import math
+
+TOLERANCE = 0.001
+
+# rest-pose results keyed by limb base name -> (signature, errors)
+_rest_cache = {}
+
+
+def validate_limbs(limbs, tolerance=TOLERANCE, use_cache=True):
+    # validate a batch of built limbs, returns {base_name: [errors]}
+    results = {}
+    for limb in limbs:
+        results[limb.base_name] = validate_limb(limb, tolerance=tolerance,
+                                                use_cache=use_cache)
+    return results
+
+
+def validate_limb(limb, tolerance=TOLERANCE, use_cache=True):
+    # skip the pose checks entirely if nothing has changed since last time
+    signature = rest_signature(limb)
+    cached = _rest_cache.get(limb.base_name)
+    if use_cache and cached and cached[0] == signature:
+        return list(cached[1])
+
+    errors = []
+    fk_ik = limb.settings_ctrl + '.fkIk'
+    global_scale = limb.all_grp + '.globalScale'
+    state = store_state([fk_ik, global_scale] +
+                        [limb.world_ctrl + '.translate' + axis
+                         for axis in 'XYZ'])
+    try:
+        if limb.lod == 'anim':
+            # one chain, so check it against the controls driving it
+            errors += check_mode(limb, 0, limb.fk_ctrls, 'FK', tolerance)
+            errors += check_ik_end(limb, tolerance)
+        else:
+            errors += check_mode(limb, 0, limb.fk_chain, 'FK', tolerance)
+            errors += check_mode(limb, 1, limb.ik_chain, 'IK', tolerance)
+            errors += check_stretch_rest(limb, tolerance)
+        errors += check_global_scale(limb, tolerance)
+        errors += check_ik_reach(limb, tolerance)
+    finally:
+        restore_state(state)
+
+    _rest_cache[limb.base_name] = (signature, errors)
+    return list(errors)
+
+
+def clear_cache(base_name=None):
+    if base_name:
+        _rest_cache.pop(base_name, None)
+    else:
+        _rest_cache.clear()
+
+
+def rest_signature(limb):
+    # anything that can change the evaluated rest pose of the limb
+    nodes = list(limb.bind_chain) + list(limb.fk_chain) + \
+        list(limb.ik_chain) + list(limb.fk_ctrls) + \
+        [limb.world_ctrl, limb.local_ctrl, limb.pv_ctrl, limb.base_ctrl,
+         limb.all_grp]
+    values = [round_values(world_matrix(n)) for n in nodes]
+    for plug in [limb.settings_ctrl + '.fkIk',
+                 limb.all_grp + '.globalScale'] + stretch_plugs(limb):
+        values.append(round(cmds.getAttr(plug), 6))
+    values.append(tuple(round_values(m) for m in limb.guide_matrices))
+    return hash(tuple(values))
+
+
+def stretch_plugs(limb):
+    # stretch amounts change the evaluated chain without moving a control
+    if not limb.add_stretch:
+        return []
+    part = limb.part.title()
+    return [limb.world_ctrl + '.' + attr
+            for attr in ['stretch', 'up' + part, 'lo' + part]] + \
+        [ctrl + '.stretch' for ctrl in limb.fk_ctrls[:-1]]
+
+
+def check_mode(limb, blend, chain, label, tolerance):
+    # bind chain should sit on both the driving chain and the guides
+    errors = []
+    cmds.setAttr(limb.settings_ctrl + '.fkIk', blend)
+    # guides can carry scale or shear, the joints get their normalized
+    # matrices
+    for bind, jnt, guide_mtx in zip(limb.bind_chain, chain,
+                                    limb.joint_matrices):
+        bind_mtx = world_matrix(bind)
+        if not matrices_match(bind_mtx, world_matrix(jnt), tolerance):
+            errors.append('{}: {} does not match {} in {} mode.'.format(
+                limb.base_name, bind, jnt, label))
+        if not matrices_match(bind_mtx, guide_mtx, tolerance):
+            errors.append('{}: {} does not match its guide in {} mode.'.format(
+                limb.base_name, bind, label))
+    return errors
+
+
+def check_ik_end(limb, tolerance):
+    # anim lod: the ik blend should put the end joint on the IK control
+    cmds.setAttr(limb.settings_ctrl + '.fkIk', 1)
+    gap = distance(position(limb.bind_chain[-1]), position(limb.local_ctrl))
+    if gap > tolerance:
+        return ['{}: {} is {:.4f} away from the IK control in IK '
+                'mode.'.format(limb.base_name, limb.bind_chain[-1], gap)]
+    return []
+
+
+def check_stretch_rest(limb, tolerance):
+    if not limb.add_stretch or limb.lod != 'full':
+        return []
+    cmds.setAttr(limb.settings_ctrl + '.fkIk', 1)
+    stretch = cmds.getAttr(limb.stretch_bta + '.output')
+    if abs(stretch - 1.0) > tolerance:
+        return ['{}: stretch is {:.4f} at rest, expected 1.0.'.format(
+            limb.base_name, stretch)]
+    return []
+
+
+def check_global_scale(limb, tolerance):
+    # scaling the rig should scale the bind lengths and never stretch it
+    errors = []
+    cmds.setAttr(limb.settings_ctrl + '.fkIk', 1)
+    rest_lengths = chain_lengths(limb.bind_chain)
+    cmds.setAttr(limb.all_grp + '.globalScale', 2)
+    for rest, scaled in zip(rest_lengths, chain_lengths(limb.bind_chain)):
+        if abs(scaled - rest * 2) > tolerance:
+            errors.append('{}: globalScale does not preserve bind chain '
+                          'lengths ({:.4f} != {:.4f}).'.format(
+                              limb.base_name, scaled, rest * 2))
+            break
+    if limb.add_stretch and limb.lod == 'full':
+        stretch = cmds.getAttr(limb.stretch_bta + '.output')
+        if abs(stretch - 1.0) > tolerance:
+            errors.append('{}: globalScale triggers stretch '
+                          '({:.4f}).'.format(limb.base_name, stretch))
+    cmds.setAttr(limb.all_grp + '.globalScale', 1)
+    return errors
+
+
+def check_ik_reach(limb, tolerance):
+    # pull the IK control past full extension along the chain
+    cmds.setAttr(limb.settings_ctrl + '.fkIk', 1)
+    start = position(limb.bind_chain[0])
+    end = position(limb.bind_chain[-1])
+    length_total = sum(chain_lengths(limb.bind_chain))
+    direction = normalize([e - s for e, s in zip(end, start)])
+    translate = cmds.getAttr(limb.world_ctrl + '.translate')[0]
+    cmds.setAttr(limb.world_ctrl + '.translate',
+                 *[t + d * length_total * 0.5
+                   for t, d in zip(translate, direction)])
+
+    target = position(limb.local_ctrl)
+    reached = distance(position(limb.bind_chain[-1]), target)
+    # the anim lod has stretch attributes but no stretch network
+    stretching = limb.add_stretch and limb.lod == 'full' and \
+        cmds.getAttr(limb.world_ctrl + '.stretch') > 0
+    if stretching and reached > tolerance:
+        return ['{}: stretchy IK falls {:.4f} short of the IK control.'.format(
+            limb.base_name, reached)]
+    if not stretching:
+        extended = distance(position(limb.bind_chain[0]),
+                            position(limb.bind_chain[-1]))
+        if abs(extended - length_total) > tolerance:
+            return ['{}: IK chain changed length without stretch '
+                    '({:.4f} != {:.4f}).'.format(limb.base_name, extended,
+                                                 length_total)]
+    return []
+
+
+def store_state(plugs):
+    return [(p, cmds.getAttr(p)) for p in plugs
+            if cmds.getAttr(p, settable=True)]
+
+
+def restore_state(state):
+    for plug, value in state:
+        cmds.setAttr(plug, value)
+
+
+def world_matrix(node):
+    return cmds.xform(node, query=True, worldSpace=True, matrix=True)
+
+
+def position(node):
+    return cmds.xform(node, query=True, worldSpace=True, rotatePivot=True)
+
+
+def chain_lengths(chain):
+    points = [position(jnt) for jnt in chain]
+    return [distance(a, b) for a, b in zip(points[:-1], points[1:])]
+
+
+def distance(point_a, point_b):
+    return math.sqrt(sum([pow((b - a), 2) for b, a in zip(point_b, point_a)]))
+
+
+def normalize(vector):
+    length = math.sqrt(sum([v * v for v in vector])) or 1.0
+    return [v / length for v in vector]
+
+
+def matrices_match(matrix_a, matrix_b, tolerance):
+    return all(abs(a - b) <= tolerance for a, b in zip(matrix_a, matrix_b))
+
+
+def round_values(values, precision=5):
+    return tuple(round(v, precision) for v in values)
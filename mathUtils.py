@@ -0,0 +1,198 @@
+import math
+
+# matrices are flat row-major lists of 16 floats using maya's convention:
+# row vectors, translation in elements 12-14, world = local * parent
+
+AXIS_INDEX = {'X': 0, 'Y': 1, 'Z': 2}
+
+
+def identity():
+    return [1.0, 0.0, 0.0, 0.0,
+            0.0, 1.0, 0.0, 0.0,
+            0.0, 0.0, 1.0, 0.0,
+            0.0, 0.0, 0.0, 1.0]
+
+
+def mult(matrix_a, matrix_b):
+    a, b = matrix_a, matrix_b
+    return [a[r] * b[c] + a[r + 1] * b[c + 4] +
+            a[r + 2] * b[c + 8] + a[r + 3] * b[c + 12]
+            for r in (0, 4, 8, 12) for c in (0, 1, 2, 3)]
+
+
+def mult_all(matrix_list):
+    result = matrix_list[0]
+    for matrix in matrix_list[1:]:
+        result = mult(result, matrix)
+    return result
+
+
+def inverse(matrix):
+    # gauss-jordan with partial pivoting
+    m = [list(matrix[r * 4:r * 4 + 4]) + [1.0 if r == c else 0.0
+                                         for c in range(4)]
+         for r in range(4)]
+    for col in range(4):
+        pivot = max(range(col, 4), key=lambda r: abs(m[r][col]))
+        if abs(m[pivot][col]) < 1e-12:
+            raise ValueError('Matrix is not invertible.')
+        m[col], m[pivot] = m[pivot], m[col]
+        div = m[col][col]
+        m[col] = [v / div for v in m[col]]
+        for r in range(4):
+            if r != col and m[r][col]:
+                factor = m[r][col]
+                m[r] = [v - factor * p for v, p in zip(m[r], m[col])]
+    return [v for row in m for v in row[4:]]
+
+
+def translation(matrix):
+    return list(matrix[12:15])
+
+
+def set_translation(matrix, point):
+    result = list(matrix)
+    result[12:15] = point
+    return result
+
+
+def translate_matrix(point):
+    return set_translation(identity(), point)
+
+
+def scale_matrix(scale):
+    if not isinstance(scale, (list, tuple)):
+        scale = (scale, scale, scale)
+    result = identity()
+    result[0], result[5], result[10] = scale
+    return result
+
+
+def row(matrix, index):
+    return list(matrix[index * 4:index * 4 + 3])
+
+
+def from_rows(x_row, y_row, z_row, point=(0.0, 0.0, 0.0)):
+    return list(x_row) + [0.0] + list(y_row) + [0.0] + \
+        list(z_row) + [0.0] + list(point) + [1.0]
+
+
+def rotation(matrix):
+    # orthonormal rotation part with scale and translation removed
+    return from_rows(*[normalize(row(matrix, i)) for i in range(3)])
+
+
+def scale_row(matrix, index, value):
+    result = list(matrix)
+    for i in range(3):
+        result[index * 4 + i] *= value
+    return result
+
+
+def transpose_rotation(matrix):
+    m = matrix
+    return from_rows([m[0], m[4], m[8]], [m[1], m[5], m[9]],
+                     [m[2], m[6], m[10]])
+
+
+def euler_to_matrix(rotate):
+    # rotate order xyz in degrees, matches maya's default
+    rx, ry, rz = [math.radians(r) for r in rotate]
+    cx, sx = math.cos(rx), math.sin(rx)
+    cy, sy = math.cos(ry), math.sin(ry)
+    cz, sz = math.cos(rz), math.sin(rz)
+    return from_rows([cy * cz, cy * sz, -sy],
+                     [sx * sy * cz - cx * sz, sx * sy * sz + cx * cz, sx * cy],
+                     [cx * sy * cz + sx * sz, cx * sy * sz - sx * cz, cx * cy])
+
+
+def matrix_to_euler(matrix):
+    m = rotation(matrix)
+    cy = math.sqrt(m[0] * m[0] + m[1] * m[1])
+    ry = math.atan2(-m[2], cy)
+    if cy > 1e-8:
+        rx = math.atan2(m[6], m[10])
+        rz = math.atan2(m[1], m[0])
+    else:
+        rx = math.atan2(-m[9], m[5])
+        rz = 0.0
+    return [math.degrees(rx), math.degrees(ry), math.degrees(rz)]
+
+
+def point_mult(point, matrix):
+    x, y, z = point
+    m = matrix
+    return [x * m[0] + y * m[4] + z * m[8] + m[12],
+            x * m[1] + y * m[5] + z * m[9] + m[13],
+            x * m[2] + y * m[6] + z * m[10] + m[14]]
+
+
+def vector_mult(vector, matrix):
+    x, y, z = vector
+    m = matrix
+    return [x * m[0] + y * m[4] + z * m[8],
+            x * m[1] + y * m[5] + z * m[9],
+            x * m[2] + y * m[6] + z * m[10]]
+
+
+def add(vector_a, vector_b):
+    return [a + b for a, b in zip(vector_a, vector_b)]
+
+
+def sub(vector_a, vector_b):
+    return [a - b for a, b in zip(vector_a, vector_b)]
+
+
+def scale(vector, value):
+    return [v * value for v in vector]
+
+
+def dot(vector_a, vector_b):
+    return sum([a * b for a, b in zip(vector_a, vector_b)])
+
+
+def cross(vector_a, vector_b):
+    a, b = vector_a, vector_b
+    return [a[1] * b[2] - a[2] * b[1],
+            a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0]]
+
+
+def length(vector):
+    return math.sqrt(dot(vector, vector))
+
+
+def normalize(vector):
+    vector_length = length(vector)
+    if vector_length < 1e-12:
+        return list(vector)
+    return [v / vector_length for v in vector]
+
+
+def lerp(value_a, value_b, blend):
+    return value_a + (value_b - value_a) * blend
+
+
+def axis_vector(axis):
+    # 'X', '-Y', ... to a unit vector
+    vector = [0.0, 0.0, 0.0]
+    vector[AXIS_INDEX[axis[-1]]] = -1.0 if axis[0] == '-' else 1.0
+    return vector
+
+
+def aim_matrix(position, aim, up, primary_axis='X', up_axis='Y'):
+    # orient the primary axis along aim and the up axis towards up
+    primary = normalize(aim)
+    secondary = normalize(sub(up, scale(primary, dot(up, primary))))
+    rows = [None, None, None]
+    p_index = AXIS_INDEX[primary_axis[-1]]
+    u_index = AXIS_INDEX[up_axis[-1]]
+    rows[p_index] = scale(primary, -1.0 if primary_axis[0] == '-' else 1.0)
+    rows[u_index] = scale(secondary, -1.0 if up_axis[0] == '-' else 1.0)
+    t_index = 3 - p_index - u_index
+    rows[t_index] = cross(rows[(t_index + 1) % 3], rows[(t_index + 2) % 3])
+    return from_rows(rows[0], rows[1], rows[2], position)
+
+
+def is_close(matrix_a, matrix_b, tolerance=0.001):
+    return all(abs(a - b) <= tolerance for a, b in zip(matrix_a, matrix_b))
@@ -0,0 +1,134 @@
+import maya.cmds as cmds
+
+import nmrig.mathUtils as nmMath
+reload(nmMath)
+
+# constraint-free stand-ins for the constraints the limb builder uses. they
+# need offsetParentMatrix (Maya 2020+), without it the constraint is built.
+# each returns every node it created, so callers can block all of them
+
+
+def has_offset_parent(node):
+    return cmds.objExists(node + '.offsetParentMatrix')
+
+
+def drive_parent(driver, driven, name=None):
+    # parentConstraint with maintain offset. the driven local channels stay
+    # free and are applied on top:
+    # offsetParentMatrix = L0^-1 * W0 * D0^-1 * D * P^-1
+    if not has_offset_parent(driven):
+        return [cmds.parentConstraint(driver, driven, mo=True)[0]]
+    name = name or driven
+    offset = nmMath.mult_all([nmMath.inverse(cmds.getAttr(driven + '.matrix')),
+                              cmds.getAttr(driven + '.worldMatrix[0]'),
+                              nmMath.inverse(cmds.getAttr(
+                                  driver + '.worldMatrix[0]'))])
+    mmx = cmds.createNode('multMatrix', name=name + '_drive_MMX')
+    cmds.setAttr(mmx + '.matrixIn[0]', offset, type='matrix')
+    cmds.connectAttr(driver + '.worldMatrix[0]', mmx + '.matrixIn[1]')
+    cmds.connectAttr(driven + '.parentInverseMatrix[0]', mmx + '.matrixIn[2]')
+    cmds.connectAttr(mmx + '.matrixSum', driven + '.offsetParentMatrix')
+    return [mmx]
+
+
+def drive_point(driver, driven, name=None, blend_driver=None,
+                blend_plug=None):
+    # pointConstraint without offset, for driven nodes pivoting at their
+    # origin (joints, locators). blend_driver takes over from driver as
+    # blend_plug goes from 0 to 1
+    name = name or driven
+    if not has_offset_parent(driven):
+        return point_constraint(driver, driven, name, blend_driver,
+                                blend_plug)
+    nodes = []
+    points = []
+    for source, suffix in [(driver, '_point'), (blend_driver, '_blendPoint')]:
+        if not source:
+            continue
+        mmx = cmds.createNode('multMatrix', name=name + suffix + '_MMX')
+        cmds.connectAttr(source + '.worldMatrix[0]', mmx + '.matrixIn[0]')
+        cmds.connectAttr(driven + '.parentInverseMatrix[0]',
+                         mmx + '.matrixIn[1]')
+        pmm = cmds.createNode('pointMatrixMult', name=name + suffix + '_PMM')
+        cmds.connectAttr(source + '.rotatePivot', pmm + '.inPoint')
+        cmds.connectAttr(mmx + '.matrixSum', pmm + '.inMatrix')
+        nodes += [mmx, pmm]
+        points.append(pmm + '.output')
+    if blend_driver:
+        blc = cmds.createNode('blendColors', name=name + '_point_BLC')
+        cmds.connectAttr(blend_plug, blc + '.blender')
+        cmds.connectAttr(points[1], blc + '.color1')
+        cmds.connectAttr(points[0], blc + '.color2')
+        nodes.append(blc)
+        points = [blc + '.output']
+    cmds.connectAttr(points[0], driven + '.translate')
+    return nodes
+
+
+def point_constraint(driver, driven, name=None, blend_driver=None,
+                     blend_plug=None):
+    # the constraint version of drive_point, weights follow blend_plug
+    if not blend_driver:
+        return [cmds.pointConstraint(driver, driven,
+                                     maintainOffset=False)[0]]
+    con = cmds.pointConstraint(driver, blend_driver, driven,
+                               maintainOffset=False)[0]
+    weights = cmds.pointConstraint(con, query=True, weightAliasList=True)
+    rev = cmds.createNode('reverse', name=(name or driven) + '_REV')
+    cmds.connectAttr(blend_plug, rev + '.inputX')
+    cmds.connectAttr(rev + '.outputX', con + '.' + weights[0])
+    cmds.connectAttr(blend_plug, con + '.' + weights[1])
+    return [con, rev]
+
+
+def world_point(node, name):
+    # world position of a node's rotate pivot
+    pmm = cmds.createNode('pointMatrixMult', name=name + '_PMM')
+    cmds.connectAttr(node + '.rotatePivot', pmm + '.inPoint')
+    cmds.connectAttr(node + '.worldMatrix[0]', pmm + '.inMatrix')
+    return pmm + '.output'
+
+
+def drive_pole_vector(driver, ikh, start_joint, name=None):
+    # poleVectorConstraint: driver position relative to the start joint, in
+    # the handle's parent space. the start joint position is built from its
+    # translate and parent matrices so the IK solve doesn't feed back into it
+    if not has_offset_parent(start_joint):
+        return [cmds.poleVectorConstraint(driver, ikh)[0]]
+    name = name or ikh
+    start_mmx = cmds.createNode('multMatrix', name=name + '_start_MMX')
+    cmds.connectAttr(start_joint + '.offsetParentMatrix',
+                     start_mmx + '.matrixIn[0]')
+    cmds.connectAttr(start_joint + '.parentMatrix[0]',
+                     start_mmx + '.matrixIn[1]')
+    start_pmm = cmds.createNode('pointMatrixMult', name=name + '_start_PMM')
+    cmds.connectAttr(start_joint + '.translate', start_pmm + '.inPoint')
+    cmds.connectAttr(start_mmx + '.matrixSum', start_pmm + '.inMatrix')
+
+    pma = cmds.createNode('plusMinusAverage', name=name + '_pv_PMA')
+    cmds.setAttr(pma + '.operation', 2)
+    pv_point = world_point(driver, name + '_pv')
+    cmds.connectAttr(pv_point, pma + '.input3D[0]')
+    cmds.connectAttr(start_pmm + '.output', pma + '.input3D[1]')
+
+    vpn = cmds.createNode('vectorProduct', name=name + '_pv_VPN')
+    cmds.setAttr(vpn + '.operation', 3)
+    cmds.connectAttr(pma + '.output3D', vpn + '.input1')
+    cmds.connectAttr(ikh + '.parentInverseMatrix[0]', vpn + '.matrix')
+    cmds.connectAttr(vpn + '.output', ikh + '.poleVector')
+    return [start_mmx, start_pmm, pv_point.split('.')[0], pma, vpn]
+
+
+def drive_curve_point(driver, curve, index, name=None):
+    # cluster + pointConstraint on one CV, the curve must not inherit
+    # transforms so its CVs are in world space
+    name = name or '{}_cv{}'.format(curve, index)
+    shape = cmds.listRelatives(curve, shapes=True)[0]
+    cmds.connectAttr(world_point(driver, name),
+                     '{}.controlPoints[{}]'.format(shape, index))
+
+
+def constraint_count(nodes=None):
+    if nodes is None:
+        return len(cmds.ls(type='constraint'))
+    return len(cmds.ls(nodes, type='constraint'))
@@ -0,0 +1,38 @@
+import maya.api.OpenMaya as om
+
+
+class NodeTracker(object):
+    # records every node created while the context is open, in creation
+    # order, without scanning the scene before and after
+    def __init__(self):
+        self.handles = []
+        self.callback = None
+
+    def __enter__(self):
+        self.callback = om.MDGMessage.addNodeAddedCallback(self.node_added,
+                                                           'dependNode')
+        return self
+
+    def __exit__(self, *args):
+        om.MMessage.removeCallback(self.callback)
+        self.callback = None
+
+    def node_added(self, mobject, client_data):
+        self.handles.append(om.MObjectHandle(mobject))
+
+    def nodes(self, long_names=False):
+        # names of the tracked nodes that still exist
+        names = []
+        for handle in self.handles:
+            if not handle.isValid():
+                continue
+            mobject = handle.object()
+            if mobject.hasFn(om.MFn.kDagNode):
+                dag_fn = om.MFnDagNode(mobject)
+                name = dag_fn.fullPathName() if long_names \
+                    else dag_fn.partialPathName()
+            else:
+                name = om.MFnDependencyNode(mobject).name()
+            if name not in names:
+                names.append(name)
+        return names
@@ -0,0 +1,257 @@
+import maya.cmds as cmds
+import difflib
+import hashlib
+import itertools
+import os
+import re
+
+import nmrig.simpleLimbClass as nmLimb
+import nmrig.guideTemplates as nmTemplates
+reload(nmLimb)
+reload(nmTemplates)
+
+PRECISION = 4
+
+# attributes worth recording beyond keyable, channel box and user attributes
+EXTRA_ATTRS = {'transform': ['rotatePivot', 'scalePivot', 'inheritsTransform',
+                             'overrideEnabled', 'overrideRGBColors',
+                             'overrideColorRGB', 'template'],
+               'joint': ['jointOrient', 'rotateOrder',
+                         'segmentScaleCompensate'],
+               'nurbsCurve': ['degree', 'spans', 'form']}
+
+VARIANT_ARGS = {'template': ['arm', 'leg'],
+                'side': ['L', 'R'],
+                'add_stretch': [False, True],
+                'remove_guides': [False, True],
+                'matrix_drive': [False, True],
+                'controller_tags': [True, False],
+                'freeze_inactive': [False, True],
+                'axes': [('X', 'Y'), ('X', '-Z'), ('-X', 'Y'), ('Y', 'Z')]}
+# Limb keyword arguments taken straight from a variant
+LIMB_ARGS = ['add_stretch', 'remove_guides', 'matrix_drive',
+             'controller_tags', 'freeze_inactive']
+
+# control poses the constraint and matrix drive builds must agree on
+POSES = [{'fkIk': 0, 'fk_rotate': [(20, 10, -15), (0, 0, 45), (5, -10, 10)]},
+         {'fkIk': 1, 'ik_translate': (2, -3, 1.5), 'pv_translate': (0, 2, 1),
+          'base_translate': (0.5, 0, -0.5)},
+         {'fkIk': 0.5, 'fk_rotate': [(-30, 0, 10), (0, 0, 60), (0, 0, 0)],
+          'ik_translate': (-1, 1, 2), 'global_scale': 1.5}]
+POSE_TOLERANCE = 1e-3
+
+
+def fingerprint(nodes):
+    # stable hash and diffable dump of everything a build created
+    text = '\n'.join(dump(nodes))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest(), text
+
+
+def dump(nodes):
+    nodes = [n for n in nodes if cmds.objExists(n)]
+    names = canonical_names(nodes)
+
+    def canon(plug):
+        node, _, attr = plug.partition('.')
+        return names.get(node, node) + ('.' + attr if attr else '')
+
+    lines = []
+    for node in nodes:
+        name = names[node]
+        node_type = cmds.nodeType(node)
+        lines.append('node {} {}'.format(name, node_type))
+
+        parent = cmds.listRelatives(node, parent=True)
+        if parent:
+            lines.append('parent {} {}'.format(name, canon(parent[0])))
+
+        for attr in record_attrs(node):
+            plug = node + '.' + attr
+            if cmds.connectionInfo(plug, isExactDestination=True):
+                continue
+            try:
+                value = cmds.getAttr(plug)
+            except (RuntimeError, ValueError):
+                continue
+            lines.append('value {}.{} {}'.format(name, attr,
+                                                 format_value(value)))
+
+        for attr in sorted(cmds.listAttr(node, locked=True) or []):
+            lines.append('lock {}.{}'.format(name, attr))
+
+        if node_type == 'nurbsCurve':
+            lines.append('cvs {} {}'.format(
+                name, format_value(cmds.getAttr(node + '.cv[*]'))))
+
+        pairs = cmds.listConnections(node, source=True, destination=False,
+                                     connections=True, plugs=True) or []
+        for dst, src in zip(pairs[::2], pairs[1::2]):
+            lines.append('connect {} {}'.format(canon(src), canon(dst)))
+
+    # creation order is not part of the result, only what exists
+    return sorted(lines)
+
+
+def canonical_names(nodes):
+    # auto-numbered nodes (unitConversion12) get a scene independent name
+    names = {}
+    counts = {}
+    for node in nodes:
+        short = node.split('|')[-1]
+        node_type = cmds.nodeType(node)
+        if re.match(r'^{}\d*$'.format(re.escape(node_type)), short):
+            counts[node_type] = counts.get(node_type, 0) + 1
+            names[node] = '{}#{}'.format(node_type, counts[node_type])
+        else:
+            names[node] = short
+    return names
+
+
+def record_attrs(node):
+    attrs = (cmds.listAttr(node, keyable=True) or []) + \
+        (cmds.listAttr(node, channelBox=True) or []) + \
+        (cmds.listAttr(node, userDefined=True) or [])
+    for node_type, extra in EXTRA_ATTRS.items():
+        if node_type in (cmds.nodeType(node, inherited=True) or []):
+            attrs += extra
+    return sorted(set(attrs))
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, PRECISION) + 0.0)
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(format_value(v) for v in value) + ']'
+    return repr(value)
+
+
+def variants(**overrides):
+    # every combination of the build arguments, overrides narrow the sweep
+    args = dict(VARIANT_ARGS)
+    args.update(overrides)
+    keys = sorted(args)
+    for values in itertools.product(*[args[k] for k in keys]):
+        variant = dict(zip(keys, values))
+        variant['key'] = '{template}_{side}_stretch{add_stretch:d}_' \
+                         'remove{remove_guides:d}_matrix{matrix_drive:d}_' \
+                         'tags{controller_tags:d}_' \
+                         'freeze{freeze_inactive:d}_{pa}{ua}'.format(
+                             pa=variant['axes'][0].replace('-', 'n'),
+                             ua=variant['axes'][1].replace('-', 'n'),
+                             **variant)
+        yield variant
+
+
+def build_variant(variant):
+    cmds.file(new=True, force=True)
+    primary_axis, up_axis = variant['axes']
+    guides = nmTemplates.create_guides(variant['template'],
+                                       side=variant['side'],
+                                       primary_axis=primary_axis,
+                                       up_axis=up_axis)
+    guides.update((k, variant[k]) for k in LIMB_ARGS if k in variant)
+    limb = nmLimb.Limb(**guides)
+    limb.build_limb()
+    return limb
+
+
+def apply_pose(limb, pose):
+    cmds.setAttr(limb.settings_ctrl + '.fkIk', pose.get('fkIk', 0))
+    cmds.setAttr(limb.all_grp + '.globalScale', pose.get('global_scale', 1))
+    for ctrl, rotate in zip(limb.fk_ctrls, pose.get('fk_rotate', [])):
+        cmds.setAttr(ctrl + '.rotate', *rotate)
+    for ctrl, key in [(limb.world_ctrl, 'ik_translate'),
+                      (limb.pv_ctrl, 'pv_translate'),
+                      (limb.base_ctrl, 'base_translate')]:
+        cmds.setAttr(ctrl + '.translate', *pose.get(key, (0, 0, 0)))
+
+
+def bind_poses(limb, poses=POSES):
+    # bind chain world matrices under each pose
+    matrices = []
+    for pose in poses:
+        apply_pose(limb, pose)
+        matrices.append([cmds.getAttr(j + '.worldMatrix[0]')
+                         for j in limb.bind_chain])
+    return matrices
+
+
+def check_drive_modes(variant_list=None, poses=POSES,
+                      tolerance=POSE_TOLERANCE):
+    # constraint and matrix drive builds of each variant must pose the bind
+    # chain identically, returns {key: [mismatches]}
+    results = {}
+    for variant in variant_list or variants(matrix_drive=[False]):
+        posed = {}
+        for matrix_drive in [False, True]:
+            limb = build_variant(dict(variant, matrix_drive=matrix_drive))
+            posed[matrix_drive] = bind_poses(limb, poses)
+        key = variant['key'].replace('_matrix0_', '_')
+        results[key] = [
+            'pose {} joint {}'.format(p, j)
+            for p, (a, b) in enumerate(zip(posed[False], posed[True]))
+            for j, (ma, mb) in enumerate(zip(a, b))
+            if any(abs(x - y) > tolerance for x, y in zip(ma, mb))]
+    return results
+
+
+def run_regression(golden_dir, variant_list=None, update=False):
+    # build each variant in a fresh scene and compare against golden dumps
+    if not os.path.isdir(golden_dir):
+        os.makedirs(golden_dir)
+
+    results = {}
+    for variant in variant_list or variants():
+        limb = build_variant(variant)
+        digest, text = fingerprint(limb.created_nodes)
+        golden_path = os.path.join(golden_dir, variant['key'] + '.txt')
+
+        if update or not os.path.exists(golden_path):
+            with open(golden_path, 'w') as golden_file:
+                golden_file.write(text + '\n')
+            results[variant['key']] = 'updated' if update else 'new'
+            continue
+
+        with open(golden_path) as golden_file:
+            golden = golden_file.read().rstrip('\n')
+        if golden == text:
+            results[variant['key']] = 'pass'
+        else:
+            results[variant['key']] = list(difflib.unified_diff(
+                golden.splitlines(), text.splitlines(), 'golden', digest,
+                lineterm=''))
+    return results
+
+
+def main(argv=None):
+    # mayapy -m nmrig.rigFingerprint <golden_dir> [--update]
+    import argparse
+    parser = argparse.ArgumentParser(description='Limb build regression.')
+    parser.add_argument('golden_dir')
+    parser.add_argument('--update', action='store_true')
+    parser.add_argument('--drive-modes', action='store_true',
+                        help='also pose constraint and matrix drive builds')
+    args = parser.parse_args(argv)
+
+    try:
+        import maya.standalone
+        maya.standalone.initialize()
+    except (ImportError, RuntimeError):
+        pass
+    results = run_regression(args.golden_dir, update=args.update)
+    failed = [k for k, v in results.items() if isinstance(v, list)]
+    print('rig regression: {} variants, {} failed'.format(len(results),
+                                                          len(failed)))
+    for key in sorted(failed):
+        print('\n'.join(['FAIL ' + key] + results[key][:40]))
+    if args.drive_modes:
+        mismatches = check_drive_modes()
+        for key in sorted(k for k in mismatches if mismatches[k]):
+            print('\n'.join(['DRIVE ' + key] + mismatches[key]))
+        failed = failed or any(mismatches.values())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
+import time
+
+import nmrig.controlRegistry as nmRegistry
+reload(nmRegistry)
+
+# publish-time clean up of the nodes a Limb build created:
+#   history  construction history on control shapes is deleted
+#   fold     utility nodes fed only by constants (nothing, locked channels
+#            nothing drives, or other constant utility nodes) are replaced
+#            by their output values
+#   merge    utility nodes with the same type, inputs and values are merged
+#   lock     unconnected channels on helper locators are locked and hidden
+# deleted nodes drop out of the limb's registry, so limbLod still works
+
+# input attributes compared when merging, per utility node type
+UTILITY_TYPES = {
+    'multDoubleLinear': ['input1', 'input2'],
+    'addDoubleLinear': ['input1', 'input2'],
+    'reverse': ['input'],
+    'multiplyDivide': ['operation', 'input1', 'input2'],
+    'plusMinusAverage': ['operation', 'input1D', 'input2D', 'input3D'],
+    'condition': ['operation', 'firstTerm', 'secondTerm', 'colorIfTrue',
+                  'colorIfFalse'],
+    'blendColors': ['blender', 'color1', 'color2'],
+    'blendTwoAttr': ['attributesBlender', 'input'],
+    'distanceBetween': ['point1', 'point2', 'inMatrix1', 'inMatrix2'],
+}
+HELPER_CHANNELS = ['translateX', 'translateY', 'translateZ',
+                   'rotateX', 'rotateY', 'rotateZ',
+                   'scaleX', 'scaleY', 'scaleZ', 'visibility']
+
+
+def optimize_limbs(base_names, measure=True):
+    return [optimize_limb(base_name, measure) for base_name in base_names]
+
+
+def optimize_limb(base_name, measure=True):
+    # measure plays the scene range before and after, for the report
+    if not nmRegistry.limb_registry(base_name):
+        cmds.error('No limb named {} in the scene.'.format(base_name))
+
+    report = {'limb': base_name, 'nodes_before': len(cmds.ls())}
+    if measure:
+        report['ms_before'] = time_playback()
+
+    cmds.undoInfo(openChunk=True)
+    try:
+        report['history'] = delete_history(base_name)
+        report['folded'] = 0
+        report['merged'] = 0
+        # merging can leave nodes with identical constant inputs, repeat
+        # until stable
+        while True:
+            folded = fold_constants(utility_nodes(base_name))
+            merged = merge_duplicates(utility_nodes(base_name))
+            report['folded'] += folded
+            report['merged'] += merged
+            if not folded and not merged:
+                break
+        report['locked'] = lock_helpers(base_name)
+    finally:
+        cmds.undoInfo(closeChunk=True)
+
+    report['nodes_after'] = len(cmds.ls())
+    report['removed'] = report['nodes_before'] - report['nodes_after']
+    message = '{}: {} nodes removed ({} history, {} folded, {} merged), ' \
+              '{} channels locked'.format(base_name, report['removed'],
+                                          report['history'], report['folded'],
+                                          report['merged'], report['locked'])
+    if measure:
+        report['ms_after'] = time_playback()
+        report['speedup'] = report['ms_before'] / max(report['ms_after'],
+                                                      1e-6)
+        message += ', {:.3f} -> {:.3f} ms per frame, {:.2f}x'.format(
+            report['ms_before'], report['ms_after'], report['speedup'])
+    om.MGlobal.displayInfo(message)
+    return report
+
+
+def time_playback(loops=3):
+    # best of several passes over the playback range, ms per frame
+    start = int(cmds.playbackOptions(query=True, minTime=True))
+    end = int(cmds.playbackOptions(query=True, maxTime=True))
+    current = cmds.currentTime(query=True)
+    times = []
+    for _ in range(loops):
+        begin = time.time()
+        for frame in range(start, end + 1):
+            cmds.currentTime(frame, update=True)
+        times.append((time.time() - begin) / (end - start + 1))
+    cmds.currentTime(current, update=True)
+    return min(times) * 1000.0
+
+
+def utility_nodes(base_name):
+    return [n for n in nmRegistry.rig_nodes(base_name)
+            if cmds.nodeType(n) in UTILITY_TYPES]
+
+
+def delete_history(base_name):
+    # construction history on control shapes, makeNurbCircle and the like
+    shapes = []
+    for ctrl in nmRegistry.controls(base_name):
+        shapes += cmds.listRelatives(ctrl, shapes=True, fullPath=True) or []
+    history = [s for s in shapes
+               if cmds.listConnections(s + '.create', source=True,
+                                       destination=False)]
+    before = len(cmds.ls())
+    if history:
+        cmds.delete(history, constructionHistory=True)
+    return before - len(cmds.ls())
+
+
+def inputs(node):
+    # (attribute, source plug) pairs, message connections left out
+    pairs = cmds.listConnections(node, source=True, destination=False,
+                                 connections=True, plugs=True) or []
+    return sorted((dst.split('.', 1)[1], src)
+                  for dst, src in zip(pairs[::2], pairs[1::2])
+                  if not dst.endswith('.message'))
+
+
+def outputs(node):
+    # (source plug, destination plug) pairs, message connections left out
+    pairs = cmds.listConnections(node, source=False, destination=True,
+                                 connections=True, plugs=True) or []
+    return [(src, dst) for src, dst in zip(pairs[::2], pairs[1::2])
+            if not src.endswith('.message')]
+
+
+def constant_plug(plug, constant):
+    # a locked channel with nothing driving it never changes
+    if plug.split('.', 1)[0] in constant:
+        return True
+    return cmds.getAttr(plug, lock=True) and \
+        not cmds.connectionInfo(plug, isDestination=True)
+
+
+def constant_nodes(nodes):
+    # utility nodes whose inputs are all constant, constness spreads
+    # downstream until no more nodes are added
+    constant = set()
+    added = True
+    while added:
+        added = False
+        for node in nodes:
+            if node in constant or not cmds.objExists(node):
+                continue
+            if all(constant_plug(src, constant) for attr, src in inputs(node)):
+                constant.add(node)
+                added = True
+    return constant
+
+
+def fold_constants(nodes):
+    # a utility node with only constant inputs always outputs the same value
+    constant = constant_nodes(nodes)
+    folded = 0
+    for node in nodes:
+        if node not in constant or not cmds.objExists(node):
+            continue
+        connections = outputs(node)
+        if any(cmds.getAttr(dst, lock=True) for src, dst in connections):
+            continue
+        for src, dst in connections:
+            value = cmds.getAttr(src)
+            cmds.disconnectAttr(src, dst)
+            if isinstance(value, list):
+                cmds.setAttr(dst, *value[0])
+            else:
+                cmds.setAttr(dst, value)
+        cmds.delete(node)
+        folded += 1
+    return folded
+
+
+def leaf_plugs(node, attr):
+    # every element and child plug under attr, down to single values
+    name = attr.rsplit('.', 1)[-1].split('[')[0]
+    if not attr.endswith(']') and \
+            cmds.attributeQuery(name, node=node, multi=True):
+        return [leaf for i in cmds.getAttr(node + '.' + attr,
+                                           multiIndices=True) or []
+                for leaf in leaf_plugs(node, '{}[{}]'.format(attr, i))]
+    children = cmds.attributeQuery(name, node=node, listChildren=True)
+    if children:
+        return [leaf for child in children
+                for leaf in leaf_plugs(node, attr + '.' + child)]
+    return [attr]
+
+
+def signature(node):
+    # values are compared plug by plug, only the plugs driven by a
+    # connection are left to the connection list
+    node_type = cmds.nodeType(node)
+    values = []
+    for attr in UTILITY_TYPES[node_type]:
+        for leaf in leaf_plugs(node, attr):
+            plug = node + '.' + leaf
+            if not cmds.connectionInfo(plug, isDestination=True):
+                values.append((leaf, repr(cmds.getAttr(plug))))
+    return node_type, tuple(inputs(node)), tuple(values)
+
+
+def merge_duplicates(nodes):
+    # nodes computing the same thing feed every destination from one node
+    kept = {}
+    merged = 0
+    for node in nodes:
+        if not cmds.objExists(node):
+            continue
+        key = signature(node)
+        if key not in kept:
+            kept[key] = node
+            continue
+        keep = kept[key]
+        for src, dst in outputs(node):
+            cmds.connectAttr(keep + '.' + src.split('.', 1)[1], dst,
+                             force=True)
+        cmds.delete(node)
+        merged += 1
+    return merged
+
+
+def lock_helpers(base_name):
+    # unconnected channels on the limb's locators, controls are left alone
+    ctrls = nmRegistry.controls(base_name)
+    locked = 0
+    for node in nmRegistry.rig_nodes(base_name):
+        if node in ctrls or cmds.nodeType(node) != 'transform' or \
+                not cmds.listRelatives(node, shapes=True, type='locator'):
+            continue
+        for attr in HELPER_CHANNELS:
+            plug = node + '.' + attr
+            if cmds.getAttr(plug, lock=True) or \
+                    cmds.connectionInfo(plug, isDestination=True):
+                continue
+            cmds.setAttr(plug, lock=True, keyable=False, channelBox=False)
+            locked += 1
+    return locked
@@ -1,8 +1,35 @@
 import maya.cmds as cmds
+import maya.api.OpenMaya as om
+import json
 import math
+import time
 
 import nmrig.shelfUtils as nmUtil
+import nmrig.controlRegistry as nmRegistry
+import nmrig.spaceSwitch as nmSpace
+import nmrig.fkIkMatch as nmMatch
+import nmrig.nodeTracker as nmTracker
+import nmrig.limbPlan as nmPlan
+import nmrig.mathUtils as nmMath
+import nmrig.matrixDrive as nmDrive
+import nmrig.limbResult as nmResult
+import nmrig.buildTelemetry as nmTelemetry
 reload(nmUtil)
+reload(nmRegistry)
+reload(nmSpace)
+reload(nmMatch)
+reload(nmTracker)
+reload(nmPlan)
+reload(nmMath)
+reload(nmDrive)
+reload(nmResult)
+reload(nmTelemetry)
+
+# bump whenever the build output changes, cached rigs are keyed on it
+__version__ = '1.4.0'
+
+LODS = nmPlan.LODS
+
 
 class Limb():
     def __init__(self, side='L', part='arm',
@@ -13,7 +40,13 @@ class Limb():
                  add_stretch=False,
                  color_dict=False,
                  primary_axis='X',
-                 up_axis='Y'):
+                 up_axis='Y',
+                 ik_spaces=None,
+                 matrix_drive=False,
+                 controller_tags=True,
+                 freeze_inactive=False,
+                 lod='full',
+                 plan=None):
 
         # define variables
         self.side = side
@@ -26,80 +59,215 @@ class Limb():
         self.color_dict = color_dict
         self.primary_axis = primary_axis
         self.up_axis = up_axis
+        self.ik_spaces = ik_spaces
+        # drive controls and joints through matrices instead of constraints
+        self.matrix_drive = matrix_drive
+        self.controller_tags = controller_tags
+        # stop evaluating the hidden chain while fkIk is exactly 0 or 1
+        self.freeze_inactive = freeze_inactive
+        self.lod = lod
+        # precomputed limbPlan.plan_limb output, skips scene queries
+        self.plan = plan
         self.base_name = self.side + '_' + self.part
 
         # check to make sure proper arguments were passed
-        if len(joint_list) != 3:
-            cmds.error('Must provide three guides to build three joint limb.')
-
-        if len(alias_list) != 3:
-            cmds.error('Must provide three aliases, one for each joint.')
-
-        if not pole_vector:
-            cmds.error('Must provide a pole vector guide.')
+        self.fail(nmPlan.check_arguments(self.arguments()))
 
         self.pa = self.define_axis(self.primary_axis)
         self.ua = self.define_axis(self.up_axis)
 
+    def arguments(self):
+        return {'side': self.side, 'part': self.part,
+                'joint_list': self.joint_list, 'alias_list': self.alias_list,
+                'pole_vector': self.pole_vector,
+                'add_stretch': self.add_stretch,
+                'primary_axis': self.primary_axis, 'up_axis': self.up_axis,
+                'ik_spaces': self.ik_spaces,
+                'controller_tags': self.controller_tags,
+                'freeze_inactive': self.freeze_inactive, 'lod': self.lod}
+
+    def fail(self, issues):
+        if issues:
+            cmds.error('Cannot build {}:\n  '.format(self.base_name) +
+                       '\n  '.join(issues))
+
+    def preflight(self):
+        # one scene query for guides, space targets and name collisions
+        # before anything is created
+        guides = list(self.joint_list) + [self.pole_vector]
+        targets = self.ik_spaces or []
+        if isinstance(targets, dict):
+            targets = [t for role in sorted(targets) for t in targets[role]]
+        if self.plan:
+            names = self.plan['names']
+        else:
+            names = nmPlan.node_names(self.arguments())
+        # compared by leaf name, a name used twice in the hierarchy comes
+        # back from ls as a partial path otherwise
+        existing = set(n.split('|')[-1] for n in cmds.ls(
+            guides + list(targets) + names, long=True) or [])
+
+        issues = ['Guide {} does not exist.'.format(g) for g in guides
+                  if g.split('|')[-1] not in existing]
+        issues += ['Space target {} does not exist.'.format(t)
+                   for t in targets if t.split('|')[-1] not in existing]
+        issues += ['{} already exists.'.format(n) for n in names
+                   if n in existing]
+        self.fail(issues)
+
     def build_limb(self):
-        # create fk, ik, and bind chain
+        self.preflight()
+        # record every node the build creates, and the build itself when
+        # telemetry is enabled
+        with nmTelemetry.record(self, version=__version__):
+            tracker = nmTracker.NodeTracker()
+            try:
+                with tracker:
+                    self.build_rig()
+            except Exception:
+                self.rollback(tracker.nodes())
+                raise
+            self.created_nodes = tracker.nodes()
+            # only once nothing can roll the build back
+            self.delete_guides()
+        nmRegistry.register_nodes(self.base_name, self.created_nodes)
+        self.result = nmResult.from_limb(self, version=__version__)
+        return self.result
+
+    def rollback(self, nodes):
+        # delete exactly what a failed build created, newest first
+        for node in reversed(nodes):
+            if cmds.objExists(node):
+                cmds.delete(node)
+
+    def build_rig(self):
+        if self.plan:
+            self.stages = self.plan['stages']
+        else:
+            self.stages = nmPlan.stage_order(self.add_stretch, self.ik_spaces,
+                                             self.controller_tags,
+                                             self.freeze_inactive, self.lod)
+        self.stage_times = []
+        for stage in self.stages:
+            begin = time.time()
+            getattr(self, stage)()
+            self.stage_times.append((stage, time.time() - begin))
+
+    def store_guides(self):
+        # store guide placement so the built rig can be checked against it
+        if self.plan:
+            self.guide_matrices = self.plan['guide_matrices']
+        else:
+            self.guide_matrices = [cmds.xform(j, query=True, worldSpace=True,
+                                              matrix=True)
+                                   for j in self.joint_list]
+        # placement is computed from these, nothing is snapped and frozen
+        if self.plan:
+            self.chain_locals = self.plan['chain_locals']
+        else:
+            self.chain_locals = nmPlan.chain_locals(self.guide_matrices)
+        self.joint_matrices = [nmMath.set_translation(nmMath.rotation(m),
+                                                      nmMath.translation(m))
+                               for m in self.guide_matrices]
+
+    def create_chains(self):
+        if self.lod == 'anim':
+            # one chain stands in for the ik, fk and bind chains
+            self.bind_chain = self.create_chain('bind')
+            self.ik_chain = self.fk_chain = self.bind_chain
+            return
+
+        # build and orient the ik chain once, fk and bind are copies of it
         self.ik_chain = self.create_chain('IK')
-        self.fk_chain = self.create_chain('FK')
-        self.bind_chain = self.create_chain('bind')
+        self.fk_chain = self.duplicate_chain(self.ik_chain, 'FK')
+        self.bind_chain = self.duplicate_chain(self.ik_chain, 'bind')
 
+    def size_controls(self):
         # optimize control size by using a fraction of the start-to-end length
-        self.r = self.distance_between(self.fk_chain[0],
-                                       self.fk_chain[-1]) / float(5)
-
-        # create ik/fk & settings controls
-        self.create_fk_controls()
-        self.create_ik_controls()
-        self.create_settings_control()
-
-        # blend fk and ik chains into bind chain
-        self.blend_chains()
-
-        # create IKH
-        ikh = cmds.ikHandle(name=self.base_name + '_IKH',
-                            startJoint=self.ik_chain[0],
-                            endEffector=self.ik_chain[-1], sticky='sticky',
-                            solver='ikRPsolver', setupForRPsolver=True)[0]
-        cmds.parentConstraint(self.local_ctrl, ikh, mo=True)
-        cmds.poleVectorConstraint(self.pv_ctrl, ikh)
-
-        # add stretch
-        self.no_xform_list = [ikh]
-        if self.add_stretch:
-            self.add_ik_stretch()
-            self.add_fk_stretch()
-
-        # clean up and finalize rig
-        self.organize_hierarchy()
-        self.add_global_scale()
-        self.finalize()
+        if self.plan:
+            self.r = self.plan['radius']
+        else:
+            self.r = self.distance_between(self.fk_chain[0],
+                                           self.fk_chain[-1]) / float(5)
+
+    def create_ik_handle(self):
+        self.ikh = cmds.ikHandle(name=self.base_name + '_IKH',
+                                 startJoint=self.ik_chain[0],
+                                 endEffector=self.ik_chain[-1],
+                                 sticky='sticky', solver='ikRPsolver',
+                                 setupForRPsolver=True)[0]
+        self.ik_drive_nodes += self.drive_parent(self.local_ctrl, self.ikh)
+        if self.matrix_drive:
+            pv_nodes = nmDrive.drive_pole_vector(self.pv_ctrl, self.ikh,
+                                                 self.ik_chain[0])
+        else:
+            pv_nodes = [cmds.poleVectorConstraint(self.pv_ctrl, self.ikh)[0]]
+        self.ik_drive_nodes += pv_nodes
+        self.no_xform_list = [self.ikh]
+        if self.lod == 'anim':
+            # maya blends the fk rotations with the ik solve
+            cmds.connectAttr(self.settings_ctrl + '.fkIk',
+                             self.ikh + '.ikBlend')
+
+    def connect_anim_chain(self):
+        # the root follows the first FK control or the base IK control
+        self.ik_drive_nodes += self.drive_point(
+            self.fk_ctrls[0], self.bind_chain[0],
+            name=self.base_name + '_root', blend_driver=self.base_ctrl,
+            blend_plug=self.settings_ctrl + '.fkIk')
+
+    def store_recipe(self):
+        # enough to rebuild the limb in another lod once the guides are gone
+        cmds.addAttr(self.all_grp, longName='limbRecipe', dataType='string')
+        cmds.setAttr(self.all_grp + '.limbRecipe', json.dumps(self.recipe()),
+                     type='string')
+
+    def recipe(self):
+        # build arguments with guide placement in place of guide names
+        guide_matrices = getattr(self, 'guide_matrices', None) or [
+            cmds.xform(j, query=True, worldSpace=True, matrix=True)
+            for j in self.joint_list]
+        pv_pos = cmds.xform(self.pole_vector, query=True, worldSpace=True,
+                            translation=True)
+        return {'side': self.side,
+                'part': self.part,
+                'alias_list': list(self.alias_list),
+                'add_stretch': self.add_stretch,
+                'color_dict': self.color_dict,
+                'primary_axis': self.primary_axis,
+                'up_axis': self.up_axis,
+                'ik_spaces': self.ik_spaces,
+                'matrix_drive': self.matrix_drive,
+                'controller_tags': self.controller_tags,
+                'freeze_inactive': self.freeze_inactive,
+                'lod': self.lod,
+                'guide_matrices': [list(m) for m in guide_matrices],
+                'pole_vector_position': list(pv_pos)}
+
+    def store_match_data(self):
+        # rest relationships for fk/ik matching, before anything is scaled
+        nmMatch.store_match_data(self)
 
     def create_fk_controls(self):
         # create FK controls and connect to fk joint chain
         self.fk_ctrls = []
+        self.fk_drive_nodes = []
         for i, alias in enumerate(self.alias_list):
             # create FK controls
             ctrl = cmds.circle(radius=self.r, normal=self.pa, degree=3,
                                name='{}_{}_FK_CTRL'.format(self.side, alias))[0]
-            self.tag_control(ctrl, self.base_name + '_fk')
-            if i != 0:
-                # parent to previous control
-                cmds.parent(ctrl, par)
-
-            # align control to joint
-            ctrl_off = nmUtil.align_lras(snap_align=True,
-                                         sel=[ctrl, self.fk_chain[i]])
+            self.tag_control(ctrl, 'fk', role='fk' + str(i))
+            # offset group at the joint, under the previous control
+            ctrl_off = self.offset_group(ctrl, self.joint_matrices[i],
+                                         parent=par if i != 0 else None)
             if i == 0:
                 self.fk_top_grp = ctrl_off
 
             # define parent control to be used in iterations after the first one
             par = ctrl
             # connect control to joint
-            cmds.pointConstraint(ctrl, self.fk_chain[i])
+            if self.lod == 'full':
+                self.fk_drive_nodes += self.drive_point(ctrl, self.fk_chain[i])
             cmds.connectAttr(ctrl + '.rotate', self.fk_chain[i] + '.rotate')
             self.fk_ctrls.append(ctrl)
 
@@ -109,33 +277,32 @@ class Limb():
                                       degree=1, sections=4,
                                       constructionHistory=False,
                                       name=self.base_name + '_IK_CTRL')[0]
-        cmds.setAttr(self.world_ctrl + '.rotate' + self.primary_axis[-1], 45)
-        nmUtil.a_to_b(is_trans=True, is_rot=False,
-                      sel=[self.world_ctrl, self.ik_chain[-1]], freeze=True)
-        self.tag_control(self.world_ctrl, self.base_name + '_primary')
+        self.place_shape(self.world_ctrl,
+                         self.spin_matrix(nmMath.translation(
+                             self.joint_matrices[-1])))
+        self.tag_control(self.world_ctrl, 'primary', role='ik')
 
         # local control
         self.local_ctrl = cmds.circle(radius=self.r, normal=self.pa,
                                       degree=1, sections=4,
+                                      constructionHistory=False,
                                       name=self.base_name + '_local_IK_CTRL')[0]
-        cmds.setAttr(self.local_ctrl + '.rotate' + self.primary_axis[-1], 45)
-        cmds.makeIdentity(self.local_ctrl, apply=True, rotate=True)
-        local_off = nmUtil.align_lras(snap_align=True,
-                                      sel=[self.local_ctrl, self.ik_chain[-1]])
-        cmds.parent(local_off, self.world_ctrl)
-        self.tag_control(self.local_ctrl, self.base_name + '_secondary')
+        self.place_shape(self.local_ctrl, self.spin_matrix([0.0, 0.0, 0.0]))
+        self.offset_group(self.local_ctrl, self.joint_matrices[-1],
+                          parent=self.world_ctrl)
+        self.tag_control(self.local_ctrl, 'secondary', role='localIk')
 
         # pole vector control
         loc_points = [[0.0, 1.0, 0.0], [0.0, -1.0, 0.0], [0.0, 0.0, 0.0],
                       [-1.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 0.0],
                       [0.0, 0.0, -1.0], [0.0, 0.0, 1.0]]
-        self.pv_ctrl = self.curve_control(loc_points,
-                                          name=self.base_name + '_PV_CTRL')
-        cmds.setAttr(self.pv_ctrl + '.scale',
-                     self.r * 0.25, self.r * 0.25, self.r * 0.25)
-        nmUtil.a_to_b(is_trans=True, is_rot=False,
-                      sel=[self.pv_ctrl, self.pole_vector], freeze=True)
-        self.tag_control(self.pv_ctrl, self.base_name + '_pv')
+        pv_pos = cmds.xform(self.pole_vector, query=True, worldSpace=True,
+                            translation=True)
+        self.pv_ctrl = self.curve_control(
+            [nmMath.add(nmMath.scale(p, self.r * 0.25), pv_pos)
+             for p in loc_points], name=self.base_name + '_PV_CTRL')
+        cmds.xform(self.pv_ctrl, pivots=pv_pos)
+        self.tag_control(self.pv_ctrl, 'pv', role='pv')
 
         # base control
         self.base_ctrl = cmds.circle(radius=self.r * 1.2, normal=self.pa,
@@ -143,11 +310,14 @@ class Limb():
                                      constructionHistory=False,
                                      name='{}_{}_IK_CTRL'.format(
                                          self.side, self.alias_list[0]))[0]
-        cmds.setAttr(self.base_ctrl + '.rotate' + self.primary_axis[-1], 45)
-        nmUtil.a_to_b(is_trans=True, is_rot=False,
-                      sel=[self.base_ctrl, self.ik_chain[0]], freeze=True)
-        cmds.parentConstraint(self.base_ctrl, self.ik_chain[0], mo=True)
-        self.tag_control(self.base_ctrl, self.base_name + '_primary')
+        self.place_shape(self.base_ctrl,
+                         self.spin_matrix(nmMath.translation(
+                             self.joint_matrices[0])))
+        self.ik_drive_nodes = []
+        if self.lod == 'full':
+            self.ik_drive_nodes += self.drive_parent(self.base_ctrl,
+                                                     self.ik_chain[0])
+        self.tag_control(self.base_ctrl, 'primary', role='baseIk')
 
     def create_settings_control(self):
         plus_points = [[-0.333, 0.333, 0.0], [-0.333, 1.0, 0.0],
@@ -157,37 +327,66 @@ class Limb():
                        [-0.333, -1.0, 0.0], [-0.333, -0.333, 0.0],
                        [-1.0, -0.333, 0.0], [-1.0, 0.333, 0.0],
                        [-0.333, 0.333, 0.0]]
+        # shape sits off the end joint along the up axis
+        shift = nmMath.scale(self.ua, self.r * 1.5)
         self.settings_ctrl = self.curve_control(
-            point_list=plus_points, name=self.base_name + '_settings_CTRL')
-        self.tag_control(self.settings_ctrl, self.base_name + '_primary')
-        self.settings_off = nmUtil.align_lras(
-            snap_align=True, sel=[self.settings_ctrl, self.ik_chain[-1]])
-        cmds.setAttr(self.settings_ctrl + '.scale',
-                     self.r * 0.25, self.r * 0.25, self.r * 0.25)
-        if self.up_axis[0] == '-':
-            cmds.setAttr(self.settings_ctrl + '.translate' + self.up_axis[-1],
-                         self.r * -1.5)
-        else:
-            cmds.setAttr(self.settings_ctrl + '.translate' + self.up_axis[-1],
-                         self.r * 1.5)
-        cmds.makeIdentity(self.settings_ctrl, apply=True, translate=True,
-                          rotate=True, scale=True, normal=False)
-        cmds.parentConstraint(self.bind_chain[-1], self.settings_ctrl, mo=True)
+            point_list=[nmMath.add(nmMath.scale(p, self.r * 0.25), shift)
+                        for p in plus_points],
+            name=self.base_name + '_settings_CTRL')
+        cmds.xform(self.settings_ctrl, pivots=shift)
+        self.tag_control(self.settings_ctrl, 'primary', role='settings')
+        self.settings_off = self.offset_group(self.settings_ctrl,
+                                              self.joint_matrices[-1])
+        self.drive_parent(self.bind_chain[-1], self.settings_ctrl)
         cmds.addAttr(self.settings_ctrl, attributeType='double', min=0, max=1,
                      defaultValue=1, keyable=True, longName='fkIk')
 
     def create_chain(self, suffix):
+        # final translate and joint orient set directly, rotate stays zero
         chain = []
-        for j, a in zip(self.joint_list, self.alias_list):
-            if j == self.joint_list[0]:
-                par = None
-            else:
-                par = jnt
-            jnt = cmds.joint(par, n='{}_{}_{}_JNT'.format(self.side, a, suffix))
-            nmUtil.a_to_b(sel=[jnt, j], freeze=True)
+        for a, (translate, orient) in zip(self.alias_list, self.chain_locals):
+            kwargs = {'parent': chain[-1]} if chain else {}
+            jnt = cmds.createNode('joint', name='{}_{}_{}_JNT'.format(
+                self.side, a, suffix), **kwargs)
+            cmds.setAttr(jnt + '.translate', *translate)
+            cmds.setAttr(jnt + '.jointOrient', *orient)
             chain.append(jnt)
         return chain
 
+    def duplicate_chain(self, chain, suffix):
+        # one duplicate call for the whole chain, then rename the copies
+        copies = cmds.duplicate(chain[0], renameChildren=True)
+        return [cmds.rename(copy, '{}_{}_{}_JNT'.format(self.side, a, suffix))
+                for copy, a in zip(copies, self.alias_list)]
+
+    def offset_group(self, ctrl, matrix, parent=None):
+        # OFF_GRP placed from a matrix, the control keeps zeroed channels
+        kwargs = {'parent': parent} if parent else {}
+        grp = cmds.createNode('transform', name=ctrl + '_OFF_GRP', **kwargs)
+        cmds.xform(grp, worldSpace=True, matrix=matrix)
+        cmds.parent(ctrl, grp, relative=True)
+        return grp
+
+    def spin_matrix(self, position):
+        # the 45 degree turn about the primary axis of the square controls
+        rotate = [0.0, 0.0, 0.0]
+        rotate[nmMath.AXIS_INDEX[self.primary_axis[-1]]] = 45.0
+        return nmMath.set_translation(nmMath.euler_to_matrix(rotate),
+                                      position)
+
+    def place_shape(self, ctrl, matrix):
+        # bake a matrix into the cvs, pivots follow the translation
+        transform = om.MMatrix(matrix)
+        sel = om.MSelectionList()
+        for shape in cmds.listRelatives(ctrl, shapes=True, fullPath=True):
+            sel.add(shape)
+        for i in range(sel.length()):
+            curve_fn = om.MFnNurbsCurve(sel.getDagPath(i))
+            curve_fn.setCVPositions([p * transform
+                                     for p in curve_fn.cvPositions()])
+            curve_fn.updateCurve()
+        cmds.xform(ctrl, pivots=nmMath.translation(matrix))
+
     def blend_chains(self):
         # hook up switching
         for ik, fk, bind in zip(self.ik_chain, self.fk_chain, self.bind_chain):
@@ -223,9 +422,26 @@ class Limb():
             vector_axis = tuple(va * -1 for va in vector_axis)
         return vector_axis
 
-    def tag_control(self, ctrl, tag_name):
+    def drive_parent(self, driver, driven):
+        # every node doing the driving, constraint or matrix helpers
+        if self.matrix_drive:
+            return nmDrive.drive_parent(driver, driven)
+        return [cmds.parentConstraint(driver, driven, mo=True)[0]]
+
+    def drive_point(self, driver, driven, name=None, blend_driver=None,
+                    blend_plug=None):
+        if self.matrix_drive:
+            return nmDrive.drive_point(driver, driven, name, blend_driver,
+                                       blend_plug)
+        return nmDrive.point_constraint(driver, driven, name, blend_driver,
+                                        blend_plug)
+
+    def tag_control(self, ctrl, tag, role=None):
         cmds.addAttr(ctrl, ln='controlType', dataType='string')
-        cmds.setAttr(ctrl + '.controlType', tag_name, type='string')
+        cmds.setAttr(ctrl + '.controlType', self.base_name + '_' + tag,
+                     type='string')
+        self.registry = nmRegistry.register_control(ctrl, self.base_name, tag,
+                                                    role=role)
 
     def curve_control(self, point_list, name, degree=1):
         crv = cmds.curve(degree=degree, p=point_list, name=name)
@@ -244,15 +460,22 @@ class Limb():
         self.stretch_mdn = cmds.createNode('multiplyDivide',
                                       name=self.base_name + '_stretch_MDN')
         self.no_xform_list += [start_loc, end_loc]
+        self.ik_stretch_nodes = [limb_dist, self.limb_cnd, start_loc, end_loc,
+                                 self.stretch_mdn]
 
         # calculate length
-        length_a = self.distance_between(self.ik_chain[0], self.ik_chain[1])
-        length_b = self.distance_between(self.ik_chain[1], self.ik_chain[2])
-        self.length_total = length_a + length_b
+        if self.plan:
+            self.length_total = self.plan['length_total']
+        else:
+            length_a = self.distance_between(self.ik_chain[0],
+                                             self.ik_chain[1])
+            length_b = self.distance_between(self.ik_chain[1],
+                                             self.ik_chain[2])
+            self.length_total = length_a + length_b
 
         # measure limb length
-        cmds.pointConstraint(self.base_ctrl, start_loc, maintainOffset=False)
-        cmds.pointConstraint(self.local_ctrl, end_loc, maintainOffset=False)
+        self.ik_stretch_nodes += self.drive_point(self.base_ctrl, start_loc)
+        self.ik_stretch_nodes += self.drive_point(self.local_ctrl, end_loc)
         cmds.connectAttr(start_loc + '.worldMatrix[0]',
                          limb_dist + '.inMatrix1')
         cmds.connectAttr(end_loc + '.worldMatrix[0]', limb_dist + '.inMatrix2')
@@ -269,51 +492,69 @@ class Limb():
         cmds.setAttr(self.limb_cnd + '.operation', 3)
 
         # add on/off for stretch
-        cmds.addAttr(self.world_ctrl, attributeType='double', min=0, max=1,
-                     defaultValue=1, keyable=True, longName='stretch')
-        up_name = 'up' + self.part.title()
-        lo_name = 'lo' + self.part.title()
-        cmds.addAttr(self.world_ctrl, attributeType='double', min=0.001,
-                     defaultValue=1, keyable=True, longName=up_name)
-        cmds.addAttr(self.world_ctrl, attributeType='double', min=0.001,
-                     defaultValue=1, keyable=True, longName=lo_name)
-        stretch_bta = cmds.createNode('blendTwoAttr', 
-                                      name=self.base_name + '_stretch_BTA')
-        cmds.setAttr(stretch_bta + '.input[0]', 1)
+        up_name, lo_name = self.add_ik_stretch_attrs()
+        self.stretch_bta = cmds.createNode('blendTwoAttr',
+                                           name=self.base_name + '_stretch_BTA')
+        cmds.setAttr(self.stretch_bta + '.input[0]', 1)
         cmds.connectAttr(self.limb_cnd + '.outColorR',
-                         stretch_bta + '.input[1]')
+                         self.stretch_bta + '.input[1]')
         cmds.connectAttr(self.world_ctrl + '.stretch',
-                         stretch_bta + '.attributesBlender')
+                         self.stretch_bta + '.attributesBlender')
         up_pma = cmds.createNode('plusMinusAverage', name=up_name + '_PMA')
         lo_pma = cmds.createNode('plusMinusAverage', name=lo_name + '_PMA')
         cmds.connectAttr(self.world_ctrl + '.' + up_name,
                          up_pma + '.input1D[0]')
         cmds.connectAttr(self.world_ctrl + '.' + lo_name,
                          lo_pma + '.input1D[0]')
-        cmds.connectAttr(stretch_bta + '.output', up_pma + '.input1D[1]')
-        cmds.connectAttr(stretch_bta + '.output', lo_pma + '.input1D[1]')
+        cmds.connectAttr(self.stretch_bta + '.output', up_pma + '.input1D[1]')
+        cmds.connectAttr(self.stretch_bta + '.output', lo_pma + '.input1D[1]')
         cmds.setAttr(up_pma + '.input1D[2]', -1)
         cmds.setAttr(lo_pma + '.input1D[2]', -1)
+        self.ik_stretch_nodes += [self.stretch_bta, up_pma, lo_pma]
 
         cmds.connectAttr(up_pma + '.output1D',
                          self.ik_chain[0] + '.scale' + self.primary_axis[-1])
         cmds.connectAttr(lo_pma + '.output1D',
                          self.ik_chain[1] + '.scale' + self.primary_axis[-1])
 
+    def add_ik_stretch_attrs(self):
+        cmds.addAttr(self.world_ctrl, attributeType='double', min=0, max=1,
+                     defaultValue=1, keyable=True, longName='stretch')
+        up_name = 'up' + self.part.title()
+        lo_name = 'lo' + self.part.title()
+        cmds.addAttr(self.world_ctrl, attributeType='double', min=0.001,
+                     defaultValue=1, keyable=True, longName=up_name)
+        cmds.addAttr(self.world_ctrl, attributeType='double', min=0.001,
+                     defaultValue=1, keyable=True, longName=lo_name)
+        return up_name, lo_name
+
+    def add_fk_stretch_attr(self, ctrl):
+        cmds.addAttr(ctrl, attributeType='double', min=0.001,
+                     defaultValue=1, keyable=True, longName='stretch')
+
+    def add_stretch_attrs(self):
+        # stretch attributes without the network, animation still transfers
+        self.add_ik_stretch_attrs()
+        for ctrl in self.fk_ctrls[:-1]:
+            self.add_fk_stretch_attr(ctrl)
+
     def add_fk_stretch(self):
+        self.fk_stretch_nodes = []
         for i, ctrl in enumerate(self.fk_ctrls):
             if not ctrl == self.fk_ctrls[-1]:
-                cmds.addAttr(ctrl, attributeType='double', min=0.001,
-                             defaultValue=1, keyable=True, longName='stretch')
+                self.add_fk_stretch_attr(ctrl)
                 mdl = cmds.createNode('multDoubleLinear',
                                       name=ctrl.replace('CTRL', '_stretch_MDL'))
                 loc = cmds.spaceLocator(name=self.fk_chain[i + 1].replace(
                     'JNT', 'OFF_LOC'))[0]
                 cmds.parent(loc, self.fk_chain[i])
-                nmUtil.a_to_b(sel=[loc, self.fk_chain[i + 1]])
-                offset_val = cmds.getAttr(
-                    loc + '.translate' + self.primary_axis[-1])
+                translate, orient = self.chain_locals[i + 1]
+                cmds.setAttr(loc + '.translate', *translate)
+                cmds.setAttr(loc + '.rotate', *orient)
+                offset_val = translate[nmMath.AXIS_INDEX[
+                    self.primary_axis[-1]]]
                 cmds.setAttr(mdl + '.input1', offset_val)
+                self.fk_stretch_nodes += [mdl, loc]
                 cmds.connectAttr(ctrl + '.stretch', mdl + '.input2')
                 cmds.connectAttr(mdl + '.output',
                                  loc + '.translate' + self.primary_axis[-1])
@@ -332,6 +573,20 @@ class Limb():
                                          self.fk_ctrls[
                                              i + 1] + '_OFF_GRP.' + attr)
 
+    def add_space_switch(self):
+        # ik_spaces is either one list of targets for the IK, PV and base
+        # controls or a dict of target lists keyed by control role
+        self.space_nodes = []
+        for role, ctrl in [('ik', self.world_ctrl), ('pv', self.pv_ctrl),
+                           ('baseIk', self.base_ctrl)]:
+            if isinstance(self.ik_spaces, dict):
+                targets = self.ik_spaces.get(role)
+            else:
+                targets = self.ik_spaces
+            if targets:
+                self.space_nodes.append(nmSpace.add_space_switch(ctrl,
+                                                                 targets))
+
     def organize_hierarchy(self):
         # organize
         self.fk_ctrl_grp = cmds.group(em=True,
@@ -351,15 +606,21 @@ class Limb():
         cmds.parent(self.fk_top_grp, self.fk_ctrl_grp)
         cmds.parent(self.bind_chain[0], self.skeleton_grp)
         cmds.parent(self.no_xform_list, self.no_xform_grp)
-        cmds.parent(self.fk_ctrl_grp, self.ik_ctrl_grp, self.no_xform_grp,
-                    self.fk_chain[0], self.ik_chain[0], self.settings_off,
-                    self.limb_rig_grp)
+        if self.lod == 'full':
+            rig_list = [self.fk_ctrl_grp, self.ik_ctrl_grp, self.no_xform_grp,
+                        self.fk_chain[0], self.ik_chain[0], self.settings_off]
+            hide_list = [self.no_xform_grp, self.fk_chain[0],
+                         self.ik_chain[0], self.bind_chain[0]]
+        else:
+            rig_list = [self.fk_ctrl_grp, self.ik_ctrl_grp, self.no_xform_grp,
+                        self.settings_off]
+            hide_list = [self.no_xform_grp, self.bind_chain[0]]
+        cmds.parent(rig_list, self.limb_rig_grp)
         cmds.parent(self.skeleton_grp, self.limb_rig_grp, self.all_grp)
         nmUtil.transfer_pivots(sel=[self.bind_chain[0], self.skeleton_grp,
                                     self.limb_rig_grp, self.fk_ctrl_grp,
                                     self.ik_ctrl_grp])
-        cmds.hide(self.no_xform_grp, self.fk_chain[0], self.ik_chain[0],
-                  self.bind_chain[0])
+        cmds.hide(hide_list)
 
     def add_global_scale(self):
         # compensate for global scale
@@ -367,7 +628,7 @@ class Limb():
                      defaultValue=1, keyable=True, longName='globalScale')
         [cmds.connectAttr(self.all_grp + '.globalScale',
                           self.all_grp + '.scale' + axis) for axis in 'XYZ']
-        if self.add_stretch:
+        if self.add_stretch and self.lod == 'full':
             gs_mdl = cmds.createNode('multDoubleLinear',
                                      name=self.base_name + '_globalScale_MDL')
             cmds.setAttr(gs_mdl + '.input1', self.length_total)
@@ -375,24 +636,39 @@ class Limb():
             cmds.connectAttr(gs_mdl + '.output', self.stretch_mdn + '.input2X')
             cmds.connectAttr(gs_mdl + '.output', self.limb_cnd + '.secondTerm')
 
+    def add_controller_tags(self):
+        # controller nodes tell the evaluation manager which nodes animators
+        # touch. settings leads both branches, FK in chain order, IK from the
+        # base control down
+        hierarchy = [(self.settings_ctrl, None)]
+        hierarchy += zip(self.fk_ctrls,
+                         [self.settings_ctrl] + self.fk_ctrls[:-1])
+        hierarchy += [(self.base_ctrl, self.settings_ctrl),
+                      (self.world_ctrl, self.base_ctrl),
+                      (self.local_ctrl, self.world_ctrl),
+                      (self.pv_ctrl, self.world_ctrl)]
+
+        self.controller_nodes = []
+        for ctrl, parent in hierarchy:
+            cmds.controller(ctrl)
+            tag = cmds.rename(cmds.controller(ctrl, query=True)[0],
+                              ctrl + '_TAG')
+            if parent:
+                cmds.controller(ctrl, parent, parent=True)
+            self.controller_nodes.append(tag)
+
     def finalize(self):
         # finalize
         if not self.color_dict:
-            self.color_dict = {self.base_name + '_primary': [1, 1, 0],
-                               self.base_name + '_pv': [0, 1, 1],
-                               self.base_name + '_fk': [0, 0, 1],
-                               self.base_name + '_secondary': [0, 0.2, 1]}
-
-        for color_tag in cmds.ls(self.side + '*.controlType'):
-            ctrl = color_tag.split('.')[0]
-            ctrl_type = cmds.getAttr(color_tag)
-            if self.base_name in ctrl_type:
+            self.color_dict = nmPlan.default_colors(self.base_name)
+
+        for tag in nmRegistry.tags(self.base_name):
+            color = self.color_dict[self.base_name + '_' + tag]
+            for ctrl in nmRegistry.controls(self.base_name, tag=tag):
                 cmds.setAttr(ctrl + '.overrideEnabled', 1)
                 cmds.setAttr(ctrl + '.overrideRGBColors', 1)
                 cmds.setAttr(ctrl + '.overrideColorRGB',
-                             self.color_dict[ctrl_type][0],
-                             self.color_dict[ctrl_type][1],
-                             self.color_dict[ctrl_type][2])
+                             color[0], color[1], color[2])
 
         # Lock and hide attributes
         self.lock_and_hide(self.fk_ctrls,
@@ -412,14 +688,36 @@ class Limb():
         cmds.connectAttr(vis_rev + '.outputX',
                          self.fk_ctrl_grp + '.visibility')
 
-        pv_gde = self.add_guide(self.pv_ctrl, self.ik_chain[1])
-        cmds.parent(pv_gde[0], self.no_xform_grp)
-        cmds.parent(pv_gde[1], self.ik_ctrl_grp)
+        if self.lod == 'full':
+            pv_gde = self.add_guide(self.pv_ctrl, self.ik_chain[1])
+            if pv_gde[0]:
+                cmds.parent(pv_gde[0], self.no_xform_grp)
+            cmds.parent(pv_gde[1], self.ik_ctrl_grp)
 
-        # remove guide joints
+    def delete_guides(self):
         if self.remove_guides:
             cmds.delete(self.joint_list, self.pole_vector)
 
+    def freeze_inactive_chain(self):
+        # block the IK side while fkIk is 0 and the FK side while it is 1,
+        # blending in between keeps both sides evaluating
+        sides = [('ik', 0, self.ik_chain + [self.ikh] + self.ik_drive_nodes +
+                  getattr(self, 'ik_stretch_nodes', [])),
+                 ('fk', 1, self.fk_chain + self.fk_drive_nodes +
+                  getattr(self, 'fk_stretch_nodes', []))]
+        self.freeze_nodes = []
+        for side, value, nodes in sides:
+            cnd = cmds.createNode('condition', name='{}_{}_freeze_CND'.format(
+                self.base_name, side))
+            cmds.connectAttr(self.settings_ctrl + '.fkIk', cnd + '.firstTerm')
+            cmds.setAttr(cnd + '.secondTerm', value)
+            # nodeState 2 is blocking
+            cmds.setAttr(cnd + '.colorIfTrueR', 2)
+            cmds.setAttr(cnd + '.colorIfFalseR', 0)
+            for node in nodes:
+                cmds.connectAttr(cnd + '.outColorR', node + '.nodeState')
+            self.freeze_nodes.append(cnd)
+
     def lock_and_hide(self, nodes, attribute_list=None):
         if not attribute_list:
             attribute_list = ['translate', 'rotate', 'scale', 'visibility']
@@ -442,11 +740,18 @@ class Limb():
                              rotatePivot=True)
 
         gde = self.curve_control([start_pos, end_pos], name=start + '_GDE')
-        start_cls = cmds.cluster(gde + '.cv[0]', name=start + '_CLS')[1]
-        end_cls = cmds.cluster(gde + '.cv[1]', name=end + '_CLS')[1]
-        cmds.pointConstraint(start, start_cls)
-        cmds.pointConstraint(end, end_cls)
+        if self.matrix_drive:
+            # drive the CVs directly, no clusters needed
+            cls_list = []
+            nmDrive.drive_curve_point(start, gde, 0, name=start + '_GDE')
+            nmDrive.drive_curve_point(end, gde, 1, name=end + '_GDE')
+        else:
+            start_cls = cmds.cluster(gde + '.cv[0]', name=start + '_CLS')[1]
+            end_cls = cmds.cluster(gde + '.cv[1]', name=end + '_CLS')[1]
+            cmds.pointConstraint(start, start_cls)
+            cmds.pointConstraint(end, end_cls)
+            cls_list = [start_cls, end_cls]
         cmds.setAttr(gde + '.template', True)
         cmds.setAttr(gde + '.inheritsTransform', False)
 
-        return [[start_cls, end_cls], gde]
+        return [cls_list, gde]
@@ -0,0 +1,92 @@
+import maya.cmds as cmds
+
+import nmrig.mathUtils as nmMath
+import nmrig.limbPlan as nmPlan
+reload(nmMath)
+reload(nmPlan)
+
+
+def add_space_switch(ctrl, targets, default_name='limb', attr_name='space'):
+    # one wtAddMatrix blends every space into the control's offsetParentMatrix
+    # space i: offset * target.worldMatrix * parent.worldInverseMatrix, where
+    # the offset makes each space identity at the rest pose
+    parent = (cmds.listRelatives(ctrl, parent=True) or [None])[0]
+    if not parent:
+        cmds.error('{} needs a parent to define its default space.'.format(
+            ctrl))
+
+    names = nmPlan.space_names(targets, default_name)
+    cmds.addAttr(ctrl, longName=attr_name, attributeType='enum',
+                 enumName=':'.join(names), keyable=True)
+    wam = cmds.createNode('wtAddMatrix', name=ctrl + '_space_WAM')
+    parent_rest = cmds.getAttr(parent + '.worldMatrix[0]')
+
+    for i, target in enumerate([None] + list(targets)):
+        weight = space_condition(ctrl + '.' + attr_name, i,
+                                 '{}_{}_space_CND'.format(ctrl, names[i]))
+        cmds.connectAttr(weight, '{}.wtMatrix[{}].weightIn'.format(wam, i))
+        if not target:
+            # default space just follows the parent
+            cmds.setAttr('{}.wtMatrix[{}].matrixIn'.format(wam, i),
+                         nmMath.identity(), type='matrix')
+            continue
+
+        mmx = cmds.createNode('multMatrix',
+                              name='{}_{}_space_MMX'.format(ctrl, names[i]))
+        offset = nmMath.mult(parent_rest, nmMath.inverse(
+            cmds.getAttr(target + '.worldMatrix[0]')))
+        cmds.setAttr(mmx + '.matrixIn[0]', offset, type='matrix')
+        cmds.connectAttr(target + '.worldMatrix[0]', mmx + '.matrixIn[1]')
+        cmds.connectAttr(parent + '.worldInverseMatrix[0]',
+                         mmx + '.matrixIn[2]')
+        cmds.connectAttr(mmx + '.matrixSum',
+                         '{}.wtMatrix[{}].matrixIn'.format(wam, i))
+
+    if cmds.objExists(ctrl + '.offsetParentMatrix'):
+        cmds.connectAttr(wam + '.matrixSum', ctrl + '.offsetParentMatrix')
+    else:
+        space_grp = insert_space_group(ctrl, parent)
+        dcm = cmds.createNode('decomposeMatrix', name=ctrl + '_space_DCM')
+        cmds.connectAttr(wam + '.matrixSum', dcm + '.inputMatrix')
+        for attr in ['translate', 'rotate', 'scale']:
+            cmds.connectAttr(dcm + '.output' + attr.title(),
+                             space_grp + '.' + attr)
+    return wam
+
+
+def add_constraint_switch(ctrl, targets, default_name='limb',
+                          attr_name='space'):
+    # the equivalent hand built setup, kept for benchmarking
+    parent = (cmds.listRelatives(ctrl, parent=True) or [None])[0]
+    if not parent:
+        cmds.error('{} needs a parent to define its default space.'.format(
+            ctrl))
+
+    names = nmPlan.space_names(targets, default_name)
+    cmds.addAttr(ctrl, longName=attr_name, attributeType='enum',
+                 enumName=':'.join(names), keyable=True)
+    space_grp = insert_space_group(ctrl, parent)
+    con = cmds.parentConstraint([parent] + list(targets), space_grp,
+                                maintainOffset=True)[0]
+    weights = cmds.parentConstraint(con, query=True, weightAliasList=True)
+    for i, weight in enumerate(weights):
+        cnd = space_condition(ctrl + '.' + attr_name, i,
+                              '{}_{}_space_CND'.format(ctrl, names[i]))
+        cmds.connectAttr(cnd, con + '.' + weight)
+    return con
+
+
+def space_condition(enum_plug, index, name):
+    cnd = cmds.createNode('condition', name=name)
+    cmds.connectAttr(enum_plug, cnd + '.firstTerm')
+    cmds.setAttr(cnd + '.secondTerm', index)
+    cmds.setAttr(cnd + '.colorIfTrueR', 1)
+    cmds.setAttr(cnd + '.colorIfFalseR', 0)
+    return cnd + '.outColorR'
+
+
+def insert_space_group(ctrl, parent):
+    space_grp = cmds.group(empty=True, name=ctrl + '_SPACE_GRP',
+                           parent=parent)
+    cmds.parent(ctrl, space_grp)
+    return space_grp
@@ -0,0 +1,11 @@
+import os
+import sys
+import types
+
+# the repository root is the nmrig package, map it so tests import modules
+# the way maya does
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if 'nmrig' not in sys.modules:
+    package = types.ModuleType('nmrig')
+    package.__path__ = [ROOT]
+    sys.modules['nmrig'] = package
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+import nmrig.buildServer as nmServer
+import nmrig.mathUtils as nmMath
+
+# a limbRecipe shaped recipe, guides given as matrices
+RECIPE = {'side': 'L', 'part': 'arm', 'alias_list': ['a', 'b', 'c'],
+          'guide_matrices': [nmMath.translate_matrix(p)
+                             for p in [[0, 0, 0], [5, 0, -1], [10, 0, 0]]],
+          'pole_vector_position': [5, 0, -5]}
+
+
+@pytest.fixture
+def server():
+    # a stand-in server on a free port, serving from a background thread
+    build_server = nmServer.BuildServer(nmServer.StandInBackend(), port=0)
+    thread = threading.Thread(target=build_server.serve)
+    thread.start()
+    yield build_server.address
+    nmServer.stop(*build_server.address)
+    thread.join(10)
+
+
+def test_round_trip(server):
+    host, port = server
+    built, clash, rolled, again, bad = nmServer.send(
+        [{'recipe': RECIPE},
+         {'recipe': RECIPE, 'isolation': 'rollback'},
+         {'recipe': dict(RECIPE, side='R'), 'isolation': 'rollback'},
+         {'recipe': dict(RECIPE, side='R'), 'isolation': 'rollback'},
+         {'recipe': dict(RECIPE, pole_vector_position=None)}],
+        host, port, timeout=10)
+    assert built['ok'], built.get('error')
+    assert built['result']['base_name'] == 'L_arm'
+    # the second L_arm clashes with the first
+    assert not clash['ok']
+    # rollback frees the names again
+    assert rolled['ok'] and again['ok']
+    assert not bad['ok']
+
+
+def test_unknown_command(server):
+    host, port = server
+    ping, unknown = nmServer.send([{'command': 'ping'},
+                                   {'command': 'explode'}], host, port,
+                                  timeout=10)
+    assert ping['ok']
+    assert not unknown['ok']
@@ -0,0 +1,57 @@
+import pytest
+
+import nmrig.limbScaling as nmScaling
+
+
+def run(ms_per_limb, exponent=1.0, calls_per_limb=100):
+    # a synthetic run file, the limbs sweep grows as n ** exponent and the
+    # scene sweep stays flat
+    limbs = [{'n': n, 'scene_nodes': 0, 'ms': ms_per_limb,
+              'total_ms': ms_per_limb * n ** exponent,
+              'calls': calls_per_limb, 'total_calls': calls_per_limb * n}
+             for n in [1, 5, 20, 50]]
+    scene = [{'n': n, 'scene_nodes': n, 'ms': ms_per_limb, 'total_ms': 0,
+              'calls': calls_per_limb, 'total_calls': 0}
+             for n in [1000, 5000, 20000]]
+    sweeps = {'scene': scene, 'limbs': limbs}
+    return {'commit': None, 'sweeps': sweeps, 'fits': nmScaling.fits(sweeps)}
+
+
+def test_fit_power_linear():
+    fit = nmScaling.fit_power([1, 2, 4, 8, 16], [3, 6, 12, 24, 48])
+    assert fit['exponent'] == pytest.approx(1.0)
+    assert fit['coefficient'] == pytest.approx(3.0)
+    assert fit['r2'] == pytest.approx(1.0)
+
+
+def test_fit_power_skips_bad_points():
+    # zero and negative points have no log, one point left is no fit
+    assert nmScaling.fit_power([0, 1, 2], [1, 0, -1]) is None
+    assert nmScaling.fit_power([1, 1], [2, 3]) is None
+
+
+def test_fits():
+    fits = nmScaling.fits(run(10.0)['sweeps'])
+    assert sorted(fits) == ['limbs_calls', 'limbs_ms', 'scene_calls',
+                            'scene_ms']
+    assert fits['limbs_ms']['exponent'] == pytest.approx(1.0)
+    assert fits['limbs_calls']['exponent'] == pytest.approx(1.0)
+    assert fits['scene_ms']['exponent'] == pytest.approx(0.0)
+
+
+def test_compare_flags_steeper_fit():
+    found = nmScaling.compare(run(10.0), run(10.0, exponent=1.5))
+    assert [(f['what'], f['kind']) for f in found] == [('limbs_ms',
+                                                        'exponent')]
+    assert found[0]['head'] == pytest.approx(1.5)
+
+
+def test_compare_flags_slower_points():
+    found = nmScaling.compare(run(10.0), run(13.0))
+    assert sorted(f['what'] for f in found if f['kind'] == 'ms') == [
+        'limbs n=1', 'limbs n=20', 'limbs n=5', 'limbs n=50',
+        'scene n=1000', 'scene n=20000', 'scene n=5000']
+
+
+def test_compare_same_run():
+    assert nmScaling.compare(run(10.0), run(10.0)) == []
@@ -0,0 +1,89 @@
+import math
+
+import pytest
+
+import nmrig.limbSolver as nmSolver
+import nmrig.mathUtils as nmMath
+
+# a straight chain along X, 5 units per bone, bending towards -Z
+GUIDES = [nmMath.translate_matrix(p) for p in [[0, 0, 0], [5, 0, 0],
+                                                [10, 0, 0]]]
+POLE = [5, 0, -5]
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(nmSolver, 'numpy', None)
+    return request.param
+
+
+def expected(rows, positions, scales=(1.0, 1.0, 1.0)):
+    # world matrices from a shared rotation, per joint positions and
+    # primary axis scales
+    return [nmMath.set_translation(
+        nmMath.mult(nmMath.scale_matrix([s, 1.0, 1.0]),
+                    nmMath.from_rows(*rows)), p)
+        for p, s in zip(positions, scales)]
+
+
+def assert_matrices(actual, wanted):
+    for a, w in zip(actual, wanted):
+        assert nmMath.is_close(a, w, 1e-6), (a, w)
+
+
+def test_rest_pose(backend):
+    solver = nmSolver.LimbSolver(GUIDES, POLE)
+    for fk_ik in [0.0, 0.5, 1.0]:
+        result = solver.evaluate([{'fk_ik': fk_ik}])[0]
+        assert_matrices(result, GUIDES)
+
+
+def test_full_reach(backend):
+    solver = nmSolver.LimbSolver(GUIDES, POLE, add_stretch=True)
+    rows = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+    # reaching exactly the chain length, and past it with stretch off
+    for pose in [{'end': [10, 0, 0]}, {'end': [15, 0, 0], 'stretch': 0.0}]:
+        result = solver.evaluate([pose])[0]
+        assert_matrices(result, expected(rows, [[0, 0, 0], [5, 0, 0],
+                                                [10, 0, 0]]))
+
+
+def test_stretch(backend):
+    # 15 units away from a 10 unit chain scales both bones by 1.5
+    solver = nmSolver.LimbSolver(GUIDES, POLE, add_stretch=True)
+    rows = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+    result = solver.evaluate([{'end': [15, 0, 0]}])[0]
+    assert_matrices(result, expected(rows, [[0, 0, 0], [7.5, 0, 0],
+                                            [15, 0, 0]], [1.5, 1.5, 1.0]))
+
+
+def test_fk_blend(backend):
+    # the root FK control at 90 degrees about Z, the IK side at rest, so
+    # halfway the bind chain is rotated 45 degrees
+    solver = nmSolver.LimbSolver(GUIDES, POLE)
+    pose = {'fk_rotate': [[0, 0, 90], [0, 0, 0], [0, 0, 0]]}
+    fk = solver.evaluate([dict(pose, fk_ik=0.0)])[0]
+    assert_matrices(fk, expected([[0, 1, 0], [-1, 0, 0], [0, 0, 1]],
+                                 [[0, 0, 0], [0, 5, 0], [0, 10, 0]]))
+
+    half = solver.evaluate([dict(pose, fk_ik=0.5)])[0]
+    c = math.sqrt(0.5)
+    assert_matrices(half, expected([[c, c, 0], [-c, c, 0], [0, 0, 1]],
+                                   [[0, 0, 0], [5 * c, 5 * c, 0],
+                                    [10 * c, 10 * c, 0]]))
+
+
+def test_batch_matches_loop(monkeypatch):
+    pytest.importorskip('numpy')
+    solver = nmSolver.LimbSolver(GUIDES, POLE, add_stretch=True)
+    poses = [{'end': [6, 2, 1], 'fk_ik': 0.3, 'global_scale': 2.0,
+              'fk_rotate': [[10, 20, 30], [0, 0, 45], [5, 0, 0]],
+              'fk_stretch': [1.2, 0.8]},
+             {'end': [20, 0, 0], 'up': 1.2}]
+    batch = solver.evaluate(poses)
+    monkeypatch.setattr(nmSolver, 'numpy', None)
+    for actual, wanted in zip(batch, solver.evaluate(poses)):
+        assert_matrices(actual, wanted)